@@ -0,0 +1,89 @@
+"""Token estimation and token-budgeted history windows for KP prompts."""
+
+import re
+
+# CJK ideographs, kana, hangul and full-width punctuation: roughly one token each
+_WIDE_CHARS = re.compile(
+    r"[\u3000-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]"
+)
+
+# Per-message framing overhead (role markers, separators)
+MESSAGE_OVERHEAD = 4
+
+MODEL_CONTEXT_WINDOWS = {
+    "claude": 200_000,
+    "gpt-4o": 128_000,
+    "gpt-4.1": 1_000_000,
+    "gpt-4": 8_192,
+    "gpt-3.5": 16_385,
+    "gemini": 1_000_000,
+}
+DEFAULT_CONTEXT_WINDOW = 32_000
+
+# History is the only layer that grows; cap it so per-turn input cost stays flat
+MAX_HISTORY_BUDGET = 8_000
+
+# Entries the window start moves by at once when the prompt prefix must stay
+# byte-identical between turns (a multiple of the compaction batch)
+STABLE_WINDOW_STEP = 12
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate tokens: ~1 per CJK character, ~1 per 4 characters otherwise."""
+    if not text:
+        return 0
+    wide = len(_WIDE_CHARS.findall(text))
+    narrow = len(text) - wide
+    return wide + (narrow + 3) // 4
+
+
+def context_window_for(model: str) -> int:
+    # Longest prefix wins so "gpt-4o" is not matched by "gpt-4"
+    for prefix in sorted(MODEL_CONTEXT_WINDOWS, key=len, reverse=True):
+        if model.startswith(prefix):
+            return MODEL_CONTEXT_WINDOWS[prefix]
+    return DEFAULT_CONTEXT_WINDOW
+
+
+def history_budget_for(model: str) -> int:
+    """Token budget for the history layer of a prompt sent to `model`."""
+    return min(MAX_HISTORY_BUDGET, context_window_for(model) // 4)
+
+
+def entry_tokens(entry: dict) -> int:
+    """Token estimate of a history entry, cached on the entry as "tokens"."""
+    tokens = entry.get("tokens")
+    if tokens is None:
+        tokens = estimate_tokens(entry["content"]) + MESSAGE_OVERHEAD
+        entry["tokens"] = tokens
+    return tokens
+
+
+def select_history(history: list[dict], budget: int, step: int = 1) -> int:
+    """Index of the oldest history entry that fits in `budget`, newest first.
+
+    With `step` > 1 the start only ever sits on a multiple of `step`, so it
+    stays put for several turns and then jumps, instead of moving every turn.
+    """
+    total = 0
+    start = len(history)
+    for i in range(len(history) - 1, -1, -1):
+        tokens = entry_tokens(history[i])
+        if total + tokens > budget:
+            break
+        total += tokens
+        start = i
+    return align_window(history, start, step)
+
+
+def align_window(history: list[dict], start: int, step: int = 1) -> int:
+    """Round a window start up to a multiple of `step`, then to a user entry.
+
+    The window never opens on an assistant reply, so providers that require a
+    leading user turn accept it.
+    """
+    if step > 1:
+        start = min(-(-start // step) * step, len(history))
+    while start < len(history) and history[start]["role"] != "user":
+        start += 1
+    return start
@@ -0,0 +1,82 @@
+"""Dice rolls exposed to the model as tools (single-round-trip turn mode).
+
+Instead of returning skill_check/san_check directives and waiting for a second
+call with the outcome, the model calls these tools mid-response; the engine
+rolls locally and the model continues the narrative in the same exchange.
+"""
+
+from typing import Optional
+
+from backend.ai.providers.base import AITool
+from backend.ai.response_parser import GameDirective
+
+TOOL_MODE_PROMPT = """[掷骰工具] 本局启用了掷骰工具：
+- 需要技能检定时，直接调用 roll_skill_check；需要理智检定时，调用 roll_san_check
+- 工具会立即返回真实的掷骰结果，拿到结果后在同一次回复里继续叙事，narrative 应包含检定前后的完整描写
+- 不要再在 game_directives 中放 skill_check 或 san_check，其余指令（线索、模式切换等）照常使用
+- 最终回复仍然必须是规定的 JSON 格式"""
+
+DICE_TOOLS = [
+    AITool(
+        name="roll_skill_check",
+        description="为调查员进行一次 CoC 7e 技能检定，返回掷骰结果与成败。",
+        parameters={
+            "type": "object",
+            "properties": {
+                "skill": {"type": "string", "description": "技能名，如 侦查、图书馆使用"},
+                "difficulty": {
+                    "type": "string",
+                    "enum": ["regular", "hard", "extreme"],
+                    "description": "难度等级",
+                },
+                "reason": {"type": "string", "description": "检定原因"},
+                "character_id": {
+                    "type": "string",
+                    "description": "进行检定的角色 ID，省略则为当前行动角色",
+                },
+            },
+            "required": ["skill"],
+        },
+    ),
+    AITool(
+        name="roll_san_check",
+        description="为调查员进行一次理智检定，返回掷骰结果与失去的理智值。",
+        parameters={
+            "type": "object",
+            "properties": {
+                "san_loss_success": {
+                    "type": "string",
+                    "description": "成功时的理智损失，如 0 或 1",
+                },
+                "san_loss_failure": {"type": "string", "description": "失败时的理智损失，如 1d6"},
+                "reason": {"type": "string", "description": "检定原因"},
+                "character_id": {
+                    "type": "string",
+                    "description": "进行检定的角色 ID，省略则为当前行动角色",
+                },
+            },
+            "required": ["san_loss_failure"],
+        },
+    ),
+]
+
+
+def tool_directive(name: str, args: dict) -> Optional[GameDirective]:
+    """Translate a dice tool call into the equivalent game directive."""
+    if name == "roll_skill_check":
+        return GameDirective(
+            type="skill_check",
+            skill=str(args.get("skill", "")),
+            difficulty=str(args.get("difficulty", "regular")),
+            reason=str(args.get("reason", "")),
+            target_character=str(args.get("character_id", "")),
+        )
+    if name == "roll_san_check":
+        return GameDirective(
+            type="san_check",
+            san_loss_success=str(args.get("san_loss_success", "0")),
+            san_loss_failure=str(args.get("san_loss_failure", "1d6")),
+            reason=str(args.get("reason", "")),
+            target_character=str(args.get("character_id", "")),
+        )
+    return None
@@ -1,28 +1,71 @@
 """KP Engine - orchestrates AI calls for the Keeper."""
 
+import asyncio
 from typing import AsyncIterator, Optional
 
-from backend.ai.prompt_builder import build_messages
-from backend.ai.providers.base import AIProviderBase, AIResponse
-from backend.ai.response_parser import KPResponse, parse_response
+from backend.ai.context_window import entry_tokens, history_budget_for, select_history
+from backend.ai.dice_tools import DICE_TOOLS, TOOL_MODE_PROMPT
+from backend.ai.prompt_builder import PromptCache, PromptStats, build_messages, history_step
+from backend.ai.providers.base import AIMessage, AIProviderBase, ToolHandler
+from backend.ai.response_parser import (
+    KPResponse,
+    StreamingResponseParser,
+    parse_response,
+    parsed_entry,
+)
+from backend.ai.summarizer import HistoryCompactor
 from backend.character.models import CoCCharacter
-from backend.scenario.models import Scenario
+from backend.scenario.index import DEFAULT_CONTEXT_BUDGET, ScenarioIndex
+from backend.scenario.models import PlotPoint, Scenario
+
+# Minimum number of evicted, unsummarized entries before a compaction runs
+COMPACTION_BATCH = 6
 
 
 class KeeperEngine:
-    def __init__(self, provider: AIProviderBase, scenario: Scenario):
+    def __init__(
+        self,
+        provider: AIProviderBase,
+        scenario: Scenario,
+        history_budget: int = 0,
+        summary_provider: Optional[AIProviderBase] = None,
+        scenario_index: Optional[ScenarioIndex] = None,
+        scenario_budget: int = DEFAULT_CONTEXT_BUDGET,
+        prompt_layout: str = "layered",
+    ):
         self.provider = provider
         self.scenario = scenario
         self.history: list[dict] = []
         self._total_tokens = 0
+        self.history_budget = history_budget or history_budget_for(
+            getattr(provider, "model", "")
+        )
+        # Rolling summary of history[:summarized_upto]
+        self.story_summary = ""
+        self.summarized_upto = 0
+        self._compactor = HistoryCompactor(summary_provider or provider)
+        self._compaction_task: Optional[asyncio.Task] = None
+        self.prompt_cache = PromptCache()
+        self.prompt_stats = PromptStats()
+        self.prompt_layout = prompt_layout  # "layered" | "stable_prefix"
+        # Relevance-selected scenario layer; None sends the whole module
+        self.scenario_index = scenario_index
+        self.scenario_budget = scenario_budget
+        # Plot point of the turn in progress, reused for its continuations
+        self._plot_point: Optional[PlotPoint] = None
 
-    async def generate_response(
+    async def _build_messages(
         self,
         player_input: str,
         characters: list[CoCCharacter],
         plot_progress: str = "",
         turn_state: dict | None = None,
-    ) -> KPResponse:
+        versions: dict | None = None,
+        extra_rules: str = "",
+    ) -> list[AIMessage]:
+        if self.prompt_layout == "stable_prefix":
+            await self._catch_up_summary()
+        profile: dict = {}
         messages = build_messages(
             scenario=self.scenario,
             characters=characters,
@@ -30,17 +73,92 @@ class KeeperEngine:
             history=self.history,
             player_input=player_input,
             turn_state=turn_state,
+            history_budget=self.history_budget,
+            story_summary=self.story_summary,
+            extra_rules=extra_rules,
+            cache=self.prompt_cache,
+            versions=versions,
+            scenario_index=self.scenario_index,
+            plot_point=self._plot_point,
+            scenario_budget=self.scenario_budget,
+            profile=profile,
+            layout=self.prompt_layout,
+        )
+        self.prompt_stats.record(profile)
+        return messages
+
+    def _count_usage(self, usage: dict) -> None:
+        self._total_tokens += usage.get("input_tokens", 0)
+        self._total_tokens += usage.get("output_tokens", 0)
+        self._total_tokens += usage.get("cache_read_input_tokens", 0)
+        self._total_tokens += usage.get("cache_creation_input_tokens", 0)
+
+    def _append_history(
+        self, role: str, content: str, kp_resp: Optional[KPResponse] = None
+    ) -> None:
+        entry = {"role": role, "content": content}
+        entry_tokens(entry)
+        if kp_resp is not None:
+            parsed_entry(entry, kp_resp)
+        self.history.append(entry)
+
+    async def generate_response(
+        self,
+        player_input: str,
+        characters: list[CoCCharacter],
+        plot_progress: str = "",
+        turn_state: dict | None = None,
+        versions: dict | None = None,
+        plot_point: Optional[PlotPoint] = None,
+    ) -> KPResponse:
+        self._plot_point = plot_point
+        messages = await self._build_messages(
+            player_input=player_input,
+            characters=characters,
+            plot_progress=plot_progress,
+            turn_state=turn_state,
+            versions=versions,
         )
 
         ai_resp = await self.provider.generate(messages)
-        self._total_tokens += ai_resp.usage.get("input_tokens", 0)
-        self._total_tokens += ai_resp.usage.get("output_tokens", 0)
+        self._count_usage(ai_resp.usage)
 
         kp_resp = parse_response(ai_resp.content)
 
         # Update conversation history
-        self.history.append({"role": "user", "content": player_input})
-        self.history.append({"role": "assistant", "content": ai_resp.content})
+        self._append_history("user", player_input)
+        self._append_history("assistant", ai_resp.content, kp_resp)
+
+        return kp_resp
+
+    async def generate_with_dice_tools(
+        self,
+        player_input: str,
+        characters: list[CoCCharacter],
+        handler: ToolHandler,
+        plot_progress: str = "",
+        turn_state: dict | None = None,
+        versions: dict | None = None,
+        plot_point: Optional[PlotPoint] = None,
+    ) -> KPResponse:
+        """Single-round-trip turn: dice checks are tool calls resolved by `handler`."""
+        self._plot_point = plot_point
+        messages = await self._build_messages(
+            player_input=player_input,
+            characters=characters,
+            plot_progress=plot_progress,
+            turn_state=turn_state,
+            versions=versions,
+            extra_rules=TOOL_MODE_PROMPT,
+        )
+
+        ai_resp = await self.provider.generate_with_tools(messages, DICE_TOOLS, handler)
+        self._count_usage(ai_resp.usage)
+
+        kp_resp = parse_response(ai_resp.content)
+
+        self._append_history("user", player_input)
+        self._append_history("assistant", ai_resp.content, kp_resp)
 
         return kp_resp
 
@@ -49,39 +167,117 @@ class KeeperEngine:
         player_input: str,
         characters: list[CoCCharacter],
         plot_progress: str = "",
+        turn_state: dict | None = None,
+        versions: dict | None = None,
+        plot_point: Optional[PlotPoint] = None,
+        parser: Optional[StreamingResponseParser] = None,
     ) -> AsyncIterator[str]:
-        """Stream raw text chunks from the AI. Parse after collection."""
-        messages = build_messages(
-            scenario=self.scenario,
+        """Stream raw text chunks from the AI. Parse after collection.
+
+        Pass the `parser` the caller feeds these chunks to, and history keeps
+        its result instead of parsing the reply a second time.
+        """
+        self._plot_point = plot_point
+        messages = await self._build_messages(
+            player_input=player_input,
             characters=characters,
             plot_progress=plot_progress,
-            history=self.history,
-            player_input=player_input,
+            turn_state=turn_state,
+            versions=versions,
         )
+        async for chunk in self._stream_turn(player_input, messages, parser):
+            yield chunk
 
-        full_text = ""
-        async for chunk in self.provider.stream(messages):
-            full_text += chunk
+    async def _stream_turn(
+        self,
+        user_content: str,
+        messages: list[AIMessage],
+        parser: Optional[StreamingResponseParser],
+    ) -> AsyncIterator[str]:
+        parts = []
+        usage: dict = {}
+        async for chunk in self.provider.stream(messages, usage=usage):
+            parts.append(chunk)
             yield chunk
+        self._count_usage(usage)
 
-        self.history.append({"role": "user", "content": player_input})
-        self.history.append({"role": "assistant", "content": full_text})
+        self._append_history("user", user_content)
+        text = "".join(parts)
+        kp_resp = parser.close() if parser is not None else parse_response(text)
+        self._append_history("assistant", text, kp_resp)
 
     async def feed_result(self, result_text: str) -> KPResponse:
         """Feed a game result (e.g. dice roll) back to AI for continuation."""
-        messages = build_messages(
-            scenario=self.scenario,
+        messages = await self._build_messages(
+            player_input=result_text,
             characters=[],
             plot_progress="",
-            history=self.history,
-            player_input=result_text,
         )
         ai_resp = await self.provider.generate(messages)
+        self._count_usage(ai_resp.usage)
         kp_resp = parse_response(ai_resp.content)
 
-        self.history.append({"role": "user", "content": result_text})
-        self.history.append({"role": "assistant", "content": ai_resp.content})
+        self._append_history("user", result_text)
+        self._append_history("assistant", ai_resp.content, kp_resp)
         return kp_resp
 
+    async def stream_feed_result(
+        self, result_text: str, parser: Optional[StreamingResponseParser] = None
+    ) -> AsyncIterator[str]:
+        """Streaming variant of feed_result: yields raw continuation chunks."""
+        messages = await self._build_messages(
+            player_input=result_text,
+            characters=[],
+            plot_progress="",
+        )
+        async for chunk in self._stream_turn(result_text, messages, parser):
+            yield chunk
+
+    def pending_compaction(self) -> tuple[int, int]:
+        """Range of history entries evicted from the window but not yet summarized."""
+        # Same window as the prompt, so compaction lands when its start moves
+        window_start = select_history(
+            self.history, self.history_budget, history_step(self.prompt_layout)
+        )
+        return self.summarized_upto, max(self.summarized_upto, window_start)
+
+    def schedule_compaction(self) -> Optional[asyncio.Task]:
+        """Start folding evicted turns into the summary in the background.
+
+        Meant to be called once a turn is complete, so the summary call runs
+        while the table is idle waiting for the next player action.
+        """
+        if self._compaction_task and not self._compaction_task.done():
+            return None
+        start, end = self.pending_compaction()
+        if end - start < COMPACTION_BATCH:
+            return None
+        self._compaction_task = asyncio.create_task(self.compact(end))
+        return self._compaction_task
+
+    async def _catch_up_summary(self) -> None:
+        """Summarize whatever the window is about to evict, before the prompt.
+
+        The summary is part of the stable prefix: refreshed a turn after the
+        window moved, the prefix would break twice per window step.
+        """
+        if self._compaction_task and not self._compaction_task.done():
+            await asyncio.shield(self._compaction_task)
+        start, end = self.pending_compaction()
+        if end > start:
+            await self.compact(end)
+
+    async def compact(self, end: int) -> None:
+        """Fold history[summarized_upto:end] into the story summary."""
+        start = self.summarized_upto
+        if end <= start:
+            return
+        try:
+            summary = await self._compactor.fold(self.story_summary, self.history[start:end])
+        except Exception:
+            return  # Keep the old summary; the range is retried after the next turn
+        self.story_summary = summary
+        self.summarized_upto = end
+
     def get_token_usage(self) -> int:
         return self._total_tokens
@@ -1,8 +1,29 @@
 """5-layer prompt builder for the AI KP."""
 
+from backend.ai.context_window import (
+    MESSAGE_OVERHEAD,
+    STABLE_WINDOW_STEP,
+    align_window,
+    estimate_tokens,
+    select_history,
+)
 from backend.ai.providers.base import AIMessage
+from backend.ai.response_parser import parsed_entry
 from backend.character.models import CoCCharacter
-from backend.scenario.models import Scenario
+from backend.scenario.index import DEFAULT_CONTEXT_BUDGET, ScenarioIndex
+from backend.scenario.models import PlotPoint, Scenario
+
+# Recent history entries that feed the scenario retrieval query
+RETRIEVAL_HISTORY = 4
+
+PROMPT_LAYERS = ("persona", "scenario", "progress", "history", "input")
+
+PROMPT_LAYOUTS = ("layered", "stable_prefix")
+
+
+def history_step(layout: str) -> int:
+    """How far the history window start moves at once under `layout`."""
+    return STABLE_WINDOW_STEP if layout == "stable_prefix" else 1
 
 
 KP_SYSTEM_PROMPT = """你是一位经验丰富的 CoC 7e 守密人（KP）。你的职责是：
@@ -17,12 +38,14 @@ KP_SYSTEM_PROMPT = """你是一位经验丰富的 CoC 7e 守密人（KP）。你
 {
   "narrative": "你的叙事描述文本",
   "game_directives": [
-    {"type": "skill_check", "skill": "技能名", "difficulty": "regular/hard/extreme", "reason": "原因"},
+    {"type": "skill_check", "skill": "技能名", "difficulty": "regular/hard/extreme",
+     "reason": "原因"},
     {"type": "san_check", "san_loss_success": "0", "san_loss_failure": "1d6", "reason": "原因"},
     {"type": "clue_discovered", "clue_id": "线索ID", "reason": "发现方式"},
     {"type": "mode_switch", "mode": "combat/exploration", "reason": "切换原因"},
     {"type": "switch_character", "next_character_id": "角色ID", "reason": "切换原因"},
-    {"type": "grant_extra_action", "target_character": "角色ID", "action_count": 1, "reason": "原因"}
+    {"type": "grant_extra_action", "target_character": "角色ID", "action_count": 1,
+     "reason": "原因"}
   ],
   "npc_actions": [
     {"npc_id": "npc标识", "action": "dialogue/move/attack", "content": "内容"}
@@ -43,6 +66,26 @@ KP_SYSTEM_PROMPT = """你是一位经验丰富的 CoC 7e 守密人（KP）。你
 - switch_character 的 next_character_id 必须是队伍中存在的角色 ID"""
 
 
+class PromptCache:
+    """Rendered prompt layers, reused until their inputs change.
+
+    Static layers are keyed by the scenario object and rendered once; dynamic
+    layers are keyed by the version counters of the services that feed them,
+    so unchanged layers are returned as the exact same string every turn.
+    """
+
+    def __init__(self):
+        self._layers: dict[str, tuple[object, str]] = {}
+
+    def get(self, name: str, key: object, render) -> str:
+        cached = self._layers.get(name)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        text = render()
+        self._layers[name] = (key, text)
+        return text
+
+
 def build_messages(
     scenario: Scenario,
     characters: list[CoCCharacter],
@@ -51,45 +94,186 @@ def build_messages(
     player_input: str,
     max_history: int = 20,
     turn_state: dict | None = None,
+    history_budget: int | None = None,
+    story_summary: str = "",
+    extra_rules: str = "",
+    cache: PromptCache | None = None,
+    versions: dict | None = None,
+    scenario_index: ScenarioIndex | None = None,
+    plot_point: PlotPoint | None = None,
+    scenario_budget: int = DEFAULT_CONTEXT_BUDGET,
+    profile: dict | None = None,
+    layout: str = "layered",
 ) -> list[AIMessage]:
-    """Build the 5-layer prompt for the AI KP."""
-    messages: list[AIMessage] = []
+    """Build the 5-layer prompt for the AI KP.
+
+    With `history_budget` set, the history layer is filled newest-first up to
+    that many estimated tokens instead of the last `max_history` messages.
+    With a `cache`, the static scenario layer is rendered once per scenario;
+    given `versions` ("characters", "turn" counters) the investigator status
+    and turn layers are only re-rendered when those counters move.
+    With a `scenario_index`, only the NPCs, locations and clues relevant to
+    `plot_point`, recent history and the input are sent, within
+    `scenario_budget` tokens, instead of the whole module.
+    Pass a dict as `profile` to have it filled with the per-layer size
+    breakdown (see `profile_layers`).
+    `layout="stable_prefix"` folds every volatile layer (relevant scenario
+    entries, investigator status, plot progress, turn state) into the final
+    user message and moves the history window start in steps of
+    `STABLE_WINDOW_STEP`, so consecutive turns share a byte-identical prefix
+    for servers that reuse KV cache on exact prefix matches. System
+    messages then only appear at the start, as some chat templates require.
+    """
+    if layout not in PROMPT_LAYOUTS:
+        raise ValueError(f"Unknown prompt layout: {layout}")
+    cache = cache or PromptCache()
+    versions = versions or {}
+    def dynamic(name: str, deps: tuple, render) -> str:
+        if all(d in versions for d in deps):
+            key = tuple(versions[d] for d in deps)
+        else:
+            key = object()  # Unversioned: always re-render
+        return cache.get(name, key, render)
+
+    # (layer, message, volatile) in layered order
+    parts: list[tuple[str, AIMessage, bool]] = []
+
+    def add(layer: str, role: str, content: str, cacheable: bool = False, volatile: bool = False):
+        parts.append((layer, AIMessage(role=role, content=content, cacheable=cacheable), volatile))
 
     # Layer 1: KP persona + rules (system)
-    messages.append(AIMessage(role="system", content=KP_SYSTEM_PROMPT))
+    add("persona", "system", KP_SYSTEM_PROMPT, cacheable=True)
+    if extra_rules:
+        add("persona", "system", extra_rules, cacheable=True)
+
+    # Layer 2: Scenario context (static) + investigator status (dynamic)
+    if scenario_index is None:
+        scenario_ctx = cache.get(
+            "scenario", id(scenario), lambda: _build_scenario_context(scenario)
+        )
+        add("scenario", "system", scenario_ctx, cacheable=True)
+    else:
+        header = cache.get(
+            "scenario_header", id(scenario), lambda: _build_scenario_header(scenario)
+        )
+        add("scenario", "system", header, cacheable=True)
+        relevant = scenario_index.context(
+            plot_point,
+            # Replies by their narrative, so envelope keys are not query terms
+            [
+                parsed_entry(e)["narrative"] if e["role"] == "assistant" else e["content"]
+                for e in history[-RETRIEVAL_HISTORY:]
+            ],
+            player_input,
+            scenario_budget,
+        )
+        if relevant:
+            add("scenario", "system", relevant, volatile=True)
 
-    # Layer 2: Scenario context
-    scenario_ctx = _build_scenario_context(scenario, characters)
-    messages.append(AIMessage(role="system", content=scenario_ctx))
+    if characters:
+        status = dynamic(
+            "status", ("characters",), lambda: _build_character_status(characters)
+        )
+        add("scenario", "system", status, volatile=True)
 
     # Layer 3: Plot progress + turn state
     if plot_progress:
-        messages.append(AIMessage(role="system", content=plot_progress))
+        add("progress", "system", plot_progress, volatile=True)
 
     if turn_state:
-        turn_ctx = _build_turn_context(turn_state, characters)
+        turn_ctx = dynamic(
+            "turn", ("turn", "characters"), lambda: _build_turn_context(turn_state, characters)
+        )
         if turn_ctx:
-            messages.append(AIMessage(role="system", content=turn_ctx))
+            add("progress", "system", turn_ctx, volatile=True)
 
-    # Layer 4: Conversation history (sliding window)
-    trimmed = history[-max_history:] if len(history) > max_history else history
-    for entry in trimmed:
-        messages.append(AIMessage(role=entry["role"], content=entry["content"]))
+    # Layer 4: Story-so-far summary + conversation history (sliding window)
+    if story_summary:
+        add("history", "system", f"[前情提要]\n{story_summary}")
+    step = history_step(layout)
+    if history_budget is not None:
+        start = select_history(history, history_budget, step)
+    else:
+        start = align_window(history, max(0, len(history) - max_history), step)
+    for entry in history[start:]:
+        add("history", entry["role"], entry["content"])
 
     # Layer 5: Current player input
-    messages.append(AIMessage(role="user", content=player_input))
+    add("input", "user", player_input, volatile=True)
 
-    return messages
+    if profile is not None:
+        profile.update(profile_layers(parts))
 
+    if layout == "stable_prefix":
+        # Volatile layers ride along with the player input, after history
+        volatile = [message.content for _, message, is_volatile in parts if is_volatile]
+        stable = [message for _, message, is_volatile in parts if not is_volatile]
+        if len(volatile) > 1:
+            volatile[-1] = f"[玩家行动]\n{player_input}"
+        return stable + [AIMessage(role="user", content="\n\n".join(volatile))]
 
-def _build_scenario_context(
-    scenario: Scenario, characters: list[CoCCharacter]
-) -> str:
-    parts = [
+    return [message for _, message, _ in parts]
+
+
+def profile_layers(parts: list[tuple[str, AIMessage, bool]]) -> dict:
+    """Estimated tokens, characters and message count of each prompt layer."""
+    profile = {layer: {"tokens": 0, "chars": 0, "messages": 0} for layer in PROMPT_LAYERS}
+    for layer, message, _ in parts:
+        size = profile[layer]
+        size["tokens"] += estimate_tokens(message.content) + MESSAGE_OVERHEAD
+        size["chars"] += len(message.content)
+        size["messages"] += 1
+    return profile
+
+
+class PromptStats:
+    """Running per-layer prompt size statistics for one session."""
+
+    def __init__(self):
+        self.prompts = 0
+        self.totals = {layer: {"tokens": 0, "chars": 0} for layer in PROMPT_LAYERS}
+        self.peak = {layer: 0 for layer in PROMPT_LAYERS}
+        self.last: dict = {}
+
+    def record(self, profile: dict) -> None:
+        self.prompts += 1
+        self.last = profile
+        for layer, size in profile.items():
+            self.totals[layer]["tokens"] += size["tokens"]
+            self.totals[layer]["chars"] += size["chars"]
+            self.peak[layer] = max(self.peak[layer], size["tokens"])
+
+    def to_dict(self) -> dict:
+        total_tokens = sum(t["tokens"] for t in self.totals.values())
+        layers = {}
+        for layer in PROMPT_LAYERS:
+            tokens = self.totals[layer]["tokens"]
+            layers[layer] = {
+                "total_tokens": tokens,
+                "total_chars": self.totals[layer]["chars"],
+                "avg_tokens": round(tokens / self.prompts, 1) if self.prompts else 0,
+                "peak_tokens": self.peak[layer],
+                "share": round(tokens / total_tokens, 3) if total_tokens else 0,
+            }
+        return {
+            "prompts": self.prompts,
+            "total_tokens": total_tokens,
+            "layers": layers,
+            "last": self.last,
+        }
+
+
+def _build_scenario_header(scenario: Scenario) -> str:
+    return "\n\n".join([
         f"[剧本] {scenario.meta.title}",
         f"时代：{scenario.meta.era}",
         f"[KP 指南] {scenario.keeper_guide}",
-    ]
+    ])
+
+
+def _build_scenario_context(scenario: Scenario) -> str:
+    """Static scenario layer: identical for every turn of a session."""
+    parts = [_build_scenario_header(scenario)]
 
     # Active NPCs
     if scenario.npcs:
@@ -108,29 +292,30 @@ def _build_scenario_context(
             loc_lines.append(f"- {loc.name}: {loc.atmosphere}")
         parts.append("[地点]\n" + "\n".join(loc_lines))
 
-    # Character summary
-    if characters:
-        char_lines = []
-        for c in characters:
-            char_lines.append(
-                f"- {c.name}: HP {c.derived.hp}/{c.derived.hp_max}, "
-                f"SAN {c.derived.san}/{c.derived.san_max}, "
-                f"MP {c.derived.mp}/{c.derived.mp_max}"
-            )
-        parts.append("[调查员状态]\n" + "\n".join(char_lines))
-
     # Available clues (so AI knows valid clue_ids)
     if scenario.clues:
         clue_lines = []
         for clue_id, clue in scenario.clues.items():
             clue_lines.append(
-                f"- {clue_id}: {clue.description} (重要性: {clue.importance}, 发现方式: {clue.discovery})"
+                f"- {clue_id}: {clue.description} "
+                f"(重要性: {clue.importance}, 发现方式: {clue.discovery})"
             )
         parts.append("[线索清单 - 使用这些 clue_id]\n" + "\n".join(clue_lines))
 
     return "\n\n".join(parts)
 
 
+def _build_character_status(characters: list[CoCCharacter]) -> str:
+    char_lines = []
+    for c in characters:
+        char_lines.append(
+            f"- {c.name}: HP {c.derived.hp}/{c.derived.hp_max}, "
+            f"SAN {c.derived.san}/{c.derived.san_max}, "
+            f"MP {c.derived.mp}/{c.derived.mp_max}"
+        )
+    return "[调查员状态]\n" + "\n".join(char_lines)
+
+
 def _build_turn_context(
     turn_state: dict, characters: list[CoCCharacter]
 ) -> str:
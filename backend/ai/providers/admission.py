@@ -0,0 +1,261 @@
+"""Server-wide admission control for AI provider calls.
+
+A single AdmissionController is shared by every session. It caps requests in
+flight, enforces requests-per-minute and tokens-per-minute token buckets, and
+admits queued calls round-robin across sessions so one busy table cannot
+starve the others.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Callable, Optional
+
+from backend.ai.context_window import MESSAGE_OVERHEAD, estimate_tokens
+from backend.ai.providers.base import (
+    AIMessage,
+    AIProviderBase,
+    AIResponse,
+    AITool,
+    ToolHandler,
+)
+
+_session_key: ContextVar[str] = ContextVar("llm_session_key", default="")
+
+
+def set_session_key(key: str) -> None:
+    """Tag AI calls made from the current task with a session for fair queuing."""
+    _session_key.set(key)
+
+
+def estimate_prompt_tokens(messages: list[AIMessage]) -> int:
+    return sum(estimate_tokens(m.content) + MESSAGE_OVERHEAD for m in messages)
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float, clock: Callable[[], float] = time.monotonic):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = float(per_minute)
+        self._clock = clock
+        self._updated = clock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` can be taken.
+
+        Requests larger than the bucket wait for a full one.
+        """
+        self._refill()
+        need = min(amount, self.capacity)
+        if self.tokens >= need:
+            return 0.0
+        return (need - self.tokens) / self.rate
+
+    def take(self, amount: float) -> None:
+        """Remove tokens; the balance may go negative to record debt."""
+        self._refill()
+        self.tokens -= amount
+
+
+class _Waiter:
+    __slots__ = ("future", "tokens", "enqueued")
+
+    def __init__(self, future: asyncio.Future, tokens: int, enqueued: float):
+        self.future = future
+        self.tokens = tokens
+        self.enqueued = enqueued
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        max_in_flight: int = 16,
+        requests_per_minute: int = 0,
+        tokens_per_minute: int = 0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_in_flight = max_in_flight or float("inf")  # 0 = unlimited
+        self._clock = clock
+        self._rpm = TokenBucket(requests_per_minute, clock) if requests_per_minute else None
+        self._tpm = TokenBucket(tokens_per_minute, clock) if tokens_per_minute else None
+        self._queues: OrderedDict[str, deque[_Waiter]] = OrderedDict()
+        self._in_flight = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._admitted = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def _bucket_delay(self, tokens: int) -> float:
+        delay = 0.0
+        if self._rpm:
+            delay = max(delay, self._rpm.wait_time(1))
+        if self._tpm:
+            delay = max(delay, self._tpm.wait_time(tokens))
+        return delay
+
+    def _admit(self, tokens: int, waited: float) -> None:
+        self._in_flight += 1
+        if self._rpm:
+            self._rpm.take(1)
+        if self._tpm:
+            self._tpm.take(tokens)
+        self._admitted += 1
+        self._total_wait += waited
+        self._max_wait = max(self._max_wait, waited)
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._queues and self._in_flight < self.max_in_flight:
+            key, queue = next(iter(self._queues.items()))
+            waiter = queue[0]
+            if waiter.future.done():  # Cancelled while queued
+                queue.popleft()
+                if not queue:
+                    del self._queues[key]
+                continue
+            delay = self._bucket_delay(waiter.tokens)
+            if delay > 0:
+                loop = asyncio.get_running_loop()
+                self._timer = loop.call_later(delay, self._dispatch)
+                return
+            queue.popleft()
+            if queue:
+                self._queues.move_to_end(key)
+            else:
+                del self._queues[key]
+            self._admit(waiter.tokens, self._clock() - waiter.enqueued)
+            waiter.future.set_result(None)
+
+    async def acquire(self, key: str, tokens: int = 0) -> None:
+        if (
+            not self._queues
+            and self._in_flight < self.max_in_flight
+            and self._bucket_delay(tokens) == 0
+        ):
+            self._admit(tokens, 0.0)
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(key, deque()).append(_Waiter(future, tokens, self._clock()))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self) -> None:
+        self._in_flight -= 1
+        self._dispatch()
+
+    def charge(self, tokens: int) -> None:
+        """Bill tokens known only after the call (e.g. output) to the TPM bucket."""
+        if self._tpm and tokens > 0:
+            self._tpm.take(tokens)
+
+    @asynccontextmanager
+    async def slot(self, key: str, tokens: int = 0):
+        await self.acquire(key, tokens)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        depth = {k: sum(not w.future.done() for w in q) for k, q in self._queues.items()}
+        now = self._clock()
+        oldest = max(
+            (now - w.enqueued for q in self._queues.values() for w in q if not w.future.done()),
+            default=0.0,
+        )
+        return {
+            "in_flight": self._in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queue_depth": sum(depth.values()),
+            "queued_by_session": {k: n for k, n in depth.items() if n},
+            "oldest_wait": oldest,
+            "admitted": self._admitted,
+            "avg_wait": self._total_wait / self._admitted if self._admitted else 0.0,
+            "max_wait": self._max_wait,
+            "rpm_available": self._rpm.tokens if self._rpm else None,
+            "tpm_available": self._tpm.tokens if self._tpm else None,
+        }
+
+
+class AdmissionProvider(AIProviderBase):
+    """Routes every call of the wrapped provider through a shared controller."""
+
+    def __init__(self, inner: AIProviderBase, controller: AdmissionController):
+        self.inner = inner
+        self.controller = controller
+        self.model = getattr(inner, "model", "")
+
+    async def generate(
+        self,
+        messages: list[AIMessage],
+        temperature: float = 0.7,
+        max_tokens: int = 2048,
+    ) -> AIResponse:
+        estimate = estimate_prompt_tokens(messages)
+        async with self.controller.slot(_session_key.get(), estimate):
+            resp = await self.inner.generate(messages, temperature, max_tokens)
+        usage = resp.usage
+        self.controller.charge(usage.get("output_tokens") or usage.get("completion_tokens") or 0)
+        return resp
+
+    async def stream(
+        self,
+        messages: list[AIMessage],
+        temperature: float = 0.7,
+        max_tokens: int = 2048,
+        usage: Optional[dict] = None,
+    ) -> AsyncIterator[str]:
+        estimate = estimate_prompt_tokens(messages)
+        produced = 0
+        usage = {} if usage is None else usage
+        async with self.controller.slot(_session_key.get(), estimate):
+            async for chunk in self.inner.stream(messages, temperature, max_tokens, usage):
+                produced += estimate_tokens(chunk)
+                yield chunk
+        # Reported output tokens when the backend streams usage, else the estimate
+        self.controller.charge(
+            usage.get("output_tokens") or usage.get("completion_tokens") or produced
+        )
+
+    @property
+    def supports_tools(self) -> bool:
+        return self.inner.supports_tools
+
+    async def generate_with_tools(
+        self,
+        messages: list[AIMessage],
+        tools: list[AITool],
+        handler: ToolHandler,
+        temperature: float = 0.7,
+        max_tokens: int = 2048,
+        max_rounds: int = 4,
+    ) -> AIResponse:
+        # One admission covers every round of the exchange
+        estimate = estimate_prompt_tokens(messages)
+        async with self.controller.slot(_session_key.get(), estimate):
+            resp = await self.inner.generate_with_tools(
+                messages, tools, handler, temperature, max_tokens, max_rounds
+            )
+        usage = resp.usage
+        self.controller.charge(usage.get("output_tokens") or usage.get("completion_tokens") or 0)
+        return resp
+
+    async def warmup(self) -> None:
+        await self.inner.warmup()
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
@@ -2,7 +2,7 @@
 
 import os
 from abc import ABC, abstractmethod
-from typing import AsyncIterator, Optional
+from typing import AsyncIterator, Awaitable, Callable, Optional
 
 import httpx
 from pydantic import BaseModel
@@ -19,6 +19,14 @@ def _get_proxy() -> Optional[str]:
     return None
 
 
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
 def make_async_client(**kwargs) -> httpx.AsyncClient:
     """Create an httpx.AsyncClient with proper proxy handling."""
     proxy = _get_proxy()
@@ -26,12 +34,32 @@ def make_async_client(**kwargs) -> httpx.AsyncClient:
     if proxy:
         defaults["proxy"] = proxy
     defaults.update(kwargs)
+    # HTTP/2 needs the optional `h2` package; silently stay on HTTP/1.1 without it
+    if defaults.get("http2") and not _http2_available():
+        defaults["http2"] = False
     return httpx.AsyncClient(**defaults)
 
 
+def make_pooled_client(
+    max_connections: int = 20,
+    max_keepalive_connections: int = 10,
+    keepalive_expiry: float = 30.0,
+    http2: bool = False,
+    timeout: float = 120,
+) -> httpx.AsyncClient:
+    """Create a long-lived client with explicit connection-pool limits."""
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive_connections,
+        keepalive_expiry=keepalive_expiry,
+    )
+    return make_async_client(limits=limits, http2=http2, timeout=timeout)
+
+
 class AIMessage(BaseModel):
     role: str  # "system" | "user" | "assistant"
     content: str
+    cacheable: bool = False  # stable prefix layer, eligible for provider prompt caching
 
 
 class AIResponse(BaseModel):
@@ -40,6 +68,26 @@ class AIResponse(BaseModel):
     usage: dict = {}
 
 
+class AITool(BaseModel):
+    """A function the model may call; `parameters` is a JSON schema object."""
+
+    name: str
+    description: str
+    parameters: dict
+
+
+# Called with (tool name, arguments); returns the tool result text for the model
+ToolHandler = Callable[[str, dict], Awaitable[str]]
+
+
+def merge_usage(total: dict, usage: dict) -> dict:
+    """Sum numeric usage counters across the rounds of a tool-use exchange."""
+    for key, value in (usage or {}).items():
+        if isinstance(value, (int, float)):
+            total[key] = total.get(key, 0) + value
+    return total
+
+
 class AIProviderBase(ABC):
     """All AI backends must implement this interface."""
 
@@ -57,7 +105,76 @@ class AIProviderBase(ABC):
         messages: list[AIMessage],
         temperature: float = 0.7,
         max_tokens: int = 2048,
-    ) -> AsyncIterator[str]: ...
+        usage: Optional[dict] = None,
+    ) -> AsyncIterator[str]:
+        """Yield the reply as text chunks; token counts go into `usage` if given."""
+
+    supports_tools: bool = False
+
+    async def generate_with_tools(
+        self,
+        messages: list[AIMessage],
+        tools: list[AITool],
+        handler: ToolHandler,
+        temperature: float = 0.7,
+        max_tokens: int = 2048,
+        max_rounds: int = 4,
+    ) -> AIResponse:
+        """Generate a reply, resolving tool calls locally until the model finishes.
+
+        Only providers with `supports_tools` implement this.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support tool use")
+
+    async def warmup(self) -> None:
+        """Prepare the backend ahead of the first request (no-op by default)."""
+        return
+
+    async def aclose(self) -> None:
+        """Release resources held by the provider (no-op by default)."""
+        return
+
+
+class HTTPProviderBase(AIProviderBase):
+    """Provider that owns one shared, pooled httpx client for its lifetime."""
+
+    def __init__(
+        self,
+        base_url: str,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry: float = 30.0,
+        http2: bool = False,
+        timeout: float = 120,
+    ):
+        self._base_url = base_url
+        self._pool_options = {
+            "max_connections": max_connections,
+            "max_keepalive_connections": max_keepalive_connections,
+            "keepalive_expiry": keepalive_expiry,
+            "http2": http2,
+            "timeout": timeout,
+        }
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """The shared client, created lazily and recreated after aclose()."""
+        if self._client is None or self._client.is_closed:
+            self._client = make_pooled_client(**self._pool_options)
+        return self._client
+
+    async def warmup(self) -> None:
+        """Open a pooled connection so the first turn skips the TCP/TLS handshake."""
+        try:
+            await self.client.head(self._base_url)
+        except httpx.HTTPError:
+            pass
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
 
 
 def create_provider(name: str, **config) -> AIProviderBase:
@@ -68,5 +185,8 @@ def create_provider(name: str, **config) -> AIProviderBase:
     elif name == "openai":
         from backend.ai.providers.openai_provider import OpenAIProvider
         return OpenAIProvider(**config)
+    elif name == "replay":
+        from backend.ai.providers.replay import ReplayProvider
+        return ReplayProvider(**config)
     else:
         raise ValueError(f"Unknown AI provider: {name}")
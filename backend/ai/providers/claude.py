@@ -1,17 +1,63 @@
 """Anthropic Claude AI provider."""
 
-from typing import AsyncIterator
+from typing import AsyncIterator, Optional
 
-import httpx
+from backend.ai.providers.base import (
+    AIMessage,
+    AIResponse,
+    AITool,
+    HTTPProviderBase,
+    ToolHandler,
+    merge_usage,
+)
 
-from backend.ai.providers.base import AIMessage, AIProviderBase, AIResponse, make_async_client
 
+class ClaudeProvider(HTTPProviderBase):
+    supports_tools = True
 
-class ClaudeProvider(AIProviderBase):
-    def __init__(self, api_key: str = "", model: str = "claude-sonnet-4-20250514"):
+    def __init__(
+        self,
+        api_key: str = "",
+        model: str = "claude-sonnet-4-20250514",
+        prompt_cache: bool = True,
+        **pool_options,
+    ):
+        super().__init__("https://api.anthropic.com/v1", **pool_options)
         self.api_key = api_key
         self.model = model
-        self._base_url = "https://api.anthropic.com/v1"
+        self.prompt_cache = prompt_cache
+
+    def _headers(self) -> dict:
+        return {
+            "x-api-key": self.api_key,
+            "anthropic-version": "2023-06-01",
+            "content-type": "application/json",
+        }
+
+    def _split_messages(self, messages: list[AIMessage]) -> tuple[list[dict], list[dict]]:
+        """Collect every system layer as a text block, separate from the chat turns.
+
+        Cache breakpoints go on the cacheable layers (persona, scenario), so the
+        stable prefix is written once and read back on later turns.
+        """
+        system_blocks: list[dict] = []
+        chat_msgs: list[dict] = []
+        for m in messages:
+            if m.role == "system":
+                block = {"type": "text", "text": m.content}
+                if self.prompt_cache and m.cacheable:
+                    block["cache_control"] = {"type": "ephemeral"}
+                system_blocks.append(block)
+            else:
+                chat_msgs.append({"role": m.role, "content": m.content})
+        return system_blocks, chat_msgs
+
+    @staticmethod
+    def _normalize_usage(usage: dict) -> dict:
+        usage = dict(usage or {})
+        usage["cache_read_input_tokens"] = usage.get("cache_read_input_tokens") or 0
+        usage["cache_creation_input_tokens"] = usage.get("cache_creation_input_tokens") or 0
+        return usage
 
     async def generate(
         self,
@@ -19,41 +65,91 @@ class ClaudeProvider(AIProviderBase):
         temperature: float = 0.7,
         max_tokens: int = 2048,
     ) -> AIResponse:
-        system_msg = ""
-        chat_msgs = []
-        for m in messages:
-            if m.role == "system":
-                system_msg = m.content
-            else:
-                chat_msgs.append({"role": m.role, "content": m.content})
+        system_blocks, chat_msgs = self._split_messages(messages)
+
+        payload = {
+            "model": self.model,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "messages": chat_msgs,
+        }
+        if system_blocks:
+            payload["system"] = system_blocks
+
+        resp = await self.client.post(
+            f"{self._base_url}/messages",
+            json=payload,
+            headers=self._headers(),
+        )
+        resp.raise_for_status()
+        data = resp.json()
 
+        content = data["content"][0]["text"] if data.get("content") else ""
+        return AIResponse(
+            content=content,
+            model=data.get("model", self.model),
+            usage=self._normalize_usage(data.get("usage", {})),
+        )
+
+    async def generate_with_tools(
+        self,
+        messages: list[AIMessage],
+        tools: list[AITool],
+        handler: ToolHandler,
+        temperature: float = 0.7,
+        max_tokens: int = 2048,
+        max_rounds: int = 4,
+    ) -> AIResponse:
+        system_blocks, chat_msgs = self._split_messages(messages)
         payload = {
             "model": self.model,
             "max_tokens": max_tokens,
             "temperature": temperature,
             "messages": chat_msgs,
+            "tools": [
+                {"name": t.name, "description": t.description, "input_schema": t.parameters}
+                for t in tools
+            ],
         }
-        if system_msg:
-            payload["system"] = system_msg
+        if system_blocks:
+            payload["system"] = system_blocks
 
-        async with make_async_client() as client:
-            resp = await client.post(
+        usage: dict = {}
+        data: dict = {}
+        for round_num in range(max_rounds):
+            if round_num == max_rounds - 1:
+                payload["tool_choice"] = {"type": "none"}
+            resp = await self.client.post(
                 f"{self._base_url}/messages",
                 json=payload,
-                headers={
-                    "x-api-key": self.api_key,
-                    "anthropic-version": "2023-06-01",
-                    "content-type": "application/json",
-                },
+                headers=self._headers(),
             )
             resp.raise_for_status()
             data = resp.json()
+            merge_usage(usage, data.get("usage", {}))
 
-        content = data["content"][0]["text"] if data.get("content") else ""
+            blocks = data.get("content", [])
+            calls = [b for b in blocks if b.get("type") == "tool_use"]
+            if data.get("stop_reason") != "tool_use" or not calls:
+                break
+            results = []
+            for call in calls:
+                output = await handler(call["name"], call.get("input") or {})
+                results.append({
+                    "type": "tool_result",
+                    "tool_use_id": call["id"],
+                    "content": output,
+                })
+            chat_msgs.append({"role": "assistant", "content": blocks})
+            chat_msgs.append({"role": "user", "content": results})
+
+        content = "".join(
+            b.get("text", "") for b in data.get("content", []) if b.get("type") == "text"
+        )
         return AIResponse(
             content=content,
             model=data.get("model", self.model),
-            usage=data.get("usage", {}),
+            usage=self._normalize_usage(usage),
         )
 
     async def stream(
@@ -61,14 +157,9 @@ class ClaudeProvider(AIProviderBase):
         messages: list[AIMessage],
         temperature: float = 0.7,
         max_tokens: int = 2048,
+        usage: Optional[dict] = None,
     ) -> AsyncIterator[str]:
-        system_msg = ""
-        chat_msgs = []
-        for m in messages:
-            if m.role == "system":
-                system_msg = m.content
-            else:
-                chat_msgs.append({"role": m.role, "content": m.content})
+        system_blocks, chat_msgs = self._split_messages(messages)
 
         payload = {
             "model": self.model,
@@ -77,29 +168,31 @@ class ClaudeProvider(AIProviderBase):
             "messages": chat_msgs,
             "stream": True,
         }
-        if system_msg:
-            payload["system"] = system_msg
+        if system_blocks:
+            payload["system"] = system_blocks
 
-        async with make_async_client() as client:
-            async with client.stream(
-                "POST",
-                f"{self._base_url}/messages",
-                json=payload,
-                headers={
-                    "x-api-key": self.api_key,
-                    "anthropic-version": "2023-06-01",
-                    "content-type": "application/json",
-                },
-            ) as resp:
-                resp.raise_for_status()
-                async for line in resp.aiter_lines():
-                    if line.startswith("data: "):
-                        import json
-                        try:
-                            event = json.loads(line[6:])
-                            if event.get("type") == "content_block_delta":
-                                text = event.get("delta", {}).get("text", "")
-                                if text:
-                                    yield text
-                        except json.JSONDecodeError:
-                            continue
+        async with self.client.stream(
+            "POST",
+            f"{self._base_url}/messages",
+            json=payload,
+            headers=self._headers(),
+        ) as resp:
+            resp.raise_for_status()
+            async for line in resp.aiter_lines():
+                if line.startswith("data: "):
+                    import json
+                    try:
+                        event = json.loads(line[6:])
+                        if event.get("type") == "content_block_delta":
+                            text = event.get("delta", {}).get("text", "")
+                            if text:
+                                yield text
+                        elif usage is not None and event.get("type") == "message_start":
+                            usage.update(event.get("message", {}).get("usage", {}))
+                        elif usage is not None and event.get("type") == "message_delta":
+                            # Cumulative output count for the message so far
+                            usage.update(event.get("usage", {}))
+                    except json.JSONDecodeError:
+                        continue
+            if usage is not None:
+                usage.update(self._normalize_usage(usage))
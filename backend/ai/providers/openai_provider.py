@@ -1,22 +1,37 @@
 """OpenAI-compatible AI provider."""
 
-from typing import AsyncIterator
+import json
+from typing import AsyncIterator, Optional
 
-import httpx
+from backend.ai.providers.base import (
+    AIMessage,
+    AIResponse,
+    AITool,
+    HTTPProviderBase,
+    ToolHandler,
+    merge_usage,
+)
 
-from backend.ai.providers.base import AIMessage, AIProviderBase, AIResponse, make_async_client
 
+class OpenAIProvider(HTTPProviderBase):
+    supports_tools = True
 
-class OpenAIProvider(AIProviderBase):
     def __init__(
         self,
         api_key: str = "",
         model: str = "gpt-4o",
         base_url: str = "https://api.openai.com/v1",
+        **pool_options,
     ):
+        super().__init__(base_url, **pool_options)
         self.api_key = api_key
         self.model = model
-        self._base_url = base_url
+
+    def _headers(self) -> dict:
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        }
 
     def _build_messages(self, messages: list[AIMessage]) -> list[dict]:
         return [{"role": m.role, "content": m.content} for m in messages]
@@ -33,23 +48,85 @@ class OpenAIProvider(AIProviderBase):
             "temperature": temperature,
             "max_tokens": max_tokens,
         }
-        async with make_async_client() as client:
-            resp = await client.post(
+        resp = await self.client.post(
+            f"{self._base_url}/chat/completions",
+            json=payload,
+            headers=self._headers(),
+        )
+        resp.raise_for_status()
+        data = resp.json()
+
+        choice = data["choices"][0]
+        return AIResponse(
+            content=choice["message"]["content"],
+            model=data.get("model", self.model),
+            usage=data.get("usage", {}),
+        )
+
+    async def generate_with_tools(
+        self,
+        messages: list[AIMessage],
+        tools: list[AITool],
+        handler: ToolHandler,
+        temperature: float = 0.7,
+        max_tokens: int = 2048,
+        max_rounds: int = 4,
+    ) -> AIResponse:
+        chat_msgs = self._build_messages(messages)
+        payload = {
+            "model": self.model,
+            "messages": chat_msgs,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "tools": [
+                {
+                    "type": "function",
+                    "function": {
+                        "name": t.name,
+                        "description": t.description,
+                        "parameters": t.parameters,
+                    },
+                }
+                for t in tools
+            ],
+        }
+
+        usage: dict = {}
+        data: dict = {}
+        message: dict = {}
+        for round_num in range(max_rounds):
+            if round_num == max_rounds - 1:
+                payload["tool_choice"] = "none"
+            resp = await self.client.post(
                 f"{self._base_url}/chat/completions",
                 json=payload,
-                headers={
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json",
-                },
+                headers=self._headers(),
             )
             resp.raise_for_status()
             data = resp.json()
+            merge_usage(usage, data.get("usage", {}))
+
+            message = data["choices"][0]["message"]
+            calls = message.get("tool_calls") or []
+            if not calls:
+                break
+            chat_msgs.append(message)
+            for call in calls:
+                try:
+                    args = json.loads(call["function"].get("arguments") or "{}")
+                except json.JSONDecodeError:
+                    args = {}
+                output = await handler(call["function"]["name"], args)
+                chat_msgs.append({
+                    "role": "tool",
+                    "tool_call_id": call["id"],
+                    "content": output,
+                })
 
-        choice = data["choices"][0]
         return AIResponse(
-            content=choice["message"]["content"],
+            content=message.get("content") or "",
             model=data.get("model", self.model),
-            usage=data.get("usage", {}),
+            usage=usage,
         )
 
     async def stream(
@@ -57,6 +134,7 @@ class OpenAIProvider(AIProviderBase):
         messages: list[AIMessage],
         temperature: float = 0.7,
         max_tokens: int = 2048,
+        usage: Optional[dict] = None,
     ) -> AsyncIterator[str]:
         payload = {
             "model": self.model,
@@ -65,25 +143,25 @@ class OpenAIProvider(AIProviderBase):
             "max_tokens": max_tokens,
             "stream": True,
         }
-        async with make_async_client() as client:
-            async with client.stream(
-                "POST",
-                f"{self._base_url}/chat/completions",
-                json=payload,
-                headers={
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json",
-                },
-            ) as resp:
-                resp.raise_for_status()
-                async for line in resp.aiter_lines():
-                    if line.startswith("data: ") and line.strip() != "data: [DONE]":
-                        import json
-                        try:
-                            chunk = json.loads(line[6:])
-                            delta = chunk["choices"][0].get("delta", {})
-                            text = delta.get("content", "")
-                            if text:
-                                yield text
-                        except (json.JSONDecodeError, KeyError, IndexError):
-                            continue
+        if usage is not None:
+            # Token counts arrive in a final chunk with no choices
+            payload["stream_options"] = {"include_usage": True}
+        async with self.client.stream(
+            "POST",
+            f"{self._base_url}/chat/completions",
+            json=payload,
+            headers=self._headers(),
+        ) as resp:
+            resp.raise_for_status()
+            async for line in resp.aiter_lines():
+                if line.startswith("data: ") and line.strip() != "data: [DONE]":
+                    try:
+                        chunk = json.loads(line[6:])
+                        if usage is not None and chunk.get("usage"):
+                            usage.update(chunk["usage"])
+                        delta = chunk["choices"][0].get("delta", {})
+                        text = delta.get("content", "")
+                        if text:
+                            yield text
+                    except (json.JSONDecodeError, KeyError, IndexError):
+                        continue
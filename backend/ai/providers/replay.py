@@ -0,0 +1,160 @@
+"""Record/replay AI provider for deterministic offline benchmarks and tests.
+
+Responses are stored in a JSON cassette keyed by a hash of the message list.
+In ``replay`` mode the provider serves recorded responses with optional
+artificial latency and a token-by-token streaming rate; in ``record`` mode it
+wraps a real provider and collects every response it sees, writing the
+cassette once on ``aclose()``.
+"""
+
+import asyncio
+import hashlib
+import json
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+from backend.ai.providers.base import AIMessage, AIProviderBase, AIResponse
+
+CASSETTE_VERSION = 1
+
+
+class CassetteMissError(LookupError):
+    """No recorded response exists for the requested message list."""
+
+
+def message_key(messages: list[AIMessage]) -> str:
+    """Stable hash of the role/content sequence of a prompt."""
+    normalized = []
+    for m in messages:
+        m = AIMessage.model_validate(m)
+        normalized.append({"role": m.role, "content": m.content})
+    blob = json.dumps(normalized, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.entries: dict[str, dict] = {}
+        if self.path.exists():
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            self.entries = data.get("entries", {})
+
+    def get(self, key: str) -> Optional[AIResponse]:
+        entry = self.entries.get(key)
+        return AIResponse(**entry) if entry else None
+
+    def put(self, key: str, response: AIResponse) -> None:
+        self.entries[key] = response.model_dump()
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = {"version": CASSETTE_VERSION, "entries": self.entries}
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+        tmp.replace(self.path)
+
+
+class ReplayProvider(AIProviderBase):
+    def __init__(
+        self,
+        cassette: str | Path,
+        mode: str = "replay",
+        inner: Optional[AIProviderBase] = None,
+        latency: float = 0.0,
+        tokens_per_second: float = 0.0,
+        chunk_size: int = 1,
+        model: str = "replay",
+    ):
+        if mode not in ("replay", "record"):
+            raise ValueError(f"Unknown replay mode: {mode}")
+        if mode == "record" and inner is None:
+            raise ValueError("Record mode requires an inner provider")
+        self.cassette = Cassette(cassette)
+        self.mode = mode
+        self.inner = inner
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.chunk_size = max(1, chunk_size)
+        self.model = getattr(inner, "model", model)
+        self._unsaved = False  # Recorded responses not yet on disk
+
+    def _record(self, messages: list[AIMessage], response: AIResponse) -> None:
+        self.cassette.put(message_key(messages), response)
+        self._unsaved = True
+
+    def _lookup(self, messages: list[AIMessage]) -> AIResponse:
+        key = message_key(messages)
+        resp = self.cassette.get(key)
+        if resp is None:
+            raise CassetteMissError(f"No recorded response for prompt {key[:12]}")
+        return resp
+
+    def _chunks(self, text: str) -> list[str]:
+        # One character is roughly one token for the mostly-Chinese KP output
+        n = self.chunk_size
+        return [text[i:i + n] for i in range(0, len(text), n)]
+
+    def _token_delay(self) -> float:
+        if self.tokens_per_second <= 0:
+            return 0.0
+        return self.chunk_size / self.tokens_per_second
+
+    async def generate(
+        self,
+        messages: list[AIMessage],
+        temperature: float = 0.7,
+        max_tokens: int = 2048,
+    ) -> AIResponse:
+        if self.mode == "record":
+            resp = await self.inner.generate(messages, temperature, max_tokens)
+            self._record(messages, resp)
+            return resp
+
+        resp = self._lookup(messages)
+        delay = self.latency + self._token_delay() * len(self._chunks(resp.content))
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return resp
+
+    async def stream(
+        self,
+        messages: list[AIMessage],
+        temperature: float = 0.7,
+        max_tokens: int = 2048,
+        usage: Optional[dict] = None,
+    ) -> AsyncIterator[str]:
+        if self.mode == "record":
+            parts = []
+            recorded: dict = {}
+            async for chunk in self.inner.stream(messages, temperature, max_tokens, recorded):
+                parts.append(chunk)
+                yield chunk
+            if usage is not None:
+                usage.update(recorded)
+            self._record(
+                messages, AIResponse(content="".join(parts), model=self.model, usage=recorded)
+            )
+            return
+
+        resp = self._lookup(messages)
+        if usage is not None:
+            usage.update(resp.usage)
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+        delay = self._token_delay()
+        for chunk in self._chunks(resp.content):
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield chunk
+
+    async def warmup(self) -> None:
+        if self.inner is not None:
+            await self.inner.warmup()
+
+    async def aclose(self) -> None:
+        if self._unsaved:
+            await asyncio.to_thread(self.cassette.save)
+            self._unsaved = False
+        if self.inner is not None:
+            await self.inner.aclose()
@@ -0,0 +1,268 @@
+"""Retry, backoff, circuit breaking and failover around AI providers."""
+
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Callable, Optional
+
+import httpx
+
+from backend.ai.providers.base import (
+    AIMessage,
+    AIProviderBase,
+    AIResponse,
+    AITool,
+    ToolHandler,
+)
+
+# Rate limits, timeouts and server-side failures (529 = Anthropic "overloaded")
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504, 529}
+
+
+class CircuitOpenError(RuntimeError):
+    """Every provider is currently short-circuited."""
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code in RETRYABLE_STATUS
+    return isinstance(exc, httpx.TransportError)
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """Seconds requested by a `retry-after` header, if the error carries one."""
+    if not isinstance(exc, httpx.HTTPStatusError):
+        return None
+    value = exc.response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open -> half-open -> closed.
+
+    Half-open lets a single probe through; everyone else is refused until it
+    succeeds or fails. A probe that never reports back (cancelled, or a
+    non-retryable error) gives up its turn after another `reset_timeout`.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if self._clock() - self._opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state != "half_open":
+            return state == "closed"
+        now = self._clock()
+        if self._probe_at is not None and now - self._probe_at < self.reset_timeout:
+            return False  # Another caller is probing
+        self._probe_at = now
+        return True
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._opened_at = None
+        self._probe_at = None
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        self._probe_at = None
+        # A failed half-open probe re-opens immediately
+        if self._opened_at is not None or self._failures >= self.failure_threshold:
+            self._opened_at = self._clock()
+
+
+class ResilientProvider(AIProviderBase):
+    """Wraps one or more providers, tried in order.
+
+    Each provider gets bounded exponential backoff with full jitter (honouring
+    `retry-after`) and its own circuit breaker. When a provider's retries are
+    exhausted, or its breaker is open, the next provider takes over.
+    """
+
+    def __init__(
+        self,
+        providers: list[AIProviderBase],
+        max_retries: int = 2,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        sleep: Callable[[float], object] = asyncio.sleep,
+        rng: Callable[[], float] = random.random,
+    ):
+        if not providers:
+            raise ValueError("ResilientProvider needs at least one provider")
+        self.providers = providers
+        self.breakers = [
+            CircuitBreaker(failure_threshold, reset_timeout) for _ in providers
+        ]
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._sleep = sleep
+        self._rng = rng
+        self.model = getattr(providers[0], "model", "")
+
+    def _backoff(self, attempt: int, exc: BaseException) -> Optional[float]:
+        """Delay before the next attempt, or None to give up on this provider."""
+        if attempt >= self.max_retries:
+            return None
+        delay = self._rng() * min(self.max_delay, self.base_delay * 2 ** attempt)
+        requested = retry_after(exc)
+        if requested is not None:
+            if requested > self.max_delay:
+                return None  # Waiting that long is worse than failing over
+            delay = max(delay, requested)
+        return delay
+
+    async def generate(
+        self,
+        messages: list[AIMessage],
+        temperature: float = 0.7,
+        max_tokens: int = 2048,
+    ) -> AIResponse:
+        last_exc: Optional[BaseException] = None
+        for provider, breaker in zip(self.providers, self.breakers):
+            if not breaker.allow():
+                continue
+            attempt = 0
+            while True:
+                try:
+                    resp = await provider.generate(messages, temperature, max_tokens)
+                except Exception as e:
+                    if not is_retryable(e):
+                        raise
+                    breaker.record_failure()
+                    last_exc = e
+                    delay = self._backoff(attempt, e)
+                    if delay is None or not breaker.allow():
+                        break
+                    await self._sleep(delay)
+                    attempt += 1
+                    continue
+                breaker.record_success()
+                return resp
+        raise last_exc or CircuitOpenError("All AI providers are unavailable")
+
+    async def stream(
+        self,
+        messages: list[AIMessage],
+        temperature: float = 0.7,
+        max_tokens: int = 2048,
+        usage: Optional[dict] = None,
+    ) -> AsyncIterator[str]:
+        last_exc: Optional[BaseException] = None
+        for provider, breaker in zip(self.providers, self.breakers):
+            if not breaker.allow():
+                continue
+            attempt = 0
+            while True:
+                started = False
+                if usage is not None:
+                    usage.clear()  # Only the attempt that answers counts
+                try:
+                    async for chunk in provider.stream(messages, temperature, max_tokens, usage):
+                        started = True
+                        yield chunk
+                except Exception as e:
+                    if not is_retryable(e):
+                        raise
+                    breaker.record_failure()
+                    # Text already reached the caller: a retry would duplicate it
+                    if started:
+                        raise
+                    last_exc = e
+                    delay = self._backoff(attempt, e)
+                    if delay is None or not breaker.allow():
+                        break
+                    await self._sleep(delay)
+                    attempt += 1
+                    continue
+                breaker.record_success()
+                return
+        raise last_exc or CircuitOpenError("All AI providers are unavailable")
+
+    @property
+    def supports_tools(self) -> bool:
+        return all(p.supports_tools for p in self.providers)
+
+    async def generate_with_tools(
+        self,
+        messages: list[AIMessage],
+        tools: list[AITool],
+        handler: ToolHandler,
+        temperature: float = 0.7,
+        max_tokens: int = 2048,
+        max_rounds: int = 4,
+    ) -> AIResponse:
+        called = False
+
+        async def tracked(name: str, args: dict) -> str:
+            nonlocal called
+            called = True
+            return await handler(name, args)
+
+        last_exc: Optional[BaseException] = None
+        for provider, breaker in zip(self.providers, self.breakers):
+            if not breaker.allow():
+                continue
+            attempt = 0
+            while True:
+                try:
+                    resp = await provider.generate_with_tools(
+                        messages, tools, tracked, temperature, max_tokens, max_rounds
+                    )
+                except Exception as e:
+                    if not is_retryable(e):
+                        raise
+                    breaker.record_failure()
+                    # Tools already ran (dice were rolled): a retry would roll again
+                    if called:
+                        raise
+                    last_exc = e
+                    delay = self._backoff(attempt, e)
+                    if delay is None or not breaker.allow():
+                        break
+                    await self._sleep(delay)
+                    attempt += 1
+                    continue
+                breaker.record_success()
+                return resp
+        raise last_exc or CircuitOpenError("All AI providers are unavailable")
+
+    async def warmup(self) -> None:
+        for provider in self.providers:
+            await provider.warmup()
+
+    async def aclose(self) -> None:
+        for provider in self.providers:
+            await provider.aclose()
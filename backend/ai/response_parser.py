@@ -1,7 +1,6 @@
 """Parse structured JSON responses from the AI KP."""
 
 import json
-import re
 from typing import Optional
 
 from pydantic import BaseModel
@@ -38,57 +37,332 @@ class KPResponse(BaseModel):
     raw: str = ""
 
 
+# Control characters (raw newlines) inside strings are common in model output
+_DECODER = json.JSONDecoder(strict=False)
+_DECODE_ERRORS = (json.JSONDecodeError, TypeError, KeyError, AttributeError, ValueError)
+
+
 def parse_response(raw: str) -> KPResponse:
     """Parse AI response, trying JSON first then fallback."""
-    # Try to extract JSON from the response
-    json_str = _extract_json(raw)
-    if json_str:
+    # Fast path: the whole reply is the JSON envelope
+    text = raw.strip()
+    if text.startswith("{") and text.endswith("}"):
         try:
-            data = json.loads(json_str)
-            return KPResponse(
-                narrative=data.get("narrative", ""),
-                game_directives=[
-                    GameDirective(**d) for d in data.get("game_directives", [])
-                ],
-                npc_actions=[
-                    NPCAction(**a) for a in data.get("npc_actions", [])
-                ],
-                atmosphere=data.get("atmosphere", "calm"),
-                raw=raw,
-            )
-        except (json.JSONDecodeError, TypeError, KeyError):
+            return _build_response(_DECODER.decode(text), raw)
+        except _DECODE_ERRORS:
             pass
 
+    for candidate in _json_candidates(raw):
+        try:
+            return _build_response(_DECODER.decode(candidate), raw)
+        except _DECODE_ERRORS:
+            continue
+
+    # Broken or truncated envelope: keep whatever decodes before the damage
+    salvaged = _salvage(raw)
+    if salvaged is not None:
+        return salvaged
+
     # Fallback: treat entire response as narrative
     return _fallback_parse(raw)
 
 
-def _extract_json(text: str) -> Optional[str]:
-    """Extract JSON object from text, handling markdown code blocks."""
-    # Try markdown code block first
-    match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', text, re.DOTALL)
-    if match:
-        return match.group(1)
-
-    # Try raw JSON object
-    match = re.search(r'\{[^{}]*"narrative"[^{}]*\}', text, re.DOTALL)
-    if match:
-        return match.group(0)
-
-    # Try finding outermost braces
-    start = text.find('{')
-    if start >= 0:
-        depth = 0
-        for i in range(start, len(text)):
-            if text[i] == '{':
-                depth += 1
-            elif text[i] == '}':
-                depth -= 1
-                if depth == 0:
-                    return text[start:i + 1]
-    return None
+def _build_response(data: dict, raw: str) -> KPResponse:
+    """Build a KPResponse from the decoded JSON envelope."""
+    return KPResponse(
+        narrative=data.get("narrative", ""),
+        game_directives=[
+            GameDirective(**d) for d in data.get("game_directives", [])
+        ],
+        npc_actions=[
+            NPCAction(**a) for a in data.get("npc_actions", [])
+        ],
+        atmosphere=data.get("atmosphere", "calm"),
+        raw=raw,
+    )
+
+
+def _object_spans(text: str) -> list[tuple[int, int]]:
+    """(start, end) of every balanced top-level {...} in `text`, in one pass.
+
+    Braces inside JSON strings (including escaped quotes) are ignored, so a
+    narrative containing "{" or "}" does not cut the object short.
+    """
+    spans = []
+    depth = 0
+    start = -1
+    in_string = False
+    escape = False
+    i = text.find("{")
+    n = len(text)
+    while 0 <= i < n:
+        ch = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "{":
+            if depth == 0:
+                start = i
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                spans.append((start, i + 1))
+                # Prose between objects: jump straight to the next brace
+                i = text.find("{", i + 1)
+                continue
+        i += 1
+    return spans
+
+
+def _json_candidates(text: str) -> list[str]:
+    """Top-level objects, those carrying a "narrative" key first."""
+    objects = [text[a:b] for a, b in _object_spans(text)]
+    return (
+        [o for o in objects if '"narrative"' in o]
+        + [o for o in objects if '"narrative"' not in o]
+    )
+
+
+def parsed_entry(entry: dict, kp_resp: Optional[KPResponse] = None) -> dict:
+    """Cache the parsed narrative and directives on an assistant history entry.
+
+    Entries from old saves are backfilled on first access, so each reply is
+    parsed at most once over the life of the campaign.
+    """
+    if entry["role"] == "assistant" and "narrative" not in entry:
+        kp_resp = kp_resp or parse_response(entry["content"])
+        entry["narrative"] = kp_resp.narrative
+        entry["directives"] = [
+            d.model_dump(exclude_defaults=True) for d in kp_resp.game_directives
+        ]
+    return entry
+
+
+def _salvage(raw: str) -> Optional[KPResponse]:
+    """Recover narrative and closed directives from an unparseable envelope."""
+    parser = StreamingResponseParser()
+    parser.feed(raw)
+    return parser.partial()
 
 
 def _fallback_parse(raw: str) -> KPResponse:
     """When JSON parsing fails, treat the whole response as narrative."""
     return KPResponse(narrative=raw.strip(), raw=raw)
+
+
+_JSON_ESCAPES = {
+    '"': '"', "\\": "\\", "/": "/",
+    "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t",
+}
+
+# Non-JSON output is held back this long while waiting for an opening brace
+_DETECT_LIMIT = 160
+
+
+class StreamingResponseParser:
+    """Incremental parser for a KP response arriving in chunks.
+
+    feed() returns events as soon as they can be decoded:
+      ("narrative", str)           - new characters of the `narrative` string
+      ("directive", GameDirective) - a `game_directives` entry whose object closed
+      ("npc_action", NPCAction)    - an `npc_actions` entry whose object closed
+    close() returns the final KPResponse, built the same way parse_response
+    builds it. Output that never turns into JSON streams through as narrative
+    and gets the `_fallback_parse` treatment.
+    """
+
+    _ITEM_KINDS = {"game_directives": "directive", "npc_actions": "npc_action"}
+
+    def __init__(self):
+        self._buf = ""
+        self._pos = 0
+        self._mode = "detect"  # detect | json | plain | done
+        self._obj_start = -1
+        self._obj_end = -1
+        # Open containers, outermost first: [kind, current key, expecting key]
+        self._stack: list[list] = []
+        self._in_string = False
+        self._string_role = ""  # "key" | "narrative" | "value"
+        self._escape: Optional[str] = None  # chars after a backslash, None if none
+        self._high_surrogate = 0
+        self._key_chars: list[str] = []
+        self._item_start = -1
+        self.narrative = ""
+        self.directives: list[GameDirective] = []
+        self.npc_actions: list[NPCAction] = []
+        self._result: Optional[KPResponse] = None
+
+    def feed(self, chunk: str) -> list[tuple[str, object]]:
+        self._buf += chunk
+        events: list[tuple[str, object]] = []
+        if self._mode == "detect":
+            brace = self._buf.find("{")
+            head = self._buf.lstrip()
+            if brace >= 0:
+                self._mode = "json"
+                self._pos = brace
+            elif head and head[0] != "`" and len(head) > _DETECT_LIMIT:
+                self._mode = "plain"
+            else:
+                return events
+        if self._mode == "plain":
+            text, self._pos = self._buf[self._pos:], len(self._buf)
+            if text:
+                self.narrative += text
+                events.append(("narrative", text))
+        elif self._mode == "json":
+            self._scan(events)
+        return events
+
+    def close(self) -> KPResponse:
+        """Finish the stream and return the parsed response (the same object on every call)."""
+        if self._result is None:
+            self._result = self._finish()
+        return self._result
+
+    def _finish(self) -> KPResponse:
+        raw = self._buf
+        if self._obj_end >= 0:
+            try:
+                return _build_response(
+                    _DECODER.decode(raw[self._obj_start:self._obj_end + 1]), raw
+                )
+            except _DECODE_ERRORS:
+                pass
+        return self.partial() or parse_response(raw)
+
+    def partial(self) -> Optional[KPResponse]:
+        """Everything decoded so far from a JSON envelope, or None if nothing."""
+        if self._mode not in ("json", "done") or not self.narrative:
+            return None
+        return KPResponse(
+            narrative=self.narrative,
+            game_directives=self.directives,
+            npc_actions=self.npc_actions,
+            raw=self._buf,
+        )
+
+    def _scan(self, events: list) -> None:
+        buf = self._buf
+        stack = self._stack
+        text: list[str] = []
+        i = self._pos
+        while i < len(buf):
+            ch = buf[i]
+            if self._in_string:
+                if self._escape is not None:
+                    self._escape += ch
+                    if self._escape[0] == "u" and len(self._escape) < 5:
+                        i += 1
+                        continue
+                    self._string_char(self._decode_escape(self._escape), text)
+                    self._escape = None
+                elif ch == "\\":
+                    self._escape = ""
+                elif ch == '"':
+                    self._in_string = False
+                    if self._string_role == "key":
+                        stack[-1][1] = "".join(self._key_chars)
+                    elif self._string_role == "narrative":
+                        self._flush_narrative(text, events)
+                else:
+                    self._string_char(ch, text)
+            elif ch == '"':
+                self._start_string()
+            elif ch == "{" or ch == "[":
+                if ch == "{" and not stack:
+                    self._obj_start = i
+                elif ch == "{" and self._at_item_level():
+                    self._item_start = i
+                stack.append([ch, None, ch == "{"])
+            elif ch == "}" or ch == "]":
+                if stack:
+                    stack.pop()
+                if not stack:
+                    self._obj_end = i
+                    self._mode = "done"
+                    i += 1
+                    break
+                if ch == "}" and self._item_start >= 0 and self._at_item_level():
+                    self._emit_item(buf[self._item_start:i + 1], events)
+                    self._item_start = -1
+            elif ch == ":":
+                if stack:
+                    stack[-1][2] = False
+            elif ch == "," and stack and stack[-1][0] == "{":
+                stack[-1][1] = None
+                stack[-1][2] = True
+            i += 1
+        self._pos = i
+        self._flush_narrative(text, events)
+
+    def _flush_narrative(self, text: list[str], events: list) -> None:
+        if text:
+            chunk = "".join(text)
+            text.clear()
+            self.narrative += chunk
+            events.append(("narrative", chunk))
+
+    def _start_string(self) -> None:
+        stack = self._stack
+        self._in_string = True
+        if stack and stack[-1][0] == "{" and stack[-1][2]:
+            self._string_role = "key"
+            self._key_chars = []
+        elif len(stack) == 1 and stack[0][1] == "narrative":
+            self._string_role = "narrative"
+        else:
+            self._string_role = "value"
+
+    def _string_char(self, ch: str, text: list[str]) -> None:
+        if self._string_role == "key":
+            self._key_chars.append(ch)
+        elif self._string_role == "narrative":
+            text.append(ch)
+
+    def _decode_escape(self, esc: str) -> str:
+        if esc[0] != "u":
+            return _JSON_ESCAPES.get(esc, esc)
+        try:
+            code = int(esc[1:], 16)
+        except ValueError:
+            return ""
+        if 0xD800 <= code < 0xDC00:
+            self._high_surrogate = code
+            return ""
+        if 0xDC00 <= code < 0xE000 and self._high_surrogate:
+            code = 0x10000 + ((self._high_surrogate - 0xD800) << 10) + (code - 0xDC00)
+        self._high_surrogate = 0
+        return chr(code)
+
+    def _at_item_level(self) -> bool:
+        """True when the innermost container is a top-level directive/NPC list."""
+        stack = self._stack
+        return (
+            len(stack) == 2
+            and stack[1][0] == "["
+            and stack[0][1] in self._ITEM_KINDS
+        )
+
+    def _emit_item(self, text: str, events: list) -> None:
+        kind = self._ITEM_KINDS[self._stack[0][1]]
+        try:
+            # Same leniency as parse_response: raw newlines inside strings pass
+            data = _DECODER.decode(text)
+            if kind == "directive":
+                item = GameDirective(**data)
+                self.directives.append(item)
+            else:
+                item = NPCAction(**data)
+                self.npc_actions.append(item)
+        except _DECODE_ERRORS:
+            return
+        events.append((kind, item))
+
@@ -0,0 +1,55 @@
+"""Rolling "story so far" summary for turns evicted from the history window."""
+
+from backend.ai.providers.base import AIMessage, AIProviderBase
+from backend.ai.response_parser import parsed_entry
+
+SUMMARY_SYSTEM_PROMPT = """\
+你是 CoC 7e 跑团的记录员。请把已有的“前情提要”和新的对话记录合并成一份简洁的剧情摘要。
+要求：
+- 保留关键事实：调查员的重要行动、已发现的线索、NPC 的态度与承诺、去过的地点、受到的伤害和理智损失
+- 保留尚未解决的悬念和伏笔
+- 按时间顺序，用第三人称叙述，不要编造记录中没有的内容
+- 只输出摘要正文，不要 JSON，不超过 600 字"""
+
+# Cheaper call profile than a KP turn
+SUMMARY_TEMPERATURE = 0.3
+SUMMARY_MAX_TOKENS = 800
+
+
+def _render_entries(entries: list[dict]) -> str:
+    lines = []
+    for entry in entries:
+        if entry["role"] == "assistant":
+            # Reuses the parse stored on the entry, like replay does
+            lines.append(f"KP：{parsed_entry(entry)['narrative']}")
+        else:
+            lines.append(f"玩家：{entry['content']}")
+    return "\n".join(lines)
+
+
+class HistoryCompactor:
+    def __init__(
+        self,
+        provider: AIProviderBase,
+        temperature: float = SUMMARY_TEMPERATURE,
+        max_tokens: int = SUMMARY_MAX_TOKENS,
+    ):
+        self.provider = provider
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+
+    async def fold(self, summary: str, entries: list[dict]) -> str:
+        """Fold `entries` into the existing summary and return the new summary."""
+        prompt = (
+            f"[前情提要]\n{summary or '（暂无）'}\n\n"
+            f"[新的对话记录]\n{_render_entries(entries)}"
+        )
+        resp = await self.provider.generate(
+            [
+                AIMessage(role="system", content=SUMMARY_SYSTEM_PROMPT),
+                AIMessage(role="user", content=prompt),
+            ],
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+        )
+        return resp.content.strip() or summary
@@ -0,0 +1,325 @@
+"""Per-session hub: every client at a table sees every game event."""
+
+import asyncio
+from typing import Optional
+
+from backend.api.protocol import ClientConnection
+from backend.core.action_queue import (
+    DEFAULT_MAX_PENDING,
+    ActionQueue,
+    ActionQueueFull,
+    PendingAction,
+)
+from backend.core.game_engine import GameEngine
+from backend.core.turn_manager import TurnMode
+
+AUTO_SAVE_INTERVAL = 180  # 3 minutes
+
+# Close code for clients evicted because their send queue overflowed
+SLOW_CONSUMER_CLOSE = 1013
+
+
+def turn_frames(result: dict, streamed: bool = False) -> list[dict]:
+    """The frames describing a finished turn.
+
+    For streamed turns the narrative and dice results were already pushed, so
+    the narrative is only confirmed with `narrative_done` (the parsed text the
+    client should keep in place of the accumulated deltas).
+    """
+    frames = []
+    if streamed:
+        frames.append({
+            "type": "narrative_done",
+            "segment": "narrative",
+            "content": result["narrative"],
+        })
+    else:
+        # narrative
+        frames.append({
+            "type": "narrative",
+            "content": result["narrative"],
+        })
+
+        # directive results (dice rolls, etc.)
+        for d in result.get("directives", []):
+            frames.append({
+                "type": "dice_result",
+                "description": d["description"],
+                **d["details"],
+            })
+
+    # continuation narrative if any
+    if result.get("continuation"):
+        if streamed:
+            frames.append({
+                "type": "narrative_done",
+                "segment": "continuation",
+                "content": result["continuation"],
+            })
+        else:
+            frames.append({
+                "type": "narrative",
+                "content": result["continuation"],
+            })
+
+    # NPC actions
+    for npc in result.get("npc_actions", []):
+        frames.append({
+            "type": "npc_action",
+            **npc,
+        })
+
+    # clue discoveries
+    for clue in result.get("clues_discovered", []):
+        frames.append({
+            "type": "clue_discovered",
+            **clue,
+        })
+
+    # state update
+    frames.append({
+        "type": "state_update",
+        "phase": result["phase"],
+        "atmosphere": result.get("atmosphere", "calm"),
+    })
+
+    # turn state update
+    if result.get("turn_state"):
+        frames.append({
+            "type": "turn_update",
+            "turn_state": result["turn_state"],
+        })
+    return frames
+
+
+class SessionHub:
+    """Connected clients of one session, fanned out from a single event stream.
+
+    Each outbound event is logged once, encoded once per wire encoding in use
+    and the same bytes are queued for every subscriber. A client whose queue
+    fills up is evicted rather than allowed to stall the table. The hub owns
+    the session's only periodic autosave task while anyone is connected,
+    and its action queue: one turn in flight at a time. A hub stays
+    registered while turns are queued or running, even with nobody
+    connected, so a client reconnecting mid-turn rejoins the same queue.
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        engine: GameEngine,
+        autosave_interval: float = AUTO_SAVE_INTERVAL,
+        max_pending_actions: int = DEFAULT_MAX_PENDING,
+    ):
+        self.session_id = session_id
+        self.engine = engine
+        self.autosave_interval = autosave_interval
+        self.clients: dict[ClientConnection, asyncio.Task] = {}
+        # Serializes the opening narrative so concurrent joins generate it once
+        self.opening_lock = asyncio.Lock()
+        self._autosave_task: Optional[asyncio.Task] = None
+        self.actions = ActionQueue(max_pending_actions)
+        self._action_worker: Optional[asyncio.Task] = None
+
+    def join(self, conn: ClientConnection) -> None:
+        self.clients[conn] = asyncio.create_task(self._pump(conn))
+        if self._autosave_task is None or self._autosave_task.done():
+            self._autosave_task = asyncio.create_task(self._periodic_autosave())
+
+    def leave(self, conn: ClientConnection) -> None:
+        writer = self.clients.pop(conn, None)
+        if writer:
+            writer.cancel()
+        if not self.clients and self._autosave_task:
+            self._autosave_task.cancel()
+            self._autosave_task = None
+
+    @property
+    def busy(self) -> bool:
+        """Whether player turns are queued or running."""
+        worker_alive = self._action_worker is not None and not self._action_worker.done()
+        return worker_alive or bool(self.actions.waiting or self.actions.in_flight)
+
+    def send(self, conn: ClientConnection, frame: dict) -> None:
+        """Queue a frame for one client only (replies, snapshots)."""
+        if conn not in self.clients:
+            return
+        if not conn.offer(conn.codec.encode(frame)):
+            self._evict(conn)
+
+    def submit_action(
+        self, conn: ClientConnection, character_id: str, content: str, stream: bool = False
+    ) -> None:
+        """Queue a player action behind the turn in flight, if any."""
+        action = PendingAction(character_id, content, stream, origin=conn)
+        try:
+            position = self.actions.submit(action)
+        except ActionQueueFull:
+            self.send(conn, {"type": "system", "content": "行动排队已满，请稍后再试。"})
+            return
+        if self._action_worker is None or self._action_worker.done():
+            self._action_worker = asyncio.create_task(self._run_actions())
+        else:
+            self.send(conn, {"type": "action_queued", "position": position})
+
+    async def _run_actions(self) -> None:
+        try:
+            await self._drain_actions()
+        finally:
+            self._action_worker = None
+            # Everyone may have left while the last turn ran
+            release_hub(self)
+
+    async def _drain_actions(self) -> None:
+        while self.actions.waiting:
+            # Exploration actions that piled up share one KP call
+            coalesce = self.engine.turn_manager.mode == TurnMode.EXPLORATION
+            batch = self.actions.take(coalesce)
+            try:
+                await self._run_turn(batch)
+            except Exception as e:
+                for action in batch:
+                    self.send(action.origin, {"type": "error", "content": str(e)})
+            finally:
+                self.actions.done()
+            if self.engine.journal is not None:
+                # Journaled saves are cheap enough to write after every turn
+                await self._checkpoint()
+            for position, action in enumerate(self.actions.waiting, start=1):
+                self.send(action.origin, {"type": "action_queued", "position": position})
+
+    async def _run_turn(self, batch: list[PendingAction]) -> None:
+        head = batch[0]
+        # A combined turn rolls a check without target_character for its
+        # first actor rather than dropping it
+        character_id = head.character_id
+        if len(batch) == 1:
+            content = head.content
+        else:
+            content = self.engine.coalesce_actions(
+                [(a.character_id, a.content) for a in batch]
+            )
+
+        if head.stream:
+            result = await self._stream_turn(content, character_id)
+        else:
+            result = await self.engine.process_player_input(
+                player_input=content,
+                character_id=character_id,
+            )
+
+        # Handle not_your_turn error
+        if result.get("error") == "not_your_turn":
+            for action in batch:
+                self.send(action.origin, {
+                    "type": "system",
+                    "content": "现在不是该角色的行动回合。",
+                })
+                self.send(action.origin, {
+                    "type": "turn_update",
+                    "turn_state": result["turn_state"],
+                })
+            return
+
+        # Every client at the table sees the turn
+        self.publish_turn(turn_frames(result, streamed=head.stream))
+
+    async def _stream_turn(self, content: str, character_id: str) -> dict:
+        """Run a streamed turn, pushing narrative deltas and dice results as they happen."""
+        result: dict = {}
+        async for event in self.engine.stream_player_input(
+            player_input=content,
+            character_id=character_id,
+        ):
+            if event["type"] == "narrative_delta":
+                # Deltas are not logged: narrative_done carries the final text
+                self.broadcast(event)
+            elif event["type"] == "directive_result":
+                d = event["result"]
+                self.publish({
+                    "type": "dice_result",
+                    "description": d["description"],
+                    **d["details"],
+                })
+            elif event["type"] == "turn_result":
+                result = event["result"]
+        return result
+
+    def broadcast(self, frame: dict) -> None:
+        """Fan an unlogged frame (e.g. a narrative delta) out to every client."""
+        self._fan_out(lambda conn: frame)
+
+    def publish(self, frame: dict) -> dict:
+        """Log a game event with its sequence number and fan it out."""
+        frame = self.engine.events.append(frame)
+        self._fan_out(lambda conn: frame)
+        return frame
+
+    def publish_turn(self, frames: list[dict]) -> None:
+        """Log a turn's events; batch clients get them as one `turn_result`."""
+        logged = [self.engine.events.append(f) for f in frames]
+        batch = {"type": "turn_result", "events": logged}
+        self._fan_out(lambda conn: batch if conn.batch else logged)
+
+    def _fan_out(self, payload_for) -> None:
+        encoded: dict[tuple, list] = {}
+        for conn in list(self.clients):
+            payload = payload_for(conn)
+            frames = payload if isinstance(payload, list) else [payload]
+            key = (conn.codec.encoding, conn.batch)
+            if key not in encoded:
+                encoded[key] = [conn.codec.encode(f) for f in frames]
+            if not all(conn.offer(data) for data in encoded[key]):
+                self._evict(conn)
+
+    def _evict(self, conn: ClientConnection) -> None:
+        self.leave(conn)
+        asyncio.create_task(self._close(conn, SLOW_CONSUMER_CLOSE))
+
+    @staticmethod
+    async def _close(conn: ClientConnection, code: int) -> None:
+        try:
+            await conn.websocket.close(code=code)
+        except Exception:
+            pass
+
+    async def _pump(self, conn: ClientConnection) -> None:
+        try:
+            await conn.pump()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Socket is gone; the receive loop will notice and clean up too
+            self.clients.pop(conn, None)
+
+    async def _periodic_autosave(self) -> None:
+        try:
+            while True:
+                await asyncio.sleep(self.autosave_interval)
+                await self._checkpoint()
+        except asyncio.CancelledError:
+            pass
+
+    async def _checkpoint(self) -> None:
+        try:
+            await self.engine.checkpoint()
+        except Exception:
+            pass
+
+
+_hubs: dict[str, SessionHub] = {}
+
+
+def get_hub(session_id: str, engine: GameEngine) -> SessionHub:
+    """The hub for a session, created on first use or when the engine changed."""
+    hub = _hubs.get(session_id)
+    if hub is None or hub.engine is not engine:
+        hub = SessionHub(session_id, engine)
+        _hubs[session_id] = hub
+    return hub
+
+
+def release_hub(hub: SessionHub) -> None:
+    """Forget a hub once its last client has left and no turn is pending."""
+    if not hub.clients and not hub.busy and _hubs.get(hub.session_id) is hub:
+        del _hubs[hub.session_id]
@@ -0,0 +1,111 @@
+"""WebSocket frame encoding, negotiated per connection at connect time.
+
+Clients choose with query parameters on the game socket URL:
+  encoding=json     text frames (default)
+  encoding=deflate  zlib-compressed JSON in binary frames; small frames stay text
+  encoding=msgpack  msgpack binary frames (needs the optional `msgpack` package)
+  batch=1           one `turn_result` frame per turn instead of one per event
+An encoding the server cannot provide falls back to plain JSON text frames.
+"""
+
+import asyncio
+import json
+import zlib
+
+from fastapi import WebSocket
+
+try:
+    import orjson
+except ImportError:  # Optional fast encoder
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+ENCODINGS = ("json", "deflate", "msgpack")
+
+# Frames smaller than this are not worth compressing
+DEFLATE_MIN_BYTES = 512
+
+# Encoded frames a client may have waiting before it counts as too slow
+CLIENT_QUEUE_SIZE = 256
+
+
+def dumps(frame: dict) -> str:
+    """Serialize a frame to JSON text, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(frame).decode("utf-8")
+    return json.dumps(frame, ensure_ascii=False, separators=(",", ":"))
+
+
+class FrameCodec:
+    def __init__(self, encoding: str = "json", deflate_min_bytes: int = DEFLATE_MIN_BYTES):
+        if encoding not in ENCODINGS or (encoding == "msgpack" and msgpack is None):
+            encoding = "json"
+        self.encoding = encoding
+        self.deflate_min_bytes = deflate_min_bytes
+
+    def encode(self, frame: dict) -> str | bytes:
+        """Text for JSON frames, bytes for compressed or msgpack frames."""
+        if self.encoding == "msgpack":
+            return msgpack.packb(frame, use_bin_type=True)
+        text = dumps(frame)
+        if self.encoding == "deflate" and len(text) >= self.deflate_min_bytes:
+            return zlib.compress(text.encode("utf-8"))
+        return text
+
+
+class ClientConnection:
+    """One client socket plus the protocol options it negotiated.
+
+    Frames are queued and written by `pump()`, so one slow socket never
+    blocks the others; `offer()` reports a full queue instead of waiting.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        codec: FrameCodec,
+        batch: bool = False,
+        queue_size: int = CLIENT_QUEUE_SIZE,
+    ):
+        self.websocket = websocket
+        self.codec = codec
+        self.batch = batch
+        self.queue: asyncio.Queue = asyncio.Queue(queue_size)
+
+    @classmethod
+    def negotiate(cls, websocket: WebSocket, batch_default: bool = False) -> "ClientConnection":
+        params = websocket.query_params
+        batch = params.get("batch")
+        return cls(
+            websocket,
+            FrameCodec(params.get("encoding", "json")),
+            batch=batch_default if batch is None else batch in ("1", "true"),
+        )
+
+    async def write(self, data: str | bytes) -> None:
+        if isinstance(data, bytes):
+            await self.websocket.send_bytes(data)
+        else:
+            await self.websocket.send_text(data)
+
+    async def send(self, frame: dict) -> None:
+        """Encode and write a frame immediately, bypassing the queue."""
+        await self.write(self.codec.encode(frame))
+
+    def offer(self, data: str | bytes) -> bool:
+        """Queue an encoded frame; False when the client has fallen too far behind."""
+        try:
+            self.queue.put_nowait(data)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    async def pump(self) -> None:
+        """Write queued frames until cancelled or the socket fails."""
+        while True:
+            data = await self.queue.get()
+            await self.write(data)
@@ -1,15 +1,60 @@
 """WebSocket game endpoint for real-time gameplay."""
 
-import asyncio
-import json
-
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 
+from backend.ai.response_parser import parsed_entry
+from backend.ai.providers.admission import set_session_key
+from backend.api.hub import get_hub, release_hub
+from backend.api.protocol import ClientConnection
 from backend.api.routes.session import get_session_engine
+from backend.config import settings
+from backend.core.game_engine import GameEngine
 
 router = APIRouter(tags=["game"])
 
-AUTO_SAVE_INTERVAL = 180  # 3 minutes
+# Conversation entries sent on connect; older ones are paged in on request
+SNAPSHOT_HISTORY = 200
+HISTORY_PAGE = 100
+
+
+def _history_frames(history: list[dict]) -> list[dict]:
+    """Narrative frames replaying a conversation, from the pre-parsed entries."""
+    frames = []
+    for entry in history:
+        if entry["role"] == "user":
+            content = entry["content"]
+            # Skip system prompts (opening, dice results, etc.)
+            if content.startswith("[系统]") or content.startswith("[System]"):
+                continue
+            frames.append({"type": "narrative", "content": f"> {content}"})
+        elif entry["role"] == "assistant":
+            frames.append({"type": "narrative", "content": parsed_entry(entry)["narrative"]})
+    return frames
+
+
+def _snapshot(engine: GameEngine) -> dict:
+    """Client state in one frame: recent conversation, clues, phase, turn state.
+
+    Only history already in memory is sent (at most `SNAPSHOT_HISTORY`
+    entries); `history_from` tells the client whether older entries exist.
+    """
+    history = engine.keeper.history
+    start = max(engine.history_in_memory(), len(history) - SNAPSHOT_HISTORY, 0)
+    clues = []
+    for clue_id in engine.guardian.discovered_clues:
+        clue = engine.scenario.clues.get(clue_id)
+        if clue:
+            clues.append({"clue_id": clue_id, "description": clue.description})
+    return {
+        "type": "snapshot",
+        "log_id": engine.events.id,
+        "seq": engine.events.seq,
+        "history_from": start,
+        "entries": _history_frames(history[start:]),
+        "clues": clues,
+        "phase": engine.state.phase.value,
+        "turn_state": engine.turn_manager.to_dict(),
+    }
 
 
 @router.websocket("/api/game/{session_id}/ws")
@@ -23,191 +68,112 @@ async def game_websocket(websocket: WebSocket, session_id: str):
         await websocket.close()
         return
 
-    # Periodic auto-save task
-    auto_save_task: asyncio.Task | None = None
-
-    async def periodic_auto_save():
-        """Auto-save every AUTO_SAVE_INTERVAL seconds."""
-        try:
-            while True:
-                await asyncio.sleep(AUTO_SAVE_INTERVAL)
-                try:
-                    engine.save_to_file("auto")
-                except Exception:
-                    pass
-        except asyncio.CancelledError:
-            pass
+    set_session_key(session_id)
+    conn = ClientConnection.negotiate(websocket, batch_default=settings.ws_batch_turns)
+    hub = get_hub(session_id, engine)
+    hub.join(conn)
 
     try:
-        # Auto-send opening narrative if no history yet
-        if not engine.keeper.history:
-            opening = await engine.generate_opening()
-            await websocket.send_json({
-                "type": "narrative",
-                "content": opening["narrative"],
-            })
-            for npc in opening.get("npc_actions", []):
-                await websocket.send_json({"type": "npc_action", **npc})
-            await websocket.send_json({
-                "type": "state_update",
-                "phase": opening["phase"],
-                "atmosphere": opening.get("atmosphere", "calm"),
-                "turn_state": opening.get("turn_state"),
-            })
-        else:
-            # Reconnection / resume: replay full conversation history
-            for entry in engine.keeper.history:
-                if entry["role"] == "user":
-                    content = entry["content"]
-                    # Skip system prompts (opening, dice results, etc.)
-                    if content.startswith("[系统]") or content.startswith("[System]"):
-                        continue
-                    await websocket.send_json({
-                        "type": "narrative",
-                        "content": f"> {content}",
-                    })
-                elif entry["role"] == "assistant":
-                    from backend.ai.response_parser import parse_response
-                    try:
-                        kp = parse_response(entry["content"])
-                        await websocket.send_json({
-                            "type": "narrative",
-                            "content": kp.narrative,
-                        })
-                    except Exception:
-                        await websocket.send_json({
-                            "type": "narrative",
-                            "content": entry["content"],
-                        })
-
-            # Sync discovered clues
-            for clue_id in engine.guardian.discovered_clues:
-                clue = engine.scenario.clues.get(clue_id)
-                if clue:
-                    await websocket.send_json({
-                        "type": "clue_discovered",
-                        "clue_id": clue_id,
-                        "description": clue.description,
-                    })
-
-            await websocket.send_json({
-                "type": "system",
-                "content": "已从存档恢复，继续你的冒险...",
-            })
-
-            # Send current turn state on reconnection
-            await websocket.send_json({
-                "type": "turn_update",
-                "turn_state": engine.turn_manager.to_dict(),
-            })
+        async with hub.opening_lock:
+            opening_needed = not engine.keeper.history
+            if opening_needed:
+                hub.send(conn, {
+                    "type": "sync", "log_id": engine.events.id, "seq": engine.events.seq,
+                })
+                # Auto-send opening narrative if no history yet
+                opening = await engine.generate_opening()
+                hub.publish({
+                    "type": "narrative",
+                    "content": opening["narrative"],
+                })
+                for npc in opening.get("npc_actions", []):
+                    hub.publish({"type": "npc_action", **npc})
+                hub.publish({
+                    "type": "state_update",
+                    "phase": opening["phase"],
+                    "atmosphere": opening.get("atmosphere", "calm"),
+                    "turn_state": opening.get("turn_state"),
+                })
 
-        # Start periodic auto-save after connection is established
-        auto_save_task = asyncio.create_task(periodic_auto_save())
+        if not opening_needed:
+            # Reconnection / resume: only the events this client missed,
+            # or a snapshot when it is new or too far behind
+            missed = None
+            params = websocket.query_params
+            if "last_seq" in params:
+                try:
+                    missed = engine.events.since(
+                        params.get("log_id", ""), int(params["last_seq"])
+                    )
+                except ValueError:
+                    missed = None
+            if missed is None:
+                hub.send(conn, _snapshot(engine))
+                hub.send(conn, {
+                    "type": "system",
+                    "content": "已从存档恢复，继续你的冒险...",
+                })
+            else:
+                hub.send(conn, {"type": "history", "entries": missed})
 
         while True:
             data = await websocket.receive_json()
             msg_type = data.get("type", "")
 
             if msg_type == "player_action":
-                character_id = data.get("character_id", "")
-                content = data.get("content", "")
-
-                result = await engine.process_player_input(
-                    player_input=content,
-                    character_id=character_id,
+                # Runs after any turn already in flight; may be combined with
+                # other investigators' actions (see SessionHub.submit_action)
+                hub.submit_action(
+                    conn,
+                    character_id=data.get("character_id", ""),
+                    content=data.get("content", ""),
+                    stream=data.get("stream", settings.ws_stream_narrative),
                 )
 
-                # Handle not_your_turn error
-                if result.get("error") == "not_your_turn":
-                    await websocket.send_json({
-                        "type": "system",
-                        "content": "现在不是该角色的行动回合。",
-                    })
-                    await websocket.send_json({
-                        "type": "turn_update",
-                        "turn_state": result["turn_state"],
-                    })
-                    continue
-
-                # Send narrative
-                await websocket.send_json({
-                    "type": "narrative",
-                    "content": result["narrative"],
-                })
-
-                # Send directive results (dice rolls, etc.)
-                for d in result.get("directives", []):
-                    await websocket.send_json({
-                        "type": "dice_result",
-                        "description": d["description"],
-                        **d["details"],
-                    })
-
-                # Send continuation narrative if any
-                if result.get("continuation"):
-                    await websocket.send_json({
-                        "type": "narrative",
-                        "content": result["continuation"],
-                    })
-
-                # Send NPC actions
-                for npc in result.get("npc_actions", []):
-                    await websocket.send_json({
-                        "type": "npc_action",
-                        **npc,
-                    })
-
-                # Send clue discoveries
-                for clue in result.get("clues_discovered", []):
-                    await websocket.send_json({
-                        "type": "clue_discovered",
-                        **clue,
-                    })
-
-                # Send state update
-                await websocket.send_json({
-                    "type": "state_update",
-                    "phase": result["phase"],
-                    "atmosphere": result.get("atmosphere", "calm"),
-                })
-
-                # Send turn state update
-                if result.get("turn_state"):
-                    await websocket.send_json({
-                        "type": "turn_update",
-                        "turn_state": result["turn_state"],
-                    })
-
             elif msg_type == "save_game":
                 slot = data.get("slot", "manual")
                 try:
-                    engine.save_to_file(slot)
-                    await websocket.send_json({
+                    await engine.save_to_file(slot)
+                    hub.send(conn, {
                         "type": "system",
                         "content": f"游戏已保存到存档位: {slot}",
                     })
                 except Exception as e:
-                    await websocket.send_json({
+                    hub.send(conn, {
                         "type": "error",
                         "content": f"保存失败: {e}",
                     })
 
+            elif msg_type == "load_history":
+                # Older conversation, a page ending where the client's view starts
+                try:
+                    before = max(0, min(int(data.get("before", 0)), len(engine.keeper.history)))
+                except (TypeError, ValueError):
+                    before = 0
+                start = max(0, before - HISTORY_PAGE)
+                entries = await engine.read_history(start, before)
+                hub.send(conn, {
+                    "type": "history_page",
+                    "history_from": start,
+                    "entries": _history_frames(entries),
+                })
+
             elif msg_type == "ping":
-                await websocket.send_json({"type": "pong"})
+                hub.send(conn, {"type": "pong"})
 
     except WebSocketDisconnect:
         try:
-            engine.save_to_file("auto")
+            await engine.checkpoint()
         except Exception:
             pass
     except Exception as e:
         try:
-            await websocket.send_json({
+            await conn.send({
                 "type": "error",
                 "content": str(e),
             })
         except Exception:
             pass
     finally:
-        if auto_save_task:
-            auto_save_task.cancel()
+        hub.leave(conn)
+        release_hub(hub)
@@ -1,16 +1,20 @@
 """Game session management endpoints."""
 
-import json
-
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 
+from backend.ai.providers.admission import set_session_key
 from backend.character.service import CharacterService
-from backend.core.game_engine import GameEngine, SAVES_DIR
+from backend.config import settings
+from backend.core.game_engine import GameEngine
 from backend.dependencies import (
     get_ai_provider,
+    get_save_storage,
     get_scenario_loader,
+    get_summary_provider,
 )
+from backend.persistence.journal import TurnJournal
+from backend.scenario.models import Scenario
 
 router = APIRouter(prefix="/api/sessions", tags=["sessions"])
 
@@ -23,6 +27,31 @@ class CreateSessionRequest(BaseModel):
     force_new: bool = False
 
 
+def _new_engine(scenario: Scenario) -> GameEngine:
+    return GameEngine(
+        get_ai_provider(),
+        scenario,
+        CharacterService(),
+        summary_provider=get_summary_provider(),
+        dice_tools=settings.ai_dice_tools,
+        scenario_index=(
+            get_scenario_loader().index(scenario) if settings.scenario_retrieval else None
+        ),
+        scenario_budget=settings.scenario_context_budget,
+        prompt_layout=settings.ai_prompt_layout,
+        journal=_new_journal(),
+        storage=get_save_storage(),
+    )
+
+
+def _new_journal() -> TurnJournal | None:
+    if not settings.save_journal:
+        return None
+    # Storage that applies records in place never needs compacting snapshots
+    every = settings.save_snapshot_every if get_save_storage().journal_compaction else 0
+    return TurnJournal(every)
+
+
 @router.post("")
 async def create_session(req: CreateSessionRequest):
     loader = get_scenario_loader()
@@ -33,11 +62,9 @@ async def create_session(req: CreateSessionRequest):
 
     # Auto-resume: check for existing save unless force_new
     if not req.force_new:
-        existing = GameEngine.find_latest_save(req.scenario_id)
+        existing = await get_save_storage().find_latest(req.scenario_id)
         if existing:
-            provider = get_ai_provider()
-            chars = CharacterService()
-            engine = GameEngine(provider, scenario, chars)
+            engine = _new_engine(scenario)
             engine.load_save_data(existing["data"])
             old_id = existing["data"].get("session", {}).get("id", engine.session.id)
             engine.session.id = old_id
@@ -48,9 +75,7 @@ async def create_session(req: CreateSessionRequest):
                 "resumed": True,
             }
 
-    provider = get_ai_provider()
-    chars = CharacterService()
-    engine = GameEngine(provider, scenario, chars)
+    engine = _new_engine(scenario)
     _sessions[engine.session.id] = engine
     return {"session_id": engine.session.id, "scenario": scenario.meta.title, "resumed": False}
 
@@ -73,7 +98,7 @@ async def start_session(session_id: str):
     if not engine:
         raise HTTPException(404, "Session not found")
     # Try loading auto-save first
-    loaded = engine.load_from_file("auto")
+    loaded = await engine.load_from_file("auto")
     if not loaded:
         engine.start_game()
         engine.begin_exploration()
@@ -94,6 +119,22 @@ async def get_game_state(session_id: str):
     }
 
 
+@router.get("/{session_id}/prompt-stats")
+async def get_prompt_stats(session_id: str):
+    """Per-layer prompt size breakdown: last prompt plus running totals."""
+    engine = _sessions.get(session_id)
+    if not engine:
+        raise HTTPException(404, "Session not found")
+    keeper = engine.keeper
+    return {
+        "session_id": session_id,
+        "history_entries": len(keeper.history),
+        "history_budget": keeper.history_budget,
+        "scenario_retrieval": keeper.scenario_index is not None,
+        **keeper.prompt_stats.to_dict(),
+    }
+
+
 @router.delete("/{session_id}")
 async def delete_session(session_id: str):
     if session_id in _sessions:
@@ -151,6 +192,7 @@ async def remove_session_character(session_id: str, char_id: str):
     if char_id not in engine.characters._characters:
         raise HTTPException(404, "Character not found")
     del engine.characters._characters[char_id]
+    engine.characters.touch()
     return {"status": "deleted"}
 
 
@@ -159,6 +201,7 @@ async def generate_party(session_id: str, req: GeneratePartyRequest):
     engine = _sessions.get(session_id)
     if not engine:
         raise HTTPException(404, "Session not found")
+    set_session_key(session_id)
     characters = await engine.generate_party(req.count)
     return [c.model_dump() for c in characters]
 
@@ -166,13 +209,12 @@ async def generate_party(session_id: str, req: GeneratePartyRequest):
 @router.post("/resume")
 async def resume_session(req: ResumeRequest):
     """Create a new session from a save file."""
-    path = SAVES_DIR / req.filename
-    if not path.exists():
-        raise HTTPException(404, "Save file not found")
     try:
-        save_data = json.loads(path.read_text())
-    except (json.JSONDecodeError, OSError):
+        save_data = await get_save_storage().read(req.filename)
+    except (ValueError, OSError):
         raise HTTPException(422, "Save file is corrupted")
+    if save_data is None:
+        raise HTTPException(404, "Save file not found")
 
     scenario_id = save_data.get("scenario_id", "")
     loader = get_scenario_loader()
@@ -181,9 +223,7 @@ async def resume_session(req: ResumeRequest):
     except FileNotFoundError:
         raise HTTPException(409, f"Scenario not found: {scenario_id}")
 
-    provider = get_ai_provider()
-    chars = CharacterService()
-    engine = GameEngine(provider, scenario, chars)
+    engine = _new_engine(scenario)
     engine.load_save_data(save_data)
 
     # Reuse original session ID so auto-save overwrites the same file
@@ -201,11 +241,12 @@ async def resume_session(req: ResumeRequest):
 
 @router.post("/{session_id}/save")
 async def save_session(session_id: str, req: SaveRequest = SaveRequest()):
+    """Save to a slot; returns the save's `filename` as used by /api/saves."""
     engine = _sessions.get(session_id)
     if not engine:
         raise HTTPException(404, "Session not found")
-    path = engine.save_to_file(req.slot)
-    return {"status": "saved", "slot": req.slot, "path": str(path)}
+    filename = await engine.save_to_file(req.slot)
+    return {"status": "saved", "slot": req.slot, "filename": filename}
 
 
 @router.post("/{session_id}/load")
@@ -213,7 +254,7 @@ async def load_session(session_id: str, req: SaveRequest = SaveRequest()):
     engine = _sessions.get(session_id)
     if not engine:
         raise HTTPException(404, "Session not found")
-    ok = engine.load_from_file(req.slot)
+    ok = await engine.load_from_file(req.slot)
     if not ok:
         raise HTTPException(404, f"Save not found for slot: {req.slot}")
     return {
@@ -225,8 +266,11 @@ async def load_session(session_id: str, req: SaveRequest = SaveRequest()):
 
 @router.get("/{session_id}/saves")
 async def list_saves(session_id: str):
-    from backend.core.game_engine import GameEngine
-    return {"saves": GameEngine.list_saves(session_id)}
+    saves = await get_save_storage().query(session_id=session_id)
+    return {"saves": [
+        {"slot": s["slot"], "filename": s["filename"], "modified": s["modified"]}
+        for s in saves
+    ]}
 
 
 def get_session_engine(session_id: str) -> GameEngine:
@@ -1,5 +1,6 @@
 """Character management service with in-memory storage."""
 
+import itertools
 import random
 from typing import Optional
 
@@ -10,10 +11,18 @@ from backend.rules.character_calc import (
     roll_characteristics,
 )
 
+# Process-wide so a rebuilt service never reuses a version an older one had
+_versions = itertools.count(1)
+
 
 class CharacterService:
     def __init__(self):
         self._characters: dict[str, CoCCharacter] = {}
+        self.version = next(_versions)
+
+    def touch(self) -> None:
+        """Mark the roster as changed (call after editing characters directly)."""
+        self.version = next(_versions)
 
     def create_pc(
         self,
@@ -50,6 +59,7 @@ class CharacterService:
             skills=skills,
         )
         self._characters[char.id] = char
+        self.touch()
         return char
 
     def create_npc_from_template(self, template: dict) -> CoCCharacter:
@@ -81,6 +91,7 @@ class CharacterService:
             dialogue_style=template.get("dialogue_style"),
         )
         self._characters[char.id] = char
+        self.touch()
         return char
 
     def get_character(self, character_id: str) -> Optional[CoCCharacter]:
@@ -92,20 +103,24 @@ class CharacterService:
             current = getattr(char.derived, stat_name)
             max_val = getattr(char.derived, f"{stat_name}_max", 999)
             setattr(char.derived, stat_name, max(0, min(max_val, current + delta)))
+            self.touch()
         return char
 
     def add_item(self, character_id: str, item: str) -> None:
         self._characters[character_id].inventory.append(item)
+        self.touch()
 
     def add_condition(self, character_id: str, condition: str) -> None:
         char = self._characters[character_id]
         if condition not in char.conditions:
             char.conditions.append(condition)
+            self.touch()
 
     def remove_condition(self, character_id: str, condition: str) -> None:
         char = self._characters[character_id]
         if condition in char.conditions:
             char.conditions.remove(condition)
+            self.touch()
 
     def list_party(self) -> list[CoCCharacter]:
         return [c for c in self._characters.values() if not c.is_npc]
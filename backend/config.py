@@ -1,3 +1,4 @@
+from pydantic import model_validator
 from pydantic_settings import BaseSettings
 
 
@@ -8,15 +9,77 @@ class Settings(BaseSettings):
 
     ai_provider: str = "claude"
     ai_model: str = "claude-sonnet-4-20250514"
+    ai_summary_model: str = ""  # cheaper model for history compaction; empty = ai_model
+    ai_dice_tools: bool = False  # roll dice via tool calls instead of a second KP call
+    # "stable_prefix" keeps volatile state in the final user message for exact-prefix KV caching
+    ai_prompt_layout: str = "layered"
 
     anthropic_api_key: str = ""
+    claude_prompt_cache: bool = True
     openai_api_key: str = ""
     openai_base_url: str = "https://api.openai.com/v1"
     ollama_base_url: str = "http://localhost:11434"
 
+    # Shared HTTP client pool used by each AI provider
+    http_max_connections: int = 20
+    http_max_keepalive_connections: int = 10
+    http_keepalive_expiry: float = 30.0
+    http2: bool = False  # requires the `h2` package
+    http_timeout: float = 120
+    ai_warmup: bool = True
+
+    # Retry / circuit breaker / failover around the provider
+    ai_max_retries: int = 2
+    ai_retry_base_delay: float = 0.5
+    ai_retry_max_delay: float = 8.0
+    ai_breaker_failures: int = 5
+    ai_breaker_reset: float = 30.0
+    ai_failover_provider: str = ""  # e.g. "openai" to fall back from claude
+    ai_failover_model: str = ""  # required with a failover provider
+
+    # Server-wide admission control for AI calls (0 = unlimited)
+    ai_max_in_flight: int = 16
+    ai_requests_per_minute: int = 0
+    ai_tokens_per_minute: int = 0
+
+    # Record/replay provider (ai_provider=replay) for offline benchmarks
+    replay_cassette: str = "cassettes/kp.json"
+    replay_mode: str = "replay"  # replay | record
+    replay_record_provider: str = "claude"  # real backend wrapped in record mode
+    replay_latency: float = 0.0
+    replay_tokens_per_second: float = 0.0
+
+    # "files": snapshot + journal files in saves/; "sqlite" needs the `db` extra
+    save_storage: str = "files"
+    save_database_url: str = "sqlite+aiosqlite:///saves/trpg.db"
+    # Auto saves append per-turn deltas; a full snapshot every N journal records
+    save_journal: bool = True
+    save_snapshot_every: int = 20
+    # Save I/O thread pool; fsync: none | file | full (also fsyncs the directory)
+    save_workers: int = 2
+    # "binary": compressed .sav with lazily loaded history; "json" for plain files
+    save_format: str = "binary"
+    save_fsync: str = "file"
+
     scenarios_dir: str = "scenarios"
+    # Send only the NPCs/locations/clues relevant to the current scene
+    scenario_retrieval: bool = False
+    scenario_context_budget: int = 1200
+
+    # Default for player_action messages that don't set "stream" themselves
+    ws_stream_narrative: bool = False
+    # Default for clients that don't pass ?batch=: one turn_result frame per turn
+    ws_batch_turns: bool = False
 
     model_config = {"env_file": ".env", "env_file_encoding": "utf-8"}
 
+    @model_validator(mode="after")
+    def _check_failover(self) -> "Settings":
+        # ai_model names a model of ai_provider; sending it to another
+        # provider fails with a 404 that hides the original error
+        if self.ai_failover_provider and not self.ai_failover_model:
+            raise ValueError("ai_failover_model is required when ai_failover_provider is set")
+        return self
+
 
 settings = Settings()
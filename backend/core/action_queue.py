@@ -0,0 +1,63 @@
+"""Per-session queue that runs one player turn at a time."""
+
+from collections import deque
+from typing import Any
+
+DEFAULT_MAX_PENDING = 8
+
+
+class ActionQueueFull(Exception):
+    pass
+
+
+class PendingAction:
+    def __init__(self, character_id: str, content: str, stream: bool = False, origin: Any = None):
+        self.character_id = character_id
+        self.content = content
+        self.stream = stream
+        self.origin = origin  # Connection that submitted it, for direct replies
+
+
+class ActionQueue:
+    """FIFO of player actions waiting for the in-flight turn to finish.
+
+    `take(coalesce=True)` pops the head plus every waiting action from other
+    investigators, so actions that piled up during one exploration turn are
+    answered by a single KP call. Repeat actions by the same investigator
+    keep their place for the following turn.
+    """
+
+    def __init__(self, max_pending: int = DEFAULT_MAX_PENDING):
+        self.max_pending = max_pending
+        self.in_flight: list[PendingAction] = []
+        self._waiting: deque[PendingAction] = deque()
+
+    @property
+    def waiting(self) -> list[PendingAction]:
+        return list(self._waiting)
+
+    def submit(self, action: PendingAction) -> int:
+        """Queue an action; returns its 1-based position among waiting actions."""
+        if len(self._waiting) >= self.max_pending:
+            raise ActionQueueFull(f"{len(self._waiting)} actions already waiting")
+        self._waiting.append(action)
+        return len(self._waiting)
+
+    def take(self, coalesce: bool = False) -> list[PendingAction]:
+        """Start the next turn: the head action, plus coalescable followers."""
+        batch = [self._waiting.popleft()]
+        if coalesce and batch[0].character_id:
+            actors = {batch[0].character_id}
+            kept: deque[PendingAction] = deque()
+            for action in self._waiting:
+                if action.character_id and action.character_id not in actors:
+                    actors.add(action.character_id)
+                    batch.append(action)
+                else:
+                    kept.append(action)
+            self._waiting = kept
+        self.in_flight = batch
+        return batch
+
+    def done(self) -> None:
+        self.in_flight = []
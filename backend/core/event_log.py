@@ -0,0 +1,43 @@
+"""Sequence-numbered log of outbound game events for reconnect resync."""
+
+from collections import deque
+from typing import Optional
+from uuid import uuid4
+
+DEFAULT_EVENT_LOG_SIZE = 500
+
+
+class EventLog:
+    """Bounded, in-memory log of the frames a session has sent.
+
+    Every logged frame gets a per-session `seq`. A reconnecting client sends
+    the `log_id` and last `seq` it saw; `since()` returns the frames it
+    missed, or None when they are no longer all available and the client
+    needs a full snapshot instead.
+    """
+
+    def __init__(self, maxlen: int = DEFAULT_EVENT_LOG_SIZE):
+        self.maxlen = maxlen
+        self.reset()
+
+    def reset(self) -> None:
+        """Start a new log; clients of the previous one will get a snapshot."""
+        self.id = uuid4().hex[:8]
+        self.seq = 0
+        self._floor = 0  # Highest seq no longer held
+        self._events: deque[dict] = deque()
+
+    def append(self, frame: dict) -> dict:
+        """Stamp `frame` with the next sequence number and keep it."""
+        self.seq += 1
+        frame = {**frame, "seq": self.seq}
+        self._events.append(frame)
+        if len(self._events) > self.maxlen:
+            self._floor = self._events.popleft()["seq"]
+        return frame
+
+    def since(self, log_id: str, last_seq: int) -> Optional[list[dict]]:
+        """Frames after `last_seq`, or None if the client must resync fully."""
+        if log_id != self.id or last_seq < self._floor or last_seq > self.seq:
+            return None
+        return [f for f in self._events if f["seq"] > last_seq]
@@ -2,21 +2,27 @@
 
 import json
 from pathlib import Path
-from typing import Optional
+from typing import AsyncIterator, Optional
 from uuid import uuid4
 
 from pydantic import BaseModel, Field
 
+from backend.ai.dice_tools import tool_directive
 from backend.ai.keeper_engine import KeeperEngine
 from backend.ai.providers.base import AIProviderBase
-from backend.ai.response_parser import GameDirective, KPResponse
+from backend.ai.response_parser import GameDirective, KPResponse, StreamingResponseParser
 from backend.character.models import CoCCharacter
 from backend.character.service import CharacterService
+from backend.core.event_log import EventLog
 from backend.core.state_machine import GamePhase, StateMachine
 from backend.core.turn_manager import TurnManager, TurnMode
+from backend.persistence.journal import TurnJournal
+from backend.persistence.save_format import LazyHistory, snapshot_entries
+from backend.persistence.storage import FileStorage, SaveStorage
 from backend.rules.dice import roll_d100, is_success, roll_damage
 from backend.rules.sanity import san_check
 from backend.rules.skill_check import perform_check
+from backend.scenario.index import DEFAULT_CONTEXT_BUDGET, ScenarioIndex
 from backend.scenario.loader import ScenarioLoader
 from backend.scenario.models import Scenario
 from backend.scenario.plot_guardian import PlotGuardian
@@ -42,14 +48,35 @@ class GameEngine:
         provider: AIProviderBase,
         scenario: Scenario,
         characters: Optional[CharacterService] = None,
+        summary_provider: Optional[AIProviderBase] = None,
+        dice_tools: bool = False,
+        scenario_index: Optional[ScenarioIndex] = None,
+        scenario_budget: int = DEFAULT_CONTEXT_BUDGET,
+        prompt_layout: str = "layered",
+        journal: Optional[TurnJournal] = None,
+        storage: Optional[SaveStorage] = None,
     ):
         self.scenario = scenario
         self.characters = characters or CharacterService()
         self.state = StateMachine()
         self.guardian = PlotGuardian(scenario)
-        self.keeper = KeeperEngine(provider, scenario)
+        self.keeper = KeeperEngine(
+            provider, scenario,
+            summary_provider=summary_provider,
+            scenario_index=scenario_index,
+            scenario_budget=scenario_budget,
+            prompt_layout=prompt_layout,
+        )
         self.session = GameSession(scenario_id=scenario.meta.id)
         self.turn_manager = TurnManager()
+        # Resolve dice checks as provider tool calls in a single exchange
+        self.dice_tools = dice_tools
+        # Outbound WebSocket events, for delta resync on reconnect
+        self.events = EventLog()
+        # Per-turn deltas for the auto slot instead of full rewrites
+        self.journal = journal
+        # Where save slots are written (files in SAVES_DIR unless configured)
+        self.storage = storage or FileStorage(SAVES_DIR)
 
     def start_game(self) -> GamePhase:
         self.state.transition(GamePhase.SCENARIO_INTRO)
@@ -79,6 +106,8 @@ class GameEngine:
             characters=party,
             plot_progress=progress,
             turn_state=self.turn_manager.to_dict(),
+            versions=self._prompt_versions(),
+            plot_point=self.guardian.current_plot_point(),
         )
 
         return {
@@ -125,11 +154,28 @@ class GameEngine:
             result.append(char)
         return result
 
-    async def process_player_input(
-        self, player_input: str, character_id: str = ""
-    ) -> dict:
-        """Main game loop: player input -> AI -> directives -> results."""
-        # Validate actor turn in combat mode
+    def _prompt_versions(self) -> dict:
+        """Version counters of the state behind the dynamic prompt layers."""
+        return {
+            "characters": self.characters.version,
+            "plot": self.guardian.version,
+            "turn": self.turn_manager.version,
+        }
+
+    def coalesce_actions(self, actions: list[tuple[str, str]]) -> str:
+        """One KP prompt for (character_id, input) actions taken at the same time."""
+        lines = [
+            "[同时行动] 以下调查员几乎同时行动，请在一段叙事中一并回应；"
+            "需要检定时用 target_character 指明对应角色 ID："
+        ]
+        for character_id, content in actions:
+            char = self.characters.get_character(character_id)
+            name = char.name if char else character_id
+            lines.append(f"- {name}({character_id}): {content}")
+        return "\n".join(lines)
+
+    def _check_turn(self, character_id: str) -> Optional[dict]:
+        """Return a not_your_turn result if the actor may not act in combat."""
         if (
             self.turn_manager.mode == TurnMode.COMBAT
             and character_id
@@ -146,26 +192,19 @@ class GameEngine:
                 "turn_state": self.turn_manager.to_dict(),
                 "error": "not_your_turn",
             }
+        return None
 
-        party = self.characters.list_party()
-        progress = self.guardian.generate_progress_prompt()
-
-        # Step 1: Get AI response
-        kp_resp = await self.keeper.generate_response(
-            player_input=player_input,
-            characters=party,
-            plot_progress=progress,
-            turn_state=self.turn_manager.to_dict(),
-        )
-
-        # Step 2: Execute game directives
+    def _resolve_directives(
+        self, kp_resp: KPResponse, party: list[CoCCharacter], character_id: str
+    ) -> list[DirectiveResult]:
+        """Execute dice directives, apply turn directives and consume the action."""
         results = []
         for directive in kp_resp.game_directives:
             result = self._execute_directive(directive, character_id)
             if result:
                 results.append(result)
 
-        # Step 2.5: Handle turn-related directives
+        # Handle turn-related directives
         self._handle_turn_directives(kp_resp.game_directives, party)
 
         # Consume action in combat mode
@@ -173,14 +212,15 @@ class GameEngine:
             self.turn_manager.consume_action(character_id)
             if self.turn_manager.actions_remaining.get(character_id, 0) <= 0:
                 self.turn_manager.advance_turn()
+        return results
 
-        # Step 3: If directives produced results, feed back to AI
-        continuation = None
-        if results:
-            result_text = self._format_results(results)
-            continuation = await self.keeper.feed_result(result_text)
-
-        # Step 4: Check for clue discoveries
+    def _finish_turn(
+        self,
+        kp_resp: KPResponse,
+        results: list[DirectiveResult],
+        continuation: Optional[KPResponse],
+    ) -> dict:
+        """Record clue discoveries, check endings and build the turn result."""
         discovered = []
         for directive in kp_resp.game_directives:
             if directive.type == "clue_discovered" and directive.clue_id:
@@ -191,13 +231,15 @@ class GameEngine:
                     "description": clue.description if clue else directive.clue_id,
                 })
 
-        # Step 5: Check ending conditions
         ending = self.guardian.check_ending_conditions()
         if ending:
             if self.state.can_transition(GamePhase.ENDING):
                 self.state.transition(GamePhase.ENDING)
                 self.session.phase = self.state.phase
 
+        # Fold evicted turns into the summary while waiting for the next action
+        self.keeper.schedule_compaction()
+
         return {
             "narrative": kp_resp.narrative,
             "directives": [r.model_dump() for r in results],
@@ -209,9 +251,145 @@ class GameEngine:
             "turn_state": self.turn_manager.to_dict(),
         }
 
+    async def process_player_input(
+        self, player_input: str, character_id: str = ""
+    ) -> dict:
+        """Main game loop: player input -> AI -> directives -> results."""
+        error = self._check_turn(character_id)
+        if error:
+            return error
+
+        party = self.characters.list_party()
+        progress = self.guardian.generate_progress_prompt()
+
+        if self.dice_tools and self.keeper.provider.supports_tools:
+            return await self._process_with_dice_tools(
+                player_input, character_id, party, progress
+            )
+
+        # Step 1: Get AI response
+        kp_resp = await self.keeper.generate_response(
+            player_input=player_input,
+            characters=party,
+            plot_progress=progress,
+            turn_state=self.turn_manager.to_dict(),
+            versions=self._prompt_versions(),
+            plot_point=self.guardian.current_plot_point(),
+        )
+
+        # Step 2: Execute game directives
+        results = self._resolve_directives(kp_resp, party, character_id)
+
+        # Step 3: If directives produced results, feed back to AI
+        continuation = None
+        if results:
+            result_text = self._format_results(results)
+            continuation = await self.keeper.feed_result(result_text)
+
+        # Step 4: Clues, ending conditions, result
+        return self._finish_turn(kp_resp, results, continuation)
+
+    async def _process_with_dice_tools(
+        self,
+        player_input: str,
+        character_id: str,
+        party: list[CoCCharacter],
+        progress: str,
+    ) -> dict:
+        """Turn where the model rolls dice through tools and narrates the outcome in one reply."""
+        tool_results: list[DirectiveResult] = []
+
+        async def roll(name: str, args: dict) -> str:
+            directive = tool_directive(name, args)
+            if directive is None:
+                return f"未知工具: {name}"
+            # The tool's character_id arrives as target_character, as in JSON mode
+            result = self._execute_directive(directive, character_id)
+            if result is None:
+                return "无法检定：找不到该角色"
+            tool_results.append(result)
+            return result.description
+
+        kp_resp = await self.keeper.generate_with_dice_tools(
+            player_input=player_input,
+            characters=party,
+            handler=roll,
+            plot_progress=progress,
+            turn_state=self.turn_manager.to_dict(),
+            versions=self._prompt_versions(),
+            plot_point=self.guardian.current_plot_point(),
+        )
+
+        # Checks the model still emitted as directives take the two-call path
+        results = self._resolve_directives(kp_resp, party, character_id)
+        continuation = None
+        if results:
+            continuation = await self.keeper.feed_result(self._format_results(results))
+
+        return self._finish_turn(kp_resp, tool_results + results, continuation)
+
+    async def stream_player_input(
+        self, player_input: str, character_id: str = ""
+    ) -> AsyncIterator[dict]:
+        """Streaming variant of process_player_input.
+
+        Yields `narrative_delta` events while the KP response (and any dice
+        continuation) is still being generated, then a single `turn_result`
+        event carrying the same dict process_player_input returns. Directives
+        are executed only once the response is complete.
+        """
+        error = self._check_turn(character_id)
+        if error:
+            yield {"type": "turn_result", "result": error}
+            return
+
+        party = self.characters.list_party()
+        progress = self.guardian.generate_progress_prompt()
+
+        parser = StreamingResponseParser()
+        async for chunk in self.keeper.stream_response(
+            player_input=player_input,
+            characters=party,
+            plot_progress=progress,
+            turn_state=self.turn_manager.to_dict(),
+            versions=self._prompt_versions(),
+            plot_point=self.guardian.current_plot_point(),
+            parser=parser,
+        ):
+            for kind, value in parser.feed(chunk):
+                if kind == "narrative":
+                    yield {"type": "narrative_delta", "segment": "narrative", "content": value}
+        kp_resp = parser.close()
+
+        results = self._resolve_directives(kp_resp, party, character_id)
+        for r in results:
+            yield {"type": "directive_result", "result": r.model_dump()}
+
+        continuation = None
+        if results:
+            parser = StreamingResponseParser()
+            async for chunk in self.keeper.stream_feed_result(
+                self._format_results(results), parser=parser
+            ):
+                for kind, value in parser.feed(chunk):
+                    if kind == "narrative":
+                        yield {
+                            "type": "narrative_delta",
+                            "segment": "continuation",
+                            "content": value,
+                        }
+            continuation = parser.close()
+
+        yield {"type": "turn_result", "result": self._finish_turn(kp_resp, results, continuation)}
+
     def _execute_directive(
         self, directive: GameDirective, character_id: str
     ) -> Optional[DirectiveResult]:
+        # Combined turns name the investigator each check applies to
+        if directive.target_character and self.characters.get_character(
+            directive.target_character
+        ):
+            character_id = directive.target_character
         if directive.type == "skill_check":
             return self._handle_skill_check(directive, character_id)
         elif directive.type == "san_check":
@@ -310,13 +488,24 @@ class GameEngine:
             "scenario_id": self.scenario.meta.id,
             "scenario_title": self.scenario.meta.title,
             "characters": chars_data,
-            "keeper_history": self.keeper.history,
+            # A copy down to the entries: the save may be serialized on a
+            # worker thread mid-turn. A lazy history copies only its tail.
+            "keeper_history": self._history_snapshot(),
             "keeper_tokens": self.keeper._total_tokens,
+            "story_summary": self.keeper.story_summary,
+            "summarized_upto": self.keeper.summarized_upto,
             "discovered_clues": list(self.guardian.discovered_clues),
             "completed_points": list(self.guardian.completed_points),
             "turn_state": self.turn_manager.to_dict(),
         }
 
+    def _history_snapshot(self):
+        """Keeper history copied entry by entry, for a save."""
+        history = self.keeper.history
+        if isinstance(history, LazyHistory):
+            return history.copy()
+        return snapshot_entries(history)
+
     def load_save_data(self, data: dict) -> None:
         """Restore game state from saved data."""
         self.state.phase = GamePhase(data["phase"])
@@ -325,105 +514,93 @@ class GameEngine:
         self.characters._characters.clear()
         for cid, cdata in data.get("characters", {}).items():
             self.characters._characters[cid] = CoCCharacter(**cdata)
+        self.characters.touch()
         # Restore keeper state
         self.keeper.history = data.get("keeper_history", [])
         self.keeper._total_tokens = data.get("keeper_tokens", 0)
+        self.keeper.story_summary = data.get("story_summary", "")
+        self.keeper.summarized_upto = data.get("summarized_upto", 0)
         # Restore guardian state
         self.guardian.discovered_clues = set(data.get("discovered_clues", []))
         self.guardian.completed_points = set(data.get("completed_points", []))
+        self.guardian.touch()
         # Restore turn state (default to exploration if absent for old saves)
         turn_data = data.get("turn_state")
         if turn_data:
             self.turn_manager = TurnManager.from_dict(turn_data)
         else:
             self.turn_manager = TurnManager()
-
-    def save_to_file(self, slot: str = "auto") -> Path:
-        """Save game state to a JSON file."""
-        SAVES_DIR.mkdir(parents=True, exist_ok=True)
-        filename = f"{self.session.id}_{slot}.json"
-        path = SAVES_DIR / filename
-        path.write_text(json.dumps(self.to_save_data(), ensure_ascii=False, indent=2))
-        return path
-
-    @staticmethod
-    def list_saves(session_id: str) -> list[dict]:
-        """List available save files for a session."""
-        if not SAVES_DIR.exists():
-            return []
-        saves = []
-        for f in SAVES_DIR.glob(f"{session_id}_*.json"):
-            slot = f.stem.split("_", 1)[1]
-            stat = f.stat()
-            saves.append({
-                "slot": slot,
-                "filename": f.name,
-                "modified": stat.st_mtime,
-            })
-        return sorted(saves, key=lambda s: s["modified"], reverse=True)
-
-    @staticmethod
-    def list_all_saves() -> list[dict]:
-        """List all save files, deduplicated by (session_id, slot_type)."""
-        if not SAVES_DIR.exists():
-            return []
-        # Collect saves grouped by (session_id, slot_type)
-        # slot_type is "auto" or the actual slot name (e.g. "manual")
-        by_key: dict[tuple[str, str], dict] = {}
-        for f in SAVES_DIR.glob("*.json"):
-            try:
-                data = json.loads(f.read_text())
-            except (json.JSONDecodeError, OSError):
-                continue
-            session_id = data.get("session", {}).get("id", "")
-            pc_names = [
-                c.get("name", "")
-                for c in data.get("characters", {}).values()
-                if not c.get("is_npc", False)
-            ]
-            slot = f.stem.split("_", 1)[1] if "_" in f.stem else "unknown"
-            entry = {
-                "filename": f.name,
-                "session_id": session_id,
-                "scenario_id": data.get("scenario_id", ""),
-                "scenario_title": data.get("scenario_title", data.get("scenario_id", "")),
-                "save_name": data.get("save_name", ""),
-                "phase": data.get("phase", ""),
-                "slot": slot,
-                "characters": pc_names,
-                "modified": f.stat().st_mtime,
-            }
-            key = (session_id, slot)
-            if key not in by_key or entry["modified"] > by_key[key]["modified"]:
-                by_key[key] = entry
-        return sorted(by_key.values(), key=lambda s: s["modified"], reverse=True)
-
-    @staticmethod
-    def find_latest_save(scenario_id: str) -> Optional[dict]:
-        """Find the most recent auto-save for a given scenario."""
-        if not SAVES_DIR.exists():
-            return None
-        best = None
-        best_mtime = 0.0
-        for f in SAVES_DIR.glob("*_auto.json"):
+        # Events sent before the load no longer describe this game
+        self.events.reset()
+        # The auto slot on disk no longer matches; the next checkpoint snapshots
+        if self.journal:
+            self.journal.reset()
+
+    async def save_to_file(self, slot: str = "auto") -> str:
+        """Save game state to a slot; returns the save's filename."""
+        data = self.to_save_data()
+        journaled = self.journal is not None and slot == "auto"
+        if journaled:
+            self.journal.mark(self)
+        try:
+            return await self.storage.save(self.session.id, slot, data)
+        except Exception:
+            if journaled:
+                self.journal.reset()
+            raise
+
+    async def checkpoint(self) -> None:
+        """Persist progress to the auto slot.
+
+        With a journal this appends the changes since the last checkpoint and
+        only rewrites the full snapshot every `snapshot_every` records.
+        """
+        if self.journal is None or self.journal.snapshot_due:
+            await self.save_to_file("auto")
+            return
+        record = self.journal.next_record(self)
+        if record is not None:
             try:
-                data = json.loads(f.read_text())
-            except (json.JSONDecodeError, OSError):
-                continue
-            if data.get("scenario_id") == scenario_id:
-                mtime = f.stat().st_mtime
-                if mtime > best_mtime:
-                    best_mtime = mtime
-                    best = {"filename": f.name, "data": data}
-        return best
-
-    def load_from_file(self, slot: str = "auto") -> bool:
-        """Load game state from a JSON file. Returns True if successful."""
-        filename = f"{self.session.id}_{slot}.json"
-        path = SAVES_DIR / filename
-        if not path.exists():
+                await self.storage.append(self.session.id, "auto", record, self.save_header_data())
+            except Exception:
+                self.journal.reset()
+                raise
+
+    def save_header_data(self) -> dict:
+        """The part of the save data the save list shows."""
+        return {
+            "session": self.session.model_dump(),
+            "phase": self.state.phase.value,
+            "scenario_id": self.scenario.meta.id,
+            "scenario_title": self.scenario.meta.title,
+            "characters": {
+                cid: {"name": c.name, "is_npc": c.is_npc}
+                for cid, c in self.characters._characters.items()
+            },
+        }
+
+    async def load_from_file(self, slot: str = "auto") -> bool:
+        """Load game state from a slot. Returns True if successful."""
+        loaded = await self.storage.load(self.session.id, slot)
+        if loaded is None:
             return False
-        data = json.loads(path.read_text())
+        data, records = loaded
         self.load_save_data(data)
+        if self.journal and slot == "auto":
+            # Keep appending to the journal that was just replayed
+            self.journal.mark(self, records)
         return True
 
+    def history_in_memory(self) -> int:
+        """Index of the first keeper history entry not left on disk."""
+        history = self.keeper.history
+        return history.loaded_from if isinstance(history, LazyHistory) else 0
+
+    async def read_history(self, start: int, stop: int) -> list[dict]:
+        """Keeper history entries [start, stop); on-disk chunks are read off the loop."""
+        history = self.keeper.history
+        if start >= self.history_in_memory():
+            return list(history[start:stop])
+        # A copy, so the game can go on while the worker decodes old chunks
+        snapshot = history.copy()
+        return await self.storage.run(lambda: snapshot.read(start, stop))
@@ -1,10 +1,13 @@
 """Turn management for multi-character party system."""
 
+import itertools
 from enum import Enum
 from typing import Optional
 
 from backend.character.models import CoCCharacter
 
+_versions = itertools.count(1)
+
 
 class TurnMode(str, Enum):
     EXPLORATION = "exploration"
@@ -19,6 +22,10 @@ class TurnManager:
         self.actions_remaining: dict[str, int] = {}
         self.round_number: int = 0
         self._active_character_id: Optional[str] = None
+        self.version = next(_versions)
+
+    def touch(self) -> None:
+        self.version = next(_versions)
 
     @property
     def current_actor_id(self) -> Optional[str]:
@@ -34,6 +41,7 @@ class TurnManager:
         sorted_party = sorted(party, key=lambda c: c.characteristics.DEX, reverse=True)
         self.turn_queue = [c.id for c in sorted_party]
         self.actions_remaining = {c.id: 1 for c in sorted_party}
+        self.touch()
         return self.turn_queue[0] if self.turn_queue else ""
 
     def end_combat(self) -> None:
@@ -43,6 +51,7 @@ class TurnManager:
         self.actions_remaining.clear()
         self.round_number = 0
         self.current_index = 0
+        self.touch()
 
     def can_act(self, character_id: str) -> bool:
         """Check if a character can act right now."""
@@ -60,6 +69,7 @@ class TurnManager:
         remaining = self.actions_remaining.get(character_id, 0)
         if remaining > 0:
             self.actions_remaining[character_id] = remaining - 1
+            self.touch()
 
     def advance_turn(self) -> Optional[str]:
         """Move to next character in combat queue. Returns next actor ID."""
@@ -70,21 +80,25 @@ class TurnManager:
             self.current_index = 0
             self.round_number += 1
             self.actions_remaining = {cid: 1 for cid in self.turn_queue}
+        self.touch()
         return self.turn_queue[self.current_index]
 
     def grant_extra_action(self, character_id: str, count: int = 1) -> None:
         """KP grants extra actions to a character this round."""
         current = self.actions_remaining.get(character_id, 0)
         self.actions_remaining[character_id] = current + count
+        self.touch()
 
     def force_switch(self, character_id: str) -> None:
         """Exploration mode: KP forces switch to a specific character."""
         self._active_character_id = character_id
+        self.touch()
 
     def set_active(self, character_id: str) -> None:
         """Player selects active character (exploration mode only)."""
         if self.mode == TurnMode.EXPLORATION:
             self._active_character_id = character_id
+            self.touch()
 
     def to_dict(self) -> dict:
         return {
@@ -1,14 +1,22 @@
 """Dependency injection - service singletons for FastAPI."""
 
+from backend.ai.providers.admission import AdmissionController, AdmissionProvider
 from backend.ai.providers.base import AIProviderBase, create_provider
+from backend.ai.providers.resilient import ResilientProvider
 from backend.character.service import CharacterService
 from backend.config import settings
+from backend.core.game_engine import SAVES_DIR
+from backend.persistence.storage import FileStorage, SaveStorage
+from backend.persistence.writer import SaveWriter
 from backend.scenario.loader import ScenarioLoader
 
 
 _character_service: CharacterService | None = None
 _scenario_loader: ScenarioLoader | None = None
 _ai_provider: AIProviderBase | None = None
+_summary_provider: AIProviderBase | None = None
+_admission: AdmissionController | None = None
+_save_storage: SaveStorage | None = None
 
 
 def get_character_service() -> CharacterService:
@@ -18,6 +26,31 @@ def get_character_service() -> CharacterService:
     return _character_service
 
 
+def get_save_storage() -> SaveStorage:
+    global _save_storage
+    if _save_storage is None:
+        if settings.save_storage == "sqlite":
+            from backend.persistence.sqlite import SqliteStorage
+            _save_storage = SqliteStorage(settings.save_database_url)
+        elif settings.save_storage == "files":
+            _save_storage = FileStorage(
+                SAVES_DIR,
+                SaveWriter(settings.save_workers, settings.save_fsync),
+                settings.save_format,
+            )
+        else:
+            raise ValueError(f"Unknown save storage: {settings.save_storage}")
+    return _save_storage
+
+
+async def close_save_storage() -> None:
+    """Finish queued save writes and release the backend (app shutdown)."""
+    global _save_storage
+    if _save_storage is not None:
+        await _save_storage.close()
+        _save_storage = None
+
+
 def get_scenario_loader() -> ScenarioLoader:
     global _scenario_loader
     if _scenario_loader is None:
@@ -25,23 +58,99 @@ def get_scenario_loader() -> ScenarioLoader:
     return _scenario_loader
 
 
+def _pool_options() -> dict:
+    return {
+        "max_connections": settings.http_max_connections,
+        "max_keepalive_connections": settings.http_max_keepalive_connections,
+        "keepalive_expiry": settings.http_keepalive_expiry,
+        "http2": settings.http2,
+        "timeout": settings.http_timeout,
+    }
+
+
+def _create_backend(provider_name: str, model: str = "") -> AIProviderBase:
+    model = model or settings.ai_model
+    if provider_name == "claude":
+        return create_provider(
+            "claude",
+            api_key=settings.anthropic_api_key,
+            model=model,
+            prompt_cache=settings.claude_prompt_cache,
+            **_pool_options(),
+        )
+    elif provider_name == "openai":
+        return create_provider(
+            "openai",
+            api_key=settings.openai_api_key,
+            model=model,
+            base_url=settings.openai_base_url,
+            **_pool_options(),
+        )
+    elif provider_name == "replay":
+        inner = None
+        if settings.replay_mode == "record":
+            inner = _create_backend(settings.replay_record_provider)
+        return create_provider(
+            "replay",
+            cassette=settings.replay_cassette,
+            mode=settings.replay_mode,
+            inner=inner,
+            latency=settings.replay_latency,
+            tokens_per_second=settings.replay_tokens_per_second,
+        )
+    else:
+        raise ValueError(f"Unknown provider: {provider_name}")
+
+
+def get_admission_controller() -> AdmissionController:
+    global _admission
+    if _admission is None:
+        _admission = AdmissionController(
+            max_in_flight=settings.ai_max_in_flight,
+            requests_per_minute=settings.ai_requests_per_minute,
+            tokens_per_minute=settings.ai_tokens_per_minute,
+        )
+    return _admission
+
+
 def get_ai_provider() -> AIProviderBase:
     global _ai_provider
     if _ai_provider is None:
-        provider_name = settings.ai_provider
-        if provider_name == "claude":
-            _ai_provider = create_provider(
-                "claude",
-                api_key=settings.anthropic_api_key,
-                model=settings.ai_model,
+        backends = [_create_backend(settings.ai_provider)]
+        if settings.ai_failover_provider:
+            # Settings guarantee a failover model of the failover provider
+            backends.append(
+                _create_backend(settings.ai_failover_provider, settings.ai_failover_model)
             )
-        elif provider_name == "openai":
-            _ai_provider = create_provider(
-                "openai",
-                api_key=settings.openai_api_key,
-                model=settings.ai_model,
-                base_url=settings.openai_base_url,
-            )
-        else:
-            raise ValueError(f"Unknown provider: {provider_name}")
+        # Each attempt (including retries) is admitted separately
+        controller = get_admission_controller()
+        backends = [AdmissionProvider(b, controller) for b in backends]
+        _ai_provider = ResilientProvider(
+            backends,
+            max_retries=settings.ai_max_retries,
+            base_delay=settings.ai_retry_base_delay,
+            max_delay=settings.ai_retry_max_delay,
+            failure_threshold=settings.ai_breaker_failures,
+            reset_timeout=settings.ai_breaker_reset,
+        )
     return _ai_provider
+
+
+def get_summary_provider() -> AIProviderBase | None:
+    """Provider for history compaction, or None to reuse the KP provider."""
+    global _summary_provider
+    if _summary_provider is None and settings.ai_summary_model:
+        backend = _create_backend(settings.ai_provider, settings.ai_summary_model)
+        _summary_provider = AdmissionProvider(backend, get_admission_controller())
+    return _summary_provider
+
+
+async def close_ai_provider() -> None:
+    """Close the shared providers' connection pools (app shutdown)."""
+    global _ai_provider, _summary_provider
+    if _ai_provider is not None:
+        await _ai_provider.aclose()
+        _ai_provider = None
+    if _summary_provider is not None:
+        await _summary_provider.aclose()
+        _summary_provider = None
@@ -1,12 +1,36 @@
+from contextlib import asynccontextmanager
+from typing import Optional
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 
 from backend.api.routes import character, game, scenario, session
+from backend.config import settings
+from backend.dependencies import (
+    close_ai_provider,
+    close_save_storage,
+    get_admission_controller,
+    get_ai_provider,
+    get_save_storage,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm the provider's connection pool so the first KP turn skips the handshake
+    if settings.ai_warmup:
+        try:
+            await get_ai_provider().warmup()
+        except ValueError:
+            pass
+    yield
+    await close_ai_provider()
+    await close_save_storage()
 
 
 def create_app() -> FastAPI:
-    app = FastAPI(title="AI TRPG", version="0.1.0")
+    app = FastAPI(title="AI TRPG", version="0.1.0", lifespan=lifespan)
     app.add_middleware(
         CORSMiddleware,
         allow_origins=["*"],
@@ -25,19 +49,20 @@ def create_app() -> FastAPI:
     async def health_check():
         return {"status": "ok"}
 
+    @app.get("/api/llm/stats")
+    async def llm_stats():
+        return get_admission_controller().stats()
+
     @app.get("/api/saves")
-    async def list_all_saves():
-        from backend.core.game_engine import GameEngine
-        return {"saves": GameEngine.list_all_saves()}
+    async def list_all_saves(scenario_id: str = "", offset: int = 0, limit: Optional[int] = None):
+        saves = await get_save_storage().query(scenario_id, offset=offset, limit=limit)
+        return {"saves": saves}
 
     @app.delete("/api/saves/{filename}")
     async def delete_save(filename: str):
-        from backend.core.game_engine import SAVES_DIR
         from fastapi import HTTPException
-        path = SAVES_DIR / filename
-        if not path.exists():
+        if not await get_save_storage().delete(filename):
             raise HTTPException(404, "Save file not found")
-        path.unlink()
         return {"status": "deleted", "filename": filename}
 
     class RenameSaveRequest(BaseModel):
@@ -45,20 +70,45 @@ def create_app() -> FastAPI:
 
     @app.patch("/api/saves/{filename}")
     async def rename_save(filename: str, req: RenameSaveRequest):
-        import json
-        from backend.core.game_engine import SAVES_DIR
         from fastapi import HTTPException
-        path = SAVES_DIR / filename
-        if not path.exists():
-            raise HTTPException(404, "Save file not found")
         try:
-            data = json.loads(path.read_text())
-        except (json.JSONDecodeError, OSError):
+            renamed = await get_save_storage().rename(filename, req.save_name)
+        except (ValueError, OSError):
             raise HTTPException(400, "Invalid save file")
-        data["save_name"] = req.save_name
-        path.write_text(json.dumps(data, ensure_ascii=False, indent=2))
+        if not renamed:
+            raise HTTPException(404, "Save file not found")
         return {"status": "renamed", "filename": filename, "save_name": req.save_name}
 
+    @app.get("/api/saves/{filename}/export")
+    async def export_save(filename: str):
+        """The save as one JSON document, whatever format it is stored in."""
+        from backend.persistence.save_format import encode
+        from fastapi import HTTPException, Response
+        try:
+            data = await get_save_storage().read(filename)
+        except (ValueError, OSError):
+            raise HTTPException(400, "Invalid save file")
+        if data is None:
+            raise HTTPException(404, "Save file not found")
+        stem = filename.rsplit(".", 1)[0]
+        return Response(
+            encode(data, binary=False, indent=2),
+            media_type="application/json",
+            headers={"Content-Disposition": f'attachment; filename="{stem}.json"'},
+        )
+
+    @app.post("/api/saves/import")
+    async def import_save(data: dict, slot: str = "import"):
+        """Store an exported JSON save in the configured storage."""
+        from fastapi import HTTPException
+        session_id = data.get("session", {}).get("id", "")
+        if not session_id or not data.get("scenario_id") or "phase" not in data:
+            raise HTTPException(422, "Not a save file")
+        if not all(c.isalnum() or c in "-_" for c in session_id + slot):
+            raise HTTPException(422, "Invalid session id or slot")
+        filename = await get_save_storage().save(session_id, slot, data)
+        return {"status": "imported", "filename": filename}
+
     return app
 
 
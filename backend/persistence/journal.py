@@ -0,0 +1,157 @@
+"""Append-only turn journal: per-turn deltas on top of a periodic full snapshot.
+
+A save slot is a snapshot file (`{session}_{slot}.sav` or `.json`, the full
+`GameEngine.to_save_data()` dict) plus a journal next to it
+(`{session}_{slot}.journal`) holding one JSON line per turn with only what
+the turn changed. Loading a slot reads the snapshot and replays the journal;
+writing a new snapshot truncates the journal (compaction).
+
+Every record field except `history` holds the field's complete new value, and
+`history` carries the index it starts at, so replaying a record twice (e.g.
+after a crash between snapshot and truncation) gives the same state.
+"""
+
+import json
+from pathlib import Path
+from typing import Optional
+
+from backend.persistence.save_format import load, load_header, snapshot_entries
+
+DEFAULT_SNAPSHOT_EVERY = 20
+
+
+def journal_path(snapshot: Path) -> Path:
+    """The journal file belonging to a snapshot file."""
+    return snapshot.with_suffix(".journal")
+
+
+def read_journal(path: Path) -> list[dict]:
+    """Records in a journal file; a torn last line from a crash is dropped."""
+    if not path.exists():
+        return []
+    records = []
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+    return records
+
+
+def read_save(path: Path) -> dict:
+    """Save data from a snapshot file with its journal replayed."""
+    return replay(load(path), read_journal(journal_path(path)))
+
+
+def read_save_header(path: Path) -> dict:
+    """Header fields of a save (see `save_format.load_header`), journal applied."""
+    return replay(load_header(path), read_journal(journal_path(path)))
+
+
+def save_mtime(path: Path) -> float:
+    """Last write to a save slot, counting journal appends."""
+    journal = journal_path(path)
+    mtime = path.stat().st_mtime
+    return max(mtime, journal.stat().st_mtime) if journal.exists() else mtime
+
+
+def replay(data: dict, records: list[dict]) -> dict:
+    """Apply journal records to snapshot data in place and return it."""
+    for record in records:
+        record = dict(record)
+        record.pop("turn", None)
+        start = record.pop("history_from", None)
+        entries = record.pop("history", None)
+        if entries is not None:
+            # In place, so a lazily loaded history only touches its tail
+            history = data.setdefault("keeper_history", [])
+            del history[start:]
+            history.extend(entries)
+        data.update(record)
+    return data
+
+
+class TurnJournal:
+    """Tracks what was last written for a slot and appends the difference.
+
+    Changes are detected with the state's version counters (characters, plot,
+    turn order) and the history length, so a record costs what the turn
+    changed, not what the campaign has accumulated.
+    """
+
+    def __init__(self, snapshot_every: int = DEFAULT_SNAPSHOT_EVERY):
+        self.snapshot_every = snapshot_every
+        self.reset()
+
+    @property
+    def snapshot_due(self) -> bool:
+        """True before anything is on disk, or once the journal is long enough.
+
+        `snapshot_every=0` never compacts (for storage that applies records).
+        """
+        if self._mark is None:
+            return True
+        return bool(self.snapshot_every) and self.records >= self.snapshot_every
+
+    def reset(self) -> None:
+        """Forget the mark; the next checkpoint writes a full snapshot."""
+        self.records = 0
+        self._mark = None
+
+    def mark(self, engine, records: int = 0) -> None:
+        """Remember the engine state as written (after a snapshot or replay)."""
+        keeper = engine.keeper
+        self.records = records
+        self._mark = {
+            "history": len(keeper.history),
+            "summary": (keeper.story_summary, keeper.summarized_upto),
+            "keeper_tokens": keeper._total_tokens,
+            "phase": engine.state.phase.value,
+            "characters": engine.characters.version,
+            "plot": engine.guardian.version,
+            "turn": engine.turn_manager.version,
+        }
+
+    def delta(self, engine) -> Optional[dict]:
+        """What changed since the mark, or None when nothing did."""
+        mark = self._mark
+        keeper = engine.keeper
+        record: dict = {}
+        start = min(mark["history"], len(keeper.history))
+        if len(keeper.history) != mark["history"]:
+            record["history_from"] = start
+            # Entry copies: the record is encoded on the writer thread
+            record["history"] = snapshot_entries(keeper.history[start:])
+        if (keeper.story_summary, keeper.summarized_upto) != mark["summary"]:
+            record["story_summary"] = keeper.story_summary
+            record["summarized_upto"] = keeper.summarized_upto
+        if keeper._total_tokens != mark["keeper_tokens"]:
+            record["keeper_tokens"] = keeper._total_tokens
+        if engine.state.phase.value != mark["phase"]:
+            record["phase"] = engine.state.phase.value
+            record["session"] = engine.session.model_dump()
+        if engine.characters.version != mark["characters"]:
+            record["characters"] = {
+                cid: char.model_dump()
+                for cid, char in engine.characters._characters.items()
+            }
+        if engine.guardian.version != mark["plot"]:
+            record["discovered_clues"] = list(engine.guardian.discovered_clues)
+            record["completed_points"] = list(engine.guardian.completed_points)
+        if engine.turn_manager.version != mark["turn"]:
+            record["turn_state"] = engine.turn_manager.to_dict()
+        return record or None
+
+    def next_record(self, engine) -> Optional[dict]:
+        """The engine's delta as the next journal record, marked as written.
+
+        None when nothing changed. If writing the record fails, call
+        `reset()` so the next checkpoint falls back to a full snapshot.
+        """
+        record = self.delta(engine)
+        if record is None:
+            return None
+        record = {"turn": self.records + 1, **record}
+        self.mark(engine, self.records + 1)
+        return record
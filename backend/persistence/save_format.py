@@ -0,0 +1,300 @@
+"""Compact binary save format with lazily loaded history.
+
+A `.sav` file is:
+
+    MAGIC (7 bytes) | version (1 byte) | u32 table length | table | blobs
+
+The table is zlib-compressed JSON locating each zlib-compressed JSON blob:
+the sections `header` (what the save list shows), `characters` and `state`
+(guardian, turn order, summary...), plus the keeper history in chunks of
+`HISTORY_CHUNK` entries. Loading reads the table and sections but only the
+history chunks from the one holding `summarized_upto` onward; older chunks
+are read when something indexes into them. Rewriting a save copies the
+compressed bytes of chunks that were never loaded instead of re-encoding
+them.
+
+JSON saves (`.json`) remain readable and writable; see `load()` / `encode()`.
+"""
+
+import json
+import struct
+import threading
+import zlib
+from collections.abc import MutableSequence
+from pathlib import Path
+from typing import Any, Optional
+
+MAGIC = b"TRPGSAV"
+FORMAT_VERSION = 1
+HISTORY_CHUNK = 64
+SAVE_SUFFIXES = (".sav", ".json")
+
+# Save fields kept in the header section, alongside a name-only party list
+HEADER_KEYS = ("session", "phase", "scenario_id", "scenario_title", "save_name")
+
+_PREAMBLE = struct.Struct(">7sBI")
+
+
+def _pack(value: Any) -> bytes:
+    return zlib.compress(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+
+
+def _unpack(blob: bytes) -> Any:
+    return json.loads(zlib.decompress(blob))
+
+
+def save_files(directory: Path) -> list[Path]:
+    """Snapshot files of every format in a saves directory."""
+    return [f for suffix in SAVE_SUFFIXES for f in directory.glob(f"*{suffix}")]
+
+
+class SaveFile:
+    """An open `.sav` file; sections and chunks are read by offset.
+
+    The file handle stays open so a history loaded from it keeps reading
+    the same bytes after the save is atomically replaced on disk.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._file = path.open("rb")
+        self._lock = threading.Lock()
+        try:
+            magic, version, size = _PREAMBLE.unpack(self._file.read(_PREAMBLE.size))
+        except struct.error:
+            magic, version, size = b"", 0, 0
+        if magic != MAGIC:
+            self._file.close()
+            raise ValueError(f"Not a save file: {path.name}")
+        if version > FORMAT_VERSION:
+            self._file.close()
+            raise ValueError(f"Save format v{version} is newer than supported v{FORMAT_VERSION}")
+        table = _unpack(self._file.read(size))
+        self._base = _PREAMBLE.size + size
+        self.sections: dict[str, list[int]] = table["sections"]
+        self.chunks: list[list[int]] = table["chunks"]  # [offset, length, count]
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __del__(self):
+        self._file.close()
+
+    def raw(self, offset: int, length: int) -> bytes:
+        with self._lock:
+            self._file.seek(self._base + offset)
+            return self._file.read(length)
+
+    def section(self, name: str) -> Any:
+        return _unpack(self.raw(*self.sections[name]))
+
+    def chunk(self, i: int) -> list[dict]:
+        offset, length, _ = self.chunks[i]
+        return _unpack(self.raw(offset, length))
+
+
+class LazyHistory(MutableSequence):
+    """Keeper history whose oldest chunks stay on disk until indexed.
+
+    Behaves like the plain list it replaces; entries before `loaded_from`
+    are read from the save file the first time anything reaches them.
+    """
+
+    def __init__(
+        self,
+        source: Optional[SaveFile] = None,
+        pending: int = 0,
+        tail: Optional[list] = None,
+    ):
+        self._source = source
+        self._pending = pending  # Leading chunks of `source` not read yet
+        self._tail: list[dict] = tail if tail is not None else []
+        self.loaded_from = sum(c[2] for c in source.chunks[:pending]) if pending else 0
+
+    def _load_through(self, index: int) -> None:
+        """Read older chunks until entry `index` is in memory."""
+        while self._pending and index < self.loaded_from:
+            self._pending -= 1
+            chunk = self._source.chunk(self._pending)
+            self._tail[:0] = chunk
+            self.loaded_from -= len(chunk)
+
+    def _local(self, index: int) -> int:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("history index out of range")
+        self._load_through(index)
+        return index - self.loaded_from
+
+    def _local_slice(self, s: slice) -> slice:
+        start, stop, step = s.indices(len(self))
+        low = min(start, stop) if step > 0 else min(stop + 1, start)
+        self._load_through(max(low, 0))
+        base = self.loaded_from
+        return slice(start - base, stop - base if stop >= 0 else None, step)
+
+    def __len__(self) -> int:
+        return self.loaded_from + len(self._tail)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self._tail[self._local_slice(index)]
+        return self._tail[self._local(index)]
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            self._tail[self._local_slice(index)] = value
+        else:
+            self._tail[self._local(index)] = value
+
+    def __delitem__(self, index):
+        if isinstance(index, slice):
+            del self._tail[self._local_slice(index)]
+        else:
+            del self._tail[self._local(index)]
+
+    def insert(self, index: int, value: dict) -> None:
+        index = max(0, min(index + len(self) if index < 0 else index, len(self)))
+        self._load_through(index)
+        self._tail.insert(index - self.loaded_from, value)
+
+    def append(self, value: dict) -> None:
+        self._tail.append(value)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (list, LazyHistory)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"LazyHistory({len(self)} entries, {len(self._tail)} loaded)"
+
+    def copy(self) -> "LazyHistory":
+        """A snapshot sharing the unread chunks (safe to encode on another thread).
+
+        Loaded entries are copied too: the loop backfills keys like `tokens`
+        into them while a worker may be encoding the snapshot.
+        """
+        return LazyHistory(self._source, self._pending, snapshot_entries(self._tail))
+
+    def read(self, start: int, stop: int) -> list[dict]:
+        """Entries [start, stop), decoding only the chunks they fall in.
+
+        Nothing is kept in memory; call it on a `copy()` to page through old
+        history from another thread while the game goes on.
+        """
+        entries: list[dict] = []
+        first = 0
+        unread = self._source.chunks[:self._pending] if self._pending else []
+        for i, (_, _, count) in enumerate(unread):
+            if first < stop and first + count > start:
+                chunk = self._source.chunk(i)
+                entries.extend(chunk[max(start - first, 0):stop - first])
+            first += count
+        if stop > self.loaded_from:
+            entries.extend(self._tail[max(start - self.loaded_from, 0):stop - self.loaded_from])
+        return entries
+
+    def raw_chunks(self) -> list[tuple[bytes, int]]:
+        """Compressed bytes and entry counts of the chunks never loaded."""
+        return [
+            (self._source.raw(offset, length), count)
+            for offset, length, count in self._source.chunks[:self._pending]
+        ]
+
+    @property
+    def tail(self) -> list[dict]:
+        return self._tail
+
+
+def snapshot_entries(entries) -> list[dict]:
+    """Copy history entries so another thread can encode them safely."""
+    return [dict(e) for e in entries]
+
+
+def _plain(value):
+    """json.dumps fallback: a history that is still partly on disk."""
+    if isinstance(value, LazyHistory):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def encode(data: dict, binary: bool = True, indent: Optional[int] = None) -> bytes:
+    """Serialize save data: `.sav` bytes, or JSON when `binary` is False."""
+    if not binary:
+        return json.dumps(data, ensure_ascii=False, indent=indent, default=_plain).encode("utf-8")
+
+    history = data.get("keeper_history", [])
+    blobs: list[bytes] = []
+    offset = 0
+
+    def add(blob: bytes) -> list[int]:
+        nonlocal offset
+        blobs.append(blob)
+        offset += len(blob)
+        return [offset - len(blob), len(blob)]
+
+    characters = data.get("characters", {})
+    header = {k: data[k] for k in HEADER_KEYS if k in data}
+    header["characters"] = {
+        cid: {"name": c.get("name", ""), "is_npc": c.get("is_npc", False)}
+        for cid, c in characters.items()
+    }
+    state = {
+        k: v for k, v in data.items()
+        if k not in HEADER_KEYS and k not in ("characters", "keeper_history")
+    }
+    sections = {
+        "header": add(_pack(header)),
+        "characters": add(_pack(characters)),
+        "state": add(_pack(state)),
+    }
+    chunks = []
+    if isinstance(history, LazyHistory):
+        for blob, count in history.raw_chunks():
+            chunks.append(add(blob) + [count])
+        entries = history.tail
+    else:
+        entries = history
+    for i in range(0, len(entries), HISTORY_CHUNK):
+        part = entries[i:i + HISTORY_CHUNK]
+        chunks.append(add(_pack(part)) + [len(part)])
+
+    table = _pack({"sections": sections, "chunks": chunks})
+    return _PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(table)) + table + b"".join(blobs)
+
+
+def load(path: Path) -> dict:
+    """Save data from a `.sav` or `.json` snapshot.
+
+    For `.sav` files `keeper_history` is a `LazyHistory` holding the chunks
+    from the one containing `summarized_upto` onward (at least the last).
+    """
+    if path.suffix != ".sav":
+        return json.loads(path.read_text(encoding="utf-8"))
+    save = SaveFile(path)
+    data = save.section("header")
+    data.update(save.section("state"))
+    data["characters"] = save.section("characters")
+    upto = data.get("summarized_upto", 0)
+    pending, seen = 0, 0
+    for i, (_, _, count) in enumerate(save.chunks[:-1]):
+        if seen + count > upto:
+            break
+        seen += count
+        pending = i + 1
+    tail = [e for i in range(pending, len(save.chunks)) for e in save.chunk(i)]
+    data["keeper_history"] = LazyHistory(save, pending, tail)
+    return data
+
+
+def load_header(path: Path) -> dict:
+    """Just the fields the save list needs; reads only the header section."""
+    if path.suffix != ".sav":
+        return json.loads(path.read_text(encoding="utf-8"))
+    save = SaveFile(path)
+    try:
+        return save.section("header")
+    finally:
+        save.close()
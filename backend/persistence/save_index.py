@@ -0,0 +1,147 @@
+"""Manifest of save headers, so listing saves never parses save bodies.
+
+The manifest (`saves.index` in the saves directory) maps each save filename
+to the few fields the lobby shows. It is kept current by the code that
+writes, renames and deletes saves, and rewritten atomically whenever a
+header changes (`update()`/`remove()` report that; the caller then
+`flush()`es through its save writer). Journal appends that only move a
+save's mtime are kept in memory; on first use in a process the manifest is
+reconciled with the directory by `stat()` alone, re-reading only saves
+written since. Storages do that through `load()`, on their save writer's
+pool rather than the event loop.
+"""
+
+import json
+from pathlib import Path
+from typing import Optional
+
+from backend.persistence.journal import read_save_header, save_mtime
+from backend.persistence.save_format import save_files
+from backend.persistence.writer import SaveWriter, atomic_write
+
+INDEX_FILENAME = "saves.index"
+
+# One index per directory, shared by every storage writing there
+_indexes: dict[Path, "SaveIndex"] = {}
+
+
+def index_for(directory: Path) -> "SaveIndex":
+    """The header index of a saves directory, loaded on first use."""
+    index = _indexes.get(directory)
+    if index is None:
+        index = _indexes[directory] = SaveIndex(directory)
+    return index
+
+
+def save_header(filename: str, data: dict, modified: float) -> dict:
+    """The indexed fields of one save."""
+    stem = filename.rsplit(".", 1)[0]
+    return {
+        "filename": filename,
+        "session_id": data.get("session", {}).get("id", ""),
+        "scenario_id": data.get("scenario_id", ""),
+        "scenario_title": data.get("scenario_title", data.get("scenario_id", "")),
+        "save_name": data.get("save_name", ""),
+        "phase": data.get("phase", ""),
+        "slot": stem.split("_", 1)[1] if "_" in stem else "unknown",
+        "characters": [
+            c.get("name", "")
+            for c in data.get("characters", {}).values()
+            if not c.get("is_npc", False)
+        ],
+        "modified": modified,
+    }
+
+
+class SaveIndex:
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.path = directory / INDEX_FILENAME
+        self._entries: Optional[dict[str, dict]] = None
+
+    @property
+    def entries(self) -> dict[str, dict]:
+        if self._entries is None:
+            entries, changed = self._load()
+            if changed:
+                atomic_write(self.path, json.dumps(entries, ensure_ascii=False))
+            self._entries = entries
+        return self._entries
+
+    async def load(self, writer: SaveWriter) -> None:
+        """Load and reconcile the manifest on `writer`'s pool, once."""
+        if self._entries is not None:
+            return
+        entries, changed = await writer.call(self._load)
+        if self._entries is None:  # Not loaded by a concurrent caller meanwhile
+            self._entries = entries
+            if changed:
+                await self.flush(writer)
+
+    def query(
+        self,
+        scenario_id: str = "",
+        session_id: str = "",
+        slot: str = "",
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ) -> list[dict]:
+        """Headers matching the filters, newest first."""
+        found = [
+            e for e in self.entries.values()
+            if (not scenario_id or e["scenario_id"] == scenario_id)
+            and (not session_id or e["session_id"] == session_id)
+            and (not slot or e["slot"] == slot)
+        ]
+        found.sort(key=lambda e: e["modified"], reverse=True)
+        end = None if limit is None else offset + limit
+        return found[offset:end]
+
+    def update(self, path: Path, data: dict) -> bool:
+        """Record the header of a save just written from `data`.
+
+        A `save_name` absent from `data` keeps the indexed one. Returns True
+        when the manifest needs flushing.
+        """
+        old = self.entries.get(path.name)
+        header = save_header(path.name, data, save_mtime(path))
+        if old and "save_name" not in data:
+            header["save_name"] = old["save_name"]
+        self.entries[path.name] = header
+        return old is None or {**old, "modified": 0} != {**header, "modified": 0}
+
+    def remove(self, filename: str) -> bool:
+        return self.entries.pop(filename, None) is not None
+
+    async def flush(self, writer: SaveWriter) -> None:
+        """Write the manifest; concurrent flushes collapse into the latest."""
+        await writer.write(self.path, dict(self.entries))
+
+    def _load(self) -> tuple[dict[str, dict], bool]:
+        """The manifest reconciled with the directory, and whether it changed."""
+        try:
+            entries = json.loads(self.path.read_text())
+        except (json.JSONDecodeError, OSError):
+            entries = {}
+        changed = False
+        on_disk = {}
+        for f in save_files(self.directory):
+            try:
+                on_disk[f.name] = save_mtime(f)
+            except OSError:
+                continue
+        for name in set(entries) - set(on_disk):
+            del entries[name]
+            changed = True
+        for name, mtime in on_disk.items():
+            entry = entries.get(name)
+            if entry and entry["modified"] >= mtime:
+                continue
+            try:
+                data = read_save_header(self.directory / name)
+            except (ValueError, OSError):
+                entries.pop(name, None)
+                continue
+            entries[name] = save_header(name, data, mtime)
+            changed = True
+        return entries, changed
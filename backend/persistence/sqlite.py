@@ -0,0 +1,378 @@
+"""SQLite save storage (needs the optional `db` extra: sqlalchemy + aiosqlite).
+
+Sessions, saves, characters and history entries are rows in indexed
+tables, so the save list is an index lookup and a turn's journal record
+becomes a few row inserts/updates rather than a file append that a later
+snapshot has to compact. The database runs in WAL mode; writes queued
+while a transaction is open are committed together in the next one, and a
+snapshot supersedes writes to the same save queued before it.
+"""
+
+import asyncio
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+from backend.persistence.save_format import HEADER_KEYS
+from backend.persistence.storage import SaveStorage
+
+try:
+    from sqlalchemy import (
+        JSON,
+        Boolean,
+        Column,
+        Float,
+        ForeignKey,
+        Index,
+        Integer,
+        MetaData,
+        String,
+        Table,
+        UniqueConstraint,
+        delete,
+        event,
+        select,
+        update,
+    )
+    from sqlalchemy.dialects.sqlite import insert
+    from sqlalchemy.ext.asyncio import AsyncConnection, create_async_engine
+except ImportError:  # Optional `db` extra
+    create_async_engine = None
+
+DEFAULT_DATABASE_URL = "sqlite+aiosqlite:///saves/trpg.db"
+
+if create_async_engine is not None:
+    metadata = MetaData()
+
+    sessions = Table(
+        "sessions", metadata,
+        Column("id", String, primary_key=True),
+        Column("scenario_id", String, nullable=False, index=True),
+        Column("scenario_title", String, nullable=False, default=""),
+        Column("updated", Float, nullable=False, index=True),
+    )
+
+    saves = Table(
+        "saves", metadata,
+        Column("filename", String, primary_key=True),
+        Column("session_id", String, ForeignKey("sessions.id", ondelete="CASCADE"), nullable=False),
+        Column("slot", String, nullable=False),
+        Column("scenario_id", String, nullable=False),
+        Column("scenario_title", String, nullable=False, default=""),
+        Column("phase", String, nullable=False, default=""),
+        Column("save_name", String, nullable=False, default=""),
+        Column("party", JSON, nullable=False, default=list),
+        # Save data other than the header, characters and history
+        Column("state", JSON, nullable=False, default=dict),
+        Column("modified", Float, nullable=False, index=True),
+        UniqueConstraint("session_id", "slot"),
+        Index("ix_saves_scenario_modified", "scenario_id", "modified"),
+        Index("ix_saves_session_modified", "session_id", "modified"),
+    )
+
+    characters = Table(
+        "characters", metadata,
+        Column("save", String, ForeignKey("saves.filename", ondelete="CASCADE"), primary_key=True),
+        Column("id", String, primary_key=True),
+        Column("name", String, nullable=False, default=""),
+        Column("is_npc", Boolean, nullable=False, default=False),
+        Column("data", JSON, nullable=False),
+    )
+
+    history = Table(
+        "history", metadata,
+        Column("save", String, ForeignKey("saves.filename", ondelete="CASCADE"), primary_key=True),
+        Column("seq", Integer, primary_key=True),
+        Column("role", String, nullable=False),
+        Column("entry", JSON, nullable=False),
+    )
+
+
+def _filename(session_id: str, slot: str) -> str:
+    return f"{session_id}_{slot}"
+
+
+def _party(chars: dict) -> list[str]:
+    return [c.get("name", "") for c in chars.values() if not c.get("is_npc", False)]
+
+
+class _Write:
+    def __init__(self, filename: str, snapshot: bool, run: Callable, future: asyncio.Future):
+        self.filename = filename
+        self.snapshot = snapshot
+        self.run = run  # async (connection) -> None
+        self.future = future
+
+
+class SqliteStorage(SaveStorage):
+    journal_compaction = False
+
+    def __init__(self, url: str = DEFAULT_DATABASE_URL, echo: bool = False):
+        if create_async_engine is None:
+            raise ImportError("SQLite storage needs the `db` extra: pip install 'ai-trpg[db]'")
+        self.engine = create_async_engine(url, echo=echo)
+        event.listen(self.engine.sync_engine, "connect", self._on_connect)
+        self._ready: Optional[asyncio.Task] = None
+        self._queue: list[_Write] = []
+        self._flusher: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _on_connect(dbapi_connection, _record) -> None:
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+    async def _setup(self) -> None:
+        if self._ready is None:
+            self._ready = asyncio.create_task(self._create_tables())
+        await asyncio.shield(self._ready)
+
+    async def _create_tables(self) -> None:
+        database = self.engine.url.database
+        if database and database != ":memory:":
+            Path(database).parent.mkdir(parents=True, exist_ok=True)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(metadata.create_all)
+
+    # Writes -----------------------------------------------------------------
+
+    async def _submit(self, filename: str, snapshot: bool, run: Callable) -> None:
+        await self._setup()
+        write = _Write(filename, snapshot, run, asyncio.get_running_loop().create_future())
+        self._queue.append(write)
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush())
+        await asyncio.shield(write.future)
+
+    async def _flush(self) -> None:
+        """Commit queued writes, one transaction per batch."""
+        while self._queue:
+            batch, self._queue = self._queue, []
+            # A snapshot makes earlier queued writes to the same save moot
+            last_snapshot = {w.filename: i for i, w in enumerate(batch) if w.snapshot}
+            live = [
+                w for i, w in enumerate(batch)
+                if i >= last_snapshot.get(w.filename, -1)
+            ]
+            try:
+                async with self.engine.begin() as conn:
+                    for w in live:
+                        await w.run(conn)
+            except Exception as e:
+                for w in batch:
+                    w.future.set_exception(e)
+            else:
+                for w in batch:
+                    w.future.set_result(None)
+
+    async def _settle(self) -> None:
+        """Wait for queued writes so reads see them."""
+        while self._flusher is not None and not self._flusher.done():
+            await asyncio.shield(self._flusher)
+
+    async def save(self, session_id: str, slot: str, data: dict) -> str:
+        filename = _filename(session_id, slot)
+        chars = dict(data.get("characters", {}))
+        entries = list(data.get("keeper_history", []))
+        header = {k: data[k] for k in HEADER_KEYS if k in data}
+        state = {
+            k: v for k, v in data.items()
+            if k not in HEADER_KEYS and k not in ("characters", "keeper_history")
+        }
+        now = time.time()
+
+        async def run(conn: "AsyncConnection") -> None:
+            await self._upsert_session(conn, session_id, data, now)
+            saved = await conn.execute(
+                select(saves.c.save_name).where(saves.c.filename == filename)
+            )
+            row = saved.first()
+            values = {
+                "session_id": session_id,
+                "slot": slot,
+                "scenario_id": data.get("scenario_id", ""),
+                "scenario_title": data.get("scenario_title", ""),
+                "phase": data.get("phase", ""),
+                # A display name set from the save list outlives autosaves
+                "save_name": header.get("save_name", row.save_name if row else ""),
+                "party": _party(chars),
+                "state": {**header, **state},
+                "modified": now,
+            }
+            await conn.execute(
+                insert(saves)
+                .values(filename=filename, **values)
+                .on_conflict_do_update(index_elements=[saves.c.filename], set_=values)
+            )
+            await conn.execute(delete(characters).where(characters.c.save == filename))
+            await conn.execute(delete(history).where(history.c.save == filename))
+            await self._insert_characters(conn, filename, chars)
+            await self._insert_history(conn, filename, 0, entries)
+
+        await self._submit(filename, True, run)
+        return filename
+
+    async def append(self, session_id: str, slot: str, record: dict, header: dict) -> None:
+        filename = _filename(session_id, slot)
+        record = dict(record)
+        record.pop("turn", None)
+        start = record.pop("history_from", None)
+        entries = record.pop("history", None)
+        chars = record.pop("characters", None)
+        now = time.time()
+
+        async def run(conn: "AsyncConnection") -> None:
+            if entries is not None:
+                await conn.execute(
+                    delete(history).where(history.c.save == filename, history.c.seq >= start)
+                )
+                await self._insert_history(conn, filename, start, entries)
+            if chars is not None:
+                await conn.execute(delete(characters).where(characters.c.save == filename))
+                await self._insert_characters(conn, filename, chars)
+            values = {
+                "phase": header.get("phase", ""),
+                "party": _party(header.get("characters", {})),
+                "modified": now,
+            }
+            if record:
+                current = await conn.scalar(
+                    select(saves.c.state).where(saves.c.filename == filename)
+                )
+                values["state"] = {**(current or {}), **record}
+            await conn.execute(update(saves).where(saves.c.filename == filename).values(**values))
+            await self._upsert_session(conn, session_id, header, now)
+
+        await self._submit(filename, False, run)
+
+    @staticmethod
+    async def _upsert_session(
+        conn: "AsyncConnection", session_id: str, data: dict, now: float
+    ) -> None:
+        values = {
+            "scenario_id": data.get("scenario_id", ""),
+            "scenario_title": data.get("scenario_title", ""),
+            "updated": now,
+        }
+        await conn.execute(
+            insert(sessions)
+            .values(id=session_id, **values)
+            .on_conflict_do_update(index_elements=[sessions.c.id], set_=values)
+        )
+
+    @staticmethod
+    async def _insert_characters(conn: "AsyncConnection", filename: str, chars: dict) -> None:
+        if chars:
+            await conn.execute(insert(characters), [
+                {
+                    "save": filename,
+                    "id": cid,
+                    "name": c.get("name", ""),
+                    "is_npc": c.get("is_npc", False),
+                    "data": c,
+                }
+                for cid, c in chars.items()
+            ])
+
+    @staticmethod
+    async def _insert_history(
+        conn: "AsyncConnection", filename: str, start: int, entries: list
+    ) -> None:
+        if entries:
+            await conn.execute(insert(history), [
+                {"save": filename, "seq": start + i, "role": e.get("role", ""), "entry": e}
+                for i, e in enumerate(entries)
+            ])
+
+    # Reads ------------------------------------------------------------------
+
+    async def _read(self, filename: str) -> Optional[dict]:
+        await self._setup()
+        await self._settle()
+        async with self.engine.connect() as conn:
+            row = (await conn.execute(
+                select(saves).where(saves.c.filename == filename)
+            )).first()
+            if row is None:
+                return None
+            chars = await conn.execute(
+                select(characters.c.id, characters.c.data).where(characters.c.save == filename)
+            )
+            entries = await conn.execute(
+                select(history.c.entry).where(history.c.save == filename).order_by(history.c.seq)
+            )
+            data = dict(row.state)
+            data["save_name"] = row.save_name
+            data["characters"] = {cid: c for cid, c in chars}
+            data["keeper_history"] = [e for (e,) in entries]
+            return data
+
+    async def load(self, session_id: str, slot: str) -> Optional[tuple[dict, int]]:
+        data = await self._read(_filename(session_id, slot))
+        return None if data is None else (data, 0)
+
+    async def read(self, filename: str) -> Optional[dict]:
+        return await self._read(filename)
+
+    async def query(
+        self,
+        scenario_id: str = "",
+        session_id: str = "",
+        slot: str = "",
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ) -> list[dict]:
+        await self._setup()
+        await self._settle()
+        stmt = select(
+            saves.c.filename, saves.c.session_id, saves.c.scenario_id, saves.c.scenario_title,
+            saves.c.save_name, saves.c.phase, saves.c.slot, saves.c.party, saves.c.modified,
+        ).order_by(saves.c.modified.desc()).offset(offset)
+        if scenario_id:
+            stmt = stmt.where(saves.c.scenario_id == scenario_id)
+        if session_id:
+            stmt = stmt.where(saves.c.session_id == session_id)
+        if slot:
+            stmt = stmt.where(saves.c.slot == slot)
+        if limit is not None:
+            stmt = stmt.limit(limit)
+        async with self.engine.connect() as conn:
+            rows = await conn.execute(stmt)
+            return [
+                {
+                    "filename": r.filename,
+                    "session_id": r.session_id,
+                    "scenario_id": r.scenario_id,
+                    "scenario_title": r.scenario_title or r.scenario_id,
+                    "save_name": r.save_name,
+                    "phase": r.phase,
+                    "slot": r.slot,
+                    "characters": r.party,
+                    "modified": r.modified,
+                }
+                for r in rows
+            ]
+
+    async def rename(self, filename: str, save_name: str) -> bool:
+        await self._setup()
+        await self._settle()
+        async with self.engine.begin() as conn:
+            result = await conn.execute(
+                update(saves).where(saves.c.filename == filename).values(save_name=save_name)
+            )
+            return result.rowcount > 0
+
+    async def delete(self, filename: str) -> bool:
+        await self._setup()
+        await self._settle()
+        async with self.engine.begin() as conn:
+            await conn.execute(delete(history).where(history.c.save == filename))
+            await conn.execute(delete(characters).where(characters.c.save == filename))
+            result = await conn.execute(delete(saves).where(saves.c.filename == filename))
+            return result.rowcount > 0
+
+    async def close(self) -> None:
+        await self._settle()
+        await self.engine.dispose()
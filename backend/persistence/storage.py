@@ -0,0 +1,207 @@
+"""Where save slots live: the storage interface and the saves-directory backend.
+
+A save is addressed by (session id, slot) when the game writes it, and by
+its `filename` (the name the save list shows) from the lobby. Every backend
+takes full snapshots, per-turn journal records (see `journal.py`) and
+answers save-list queries from an index rather than by scanning saves.
+"""
+
+import asyncio
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from backend.persistence.journal import journal_path, read_journal, read_save, replay
+from backend.persistence.save_format import SAVE_SUFFIXES, encode, load
+from backend.persistence.save_index import index_for
+from backend.persistence.writer import SaveWriter, atomic_write
+
+# Snapshot file suffix per save format; JSON stays readable either way
+SAVE_FORMATS = {"binary": ".sav", "json": ".json"}
+
+
+class SaveStorage(ABC):
+    # Whether journal records pile up until a snapshot compacts them
+    journal_compaction = True
+
+    @abstractmethod
+    async def save(self, session_id: str, slot: str, data: dict) -> str:
+        """Store a full snapshot; returns the save's filename."""
+
+    @abstractmethod
+    async def append(self, session_id: str, slot: str, record: dict, header: dict) -> None:
+        """Add a journal record to a slot; `header` holds its current list fields."""
+
+    @abstractmethod
+    async def load(self, session_id: str, slot: str) -> Optional[tuple[dict, int]]:
+        """Save data of a slot and how many journal records it replayed."""
+
+    @abstractmethod
+    async def read(self, filename: str) -> Optional[dict]:
+        """Save data by filename (resume, export); None if there is no such save."""
+
+    @abstractmethod
+    async def query(
+        self,
+        scenario_id: str = "",
+        session_id: str = "",
+        slot: str = "",
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ) -> list[dict]:
+        """Save headers matching the filters, newest first."""
+
+    @abstractmethod
+    async def rename(self, filename: str, save_name: str) -> bool:
+        """Set a save's display name; False if there is no such save."""
+
+    @abstractmethod
+    async def delete(self, filename: str) -> bool:
+        """Remove a save; False if there is no such save."""
+
+    async def find_latest(self, scenario_id: str) -> Optional[dict]:
+        """The most recent auto save of a scenario, as {"filename", "data"}."""
+        for entry in await self.query(scenario_id=scenario_id, slot="auto"):
+            try:
+                data = await self.read(entry["filename"])
+            except (ValueError, OSError):
+                continue
+            if data is not None:
+                return {"filename": entry["filename"], "data": data}
+        return None
+
+    async def run(self, fn: Callable[[], Any]) -> Any:
+        """Run blocking save I/O (e.g. paging old history) off the event loop."""
+        return await asyncio.to_thread(fn)
+
+    async def close(self) -> None:
+        """Finish queued writes and release the backend (no-op by default)."""
+        return
+
+
+class FileStorage(SaveStorage):
+    """Snapshot files plus journals in a directory, listed via `SaveIndex`."""
+
+    def __init__(
+        self,
+        directory: Path,
+        writer: Optional[SaveWriter] = None,
+        save_format: str = "binary",
+    ):
+        if save_format not in SAVE_FORMATS:
+            raise ValueError(f"Unknown save format: {save_format}")
+        self.directory = directory
+        self.writer = writer or SaveWriter()
+        self.save_format = save_format
+
+    @property
+    def index(self):
+        return index_for(self.directory)
+
+    def _path(self, session_id: str, slot: str) -> Path:
+        return self.directory / f"{session_id}_{slot}{SAVE_FORMATS[self.save_format]}"
+
+    def _existing(self, session_id: str, slot: str) -> Optional[Path]:
+        """The slot's snapshot on disk, preferring the configured format."""
+        preferred = self._path(session_id, slot)
+        for path in [preferred] + [preferred.with_suffix(s) for s in SAVE_SUFFIXES]:
+            if path.exists():
+                return path
+        return None
+
+    def _file(self, filename: str) -> Optional[Path]:
+        path = self.directory / filename
+        if path.parent != self.directory or path.suffix not in SAVE_SUFFIXES:
+            return None
+        return path if path.exists() else None
+
+    async def _index(self, path: Path, data: dict) -> None:
+        await self.index.load(self.writer)
+        if self.index.update(path, data):
+            await self.index.flush(self.writer)
+
+    async def save(self, session_id: str, slot: str, data: dict) -> str:
+        path = self._path(session_id, slot)
+        await self.writer.write(path, data, indent=2)
+        await self._index(path, data)
+        # The slot's snapshot in another format was replaced
+        others = [path.with_suffix(s).name for s in SAVE_SUFFIXES if s != path.suffix]
+        if any(self.index.remove(name) for name in others):
+            await self.index.flush(self.writer)
+        return path.name
+
+    async def append(self, session_id: str, slot: str, record: dict, header: dict) -> None:
+        path = self._path(session_id, slot)
+        await self.writer.append(path, record)
+        await self._index(path, header)
+
+    async def load(self, session_id: str, slot: str) -> Optional[tuple[dict, int]]:
+        def read() -> Optional[tuple[dict, int]]:
+            existing = self._existing(session_id, slot)
+            if existing is None:
+                return None
+            records = read_journal(journal_path(existing))
+            return replay(load(existing), records), len(records)
+
+        return await self.writer.run(self._path(session_id, slot), read)
+
+    async def read(self, filename: str) -> Optional[dict]:
+        path = self._file(filename)
+        if path is None:
+            return None
+        return await self.writer.run(path, lambda: read_save(path))
+
+    async def query(
+        self,
+        scenario_id: str = "",
+        session_id: str = "",
+        slot: str = "",
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ) -> list[dict]:
+        await self.index.load(self.writer)
+        # A slot can briefly have snapshots in both formats; list the newest
+        by_key: dict[tuple[str, str], dict] = {}
+        for entry in self.index.query(scenario_id, session_id, slot):
+            by_key.setdefault((entry["session_id"], entry["slot"]), entry)
+        saves = list(by_key.values())
+        end = None if limit is None else offset + limit
+        return saves[offset:end]
+
+    async def rename(self, filename: str, save_name: str) -> bool:
+        path = self._file(filename)
+        if path is None:
+            return False
+
+        def rename():
+            data = load(path)
+            data["save_name"] = save_name
+            # Rewrites the snapshot only; the slot's journal stays valid
+            atomic_write(path, encode(data, path.suffix == ".sav", indent=2), self.writer.fsync)
+            return read_save(path)
+
+        await self._index(path, await self.writer.run(path, rename))
+        return True
+
+    async def delete(self, filename: str) -> bool:
+        path = self._file(filename)
+        if path is None:
+            return False
+
+        def delete():
+            path.unlink(missing_ok=True)
+            journal_path(path).unlink(missing_ok=True)
+
+        await self.writer.run(path, delete)
+        await self.index.load(self.writer)
+        if self.index.remove(filename):
+            await self.index.flush(self.writer)
+        return True
+
+    async def run(self, fn: Callable[[], Any]) -> Any:
+        return await self.writer.call(fn)
+
+    async def close(self) -> None:
+        # Coalesced writes still waiting for their slot would die with the pool
+        await self.writer.drain()
+        self.writer.close()
@@ -0,0 +1,155 @@
+"""Save I/O on a bounded thread pool, off the event loop.
+
+Writes are keyed by the snapshot path of a save slot and run one at a time
+per key. While a write for a slot is in flight, later requests for that
+slot are merged into one pending job: a new snapshot replaces the pending
+snapshot and any journal records queued before it (the snapshot already
+contains them), records queued after it are appended in one go. Every
+caller's awaitable resolves when the write carrying its state is on disk.
+
+Files are replaced atomically (temp file + `os.replace`). `fsync` is one of
+  none  leave flushing to the OS
+  file  fsync file contents before the rename / after an append (default)
+  full  also fsync the directory so the rename itself is durable
+"""
+
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from backend.persistence.journal import journal_path
+from backend.persistence.save_format import SAVE_SUFFIXES, encode
+
+FSYNC_POLICIES = ("none", "file", "full")
+DEFAULT_SAVE_WORKERS = 2
+
+
+def _fsync_dir(directory: Path) -> None:
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path: Path, content: str | bytes, fsync: str = "file") -> None:
+    """Replace `path` with `content` so readers see the old or new file, never half."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    with tmp.open("wb") as f:
+        f.write(content)
+        if fsync != "none":
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp, path)
+    if fsync == "full":
+        _fsync_dir(path.parent)
+
+
+def append_lines(path: Path, lines: list[str], fsync: str = "file") -> None:
+    with path.open("a", encoding="utf-8") as f:
+        f.write("".join(lines))
+        if fsync != "none":
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class _Job:
+    def __init__(self, future: asyncio.Future):
+        self.future = future
+        self.data: Optional[Any] = None
+        self.indent: Optional[int] = None
+        self.records: list[dict] = []
+
+    def run(self, path: Path, fsync: str) -> None:
+        if self.data is not None:
+            binary = path.suffix == ".sav"
+            atomic_write(path, encode(self.data, binary, self.indent), fsync)
+            # A fresh snapshot compacts the slot's journal
+            journal_path(path).unlink(missing_ok=True)
+            if path.suffix in SAVE_SUFFIXES:
+                # ...and supersedes the slot's snapshot in the other format
+                for suffix in SAVE_SUFFIXES:
+                    if suffix != path.suffix:
+                        path.with_suffix(suffix).unlink(missing_ok=True)
+        if self.records:
+            lines = [json.dumps(r, ensure_ascii=False) + "\n" for r in self.records]
+            append_lines(journal_path(path), lines, fsync)
+
+
+class SaveWriter:
+    def __init__(self, max_workers: int = DEFAULT_SAVE_WORKERS, fsync: str = "file"):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+        self.fsync = fsync
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="save")
+        self._pending: dict[Path, _Job] = {}
+        self._drivers: dict[Path, asyncio.Task] = {}
+
+    async def write(self, path: Path, data: Any, indent: Optional[int] = None) -> None:
+        """Atomically replace `path` with `data`, truncating its journal.
+
+        `.sav` paths get the binary save format, anything else JSON.
+        """
+        job = self._job(path)
+        job.data, job.indent = data, indent
+        job.records = []
+        await self._submit(path, job)
+
+    async def append(self, path: Path, record: dict) -> None:
+        """Append a record to the journal of the snapshot at `path`."""
+        job = self._job(path)
+        job.records.append(record)
+        await self._submit(path, job)
+
+    async def run(self, path: Path, fn: Callable[[], Any]) -> Any:
+        """Run other I/O on `path` (reads, renames) after its pending writes."""
+        await self.settle(path)
+        return await self.call(fn)
+
+    async def call(self, fn: Callable[[], Any]) -> Any:
+        """Run blocking save I/O on the pool without waiting for any writes."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn)
+
+    async def settle(self, path: Path) -> None:
+        """Wait until nothing is queued or in flight for `path`."""
+        while path in self._drivers:
+            await asyncio.shield(self._drivers[path])
+
+    async def drain(self) -> None:
+        """Wait until no slot has writes queued or in flight (before `close()`)."""
+        while self._drivers:
+            await asyncio.wait(list(self._drivers.values()))
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    def _job(self, path: Path) -> _Job:
+        job = self._pending.get(path)
+        if job is None:
+            job = self._pending[path] = _Job(asyncio.get_running_loop().create_future())
+        return job
+
+    async def _submit(self, path: Path, job: _Job) -> None:
+        if path not in self._drivers:
+            self._drivers[path] = asyncio.create_task(self._drive(path))
+        await asyncio.shield(job.future)
+
+    async def _drive(self, path: Path) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            while path in self._pending:
+                job = self._pending.pop(path)
+                try:
+                    await loop.run_in_executor(self._executor, job.run, path, self.fsync)
+                except Exception as e:
+                    job.future.set_exception(e)
+                else:
+                    job.future.set_result(None)
+        finally:
+            del self._drivers[path]
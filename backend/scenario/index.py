@@ -0,0 +1,198 @@
+"""Keyword index over a scenario's NPCs, locations, areas and clues.
+
+Built once per loaded scenario. At prompt time it picks the entries that
+matter for the current plot point, the recent conversation and the player's
+input, so the scenario layer grows with what is in play rather than with the
+size of the module.
+"""
+
+import math
+import re
+from typing import Optional
+
+from backend.ai.context_window import estimate_tokens
+from backend.scenario.models import PlotPoint, Scenario
+
+# CJK text has no word boundaries: index overlapping character bigrams instead
+_CJK_RUN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+")
+_WORD = re.compile(r"[a-z0-9]{2,}")
+
+DEFAULT_CONTEXT_BUDGET = 1200
+
+# Query weights per source: what the table is doing now outranks older talk
+PLOT_POINT_WEIGHT = 2.0
+PLAYER_INPUT_WEIGHT = 2.0
+HISTORY_WEIGHT = 1.0
+
+_SECTIONS = (
+    ("npc", "[相关 NPC]"),
+    ("location", "[相关地点]"),
+    ("clue", "[相关线索 - 使用这些 clue_id]"),
+)
+
+
+def tokenize(text: str) -> list[str]:
+    """Lower-cased ASCII words plus CJK bigrams (single characters stay unigrams)."""
+    text = text.lower()
+    terms = _WORD.findall(text)
+    for run in _CJK_RUN.findall(text):
+        if len(run) == 1:
+            terms.append(run)
+        else:
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return terms
+
+
+class IndexEntry:
+    """One retrievable scenario element and its rendered prompt lines."""
+
+    def __init__(self, kind: str, key: str, text: str, lines: str, parent: str = ""):
+        self.kind = kind  # "npc" | "location" | "area" | "clue"
+        self.key = key
+        self.parent = parent  # owning location id, for areas
+        self.lines = lines
+        self.terms = set(tokenize(f"{key} {text}"))
+        self.tokens = estimate_tokens(lines) + 1
+
+
+class ScenarioIndex:
+    def __init__(self, scenario: Scenario):
+        self.scenario = scenario
+        self.entries: list[IndexEntry] = []
+        self._location_pos: dict[str, int] = {}
+
+        for npc_id, npc in scenario.npcs.items():
+            traits = " ".join(t for t in (npc.personality, npc.description) if t)
+            line = f"- {npc.name}({npc_id}): {traits}"
+            if npc.knows:
+                line += f"。知道: {'; '.join(npc.knows)}"
+            text = " ".join([npc.name, npc.role, npc.description, npc.personality,
+                             npc.dialogue_style, *npc.knows])
+            self.entries.append(IndexEntry("npc", npc_id, text, line))
+
+        for loc_id, loc in scenario.locations.items():
+            self._location_pos[loc_id] = len(self.entries)
+            self.entries.append(IndexEntry(
+                "location", loc_id, f"{loc.name} {loc.atmosphere}",
+                f"- {loc.name}({loc_id}): {loc.atmosphere}",
+            ))
+            for area in loc.areas:
+                details = []
+                if area.possible_finds:
+                    details.append(f"可能发现: {', '.join(area.possible_finds)}")
+                if area.hazards:
+                    details.append(f"危险: {', '.join(area.hazards)}")
+                if area.requires_discovery:
+                    details.append("需先发现入口")
+                line = f"  · {area.id}: {area.description}"
+                if details:
+                    line += f" ({'; '.join(details)})"
+                text = " ".join([loc.name, area.description, *area.possible_finds,
+                                 *area.hazards, *area.contains])
+                self.entries.append(IndexEntry("area", area.id, text, line, parent=loc_id))
+
+        for clue_id, clue in scenario.clues.items():
+            self.entries.append(IndexEntry(
+                "clue", clue_id, f"{clue.description} {clue.discovery}",
+                f"- {clue_id}: {clue.description} "
+                f"(重要性: {clue.importance}, 发现方式: {clue.discovery})",
+            ))
+
+        # Inverse document frequency: terms shared by every entry carry no signal
+        df: dict[str, int] = {}
+        for entry in self.entries:
+            for term in entry.terms:
+                df[term] = df.get(term, 0) + 1
+        n = len(self.entries)
+        self.idf = {term: math.log(1 + n / count) for term, count in df.items()}
+
+    def query_terms(
+        self,
+        plot_point: Optional[PlotPoint] = None,
+        recent: list[str] | None = None,
+        player_input: str = "",
+    ) -> dict[str, float]:
+        """Weighted query terms for the current situation."""
+        weights: dict[str, float] = {}
+
+        def add(text: str, weight: float) -> None:
+            for term in tokenize(text):
+                if term in self.idf:
+                    weights[term] = max(weights.get(term, 0.0), weight)
+
+        for text in recent or []:
+            add(text, HISTORY_WEIGHT)
+        if plot_point:
+            add(" ".join([plot_point.description, *plot_point.key_discoveries,
+                          *plot_point.available_sources, *plot_point.hazards]),
+                PLOT_POINT_WEIGHT)
+        add(player_input, PLAYER_INPUT_WEIGHT)
+        return weights
+
+    def pinned(self, plot_point: Optional[PlotPoint]) -> set[int]:
+        """Entries the current plot point names by id; always selected first."""
+        if plot_point is None:
+            return set()
+        ids = {*plot_point.required_clues, *plot_point.key_discoveries,
+               *plot_point.available_sources}
+        return {i for i, e in enumerate(self.entries) if e.key in ids}
+
+    def score(self, entry: IndexEntry, weights: dict[str, float]) -> float:
+        total = sum(weights[t] * self.idf[t] for t in entry.terms if t in weights)
+        # Long entries match more terms by chance; damp by their size
+        return total / math.sqrt(len(entry.terms) or 1)
+
+    def select(
+        self,
+        plot_point: Optional[PlotPoint] = None,
+        recent: list[str] | None = None,
+        player_input: str = "",
+        budget: int = DEFAULT_CONTEXT_BUDGET,
+    ) -> list[IndexEntry]:
+        """Most relevant entries that fit in `budget` tokens, in scenario order."""
+        weights = self.query_terms(plot_point, recent, player_input)
+        pinned = self.pinned(plot_point)
+        ranked = []
+        for i, entry in enumerate(self.entries):
+            s = self.score(entry, weights)
+            if s > 0 or i in pinned:
+                ranked.append((i not in pinned, -s, i))
+        ranked.sort()
+
+        chosen: set[int] = set()
+        used = 0
+        for _, _, i in ranked:
+            entry = self.entries[i]
+            needed = [i]
+            if entry.kind == "area":
+                # An area is rendered under its location's header line
+                parent = self._location_pos[entry.parent]
+                if parent not in chosen:
+                    needed.insert(0, parent)
+            cost = sum(self.entries[j].tokens for j in needed)
+            if used + cost > budget:
+                continue
+            chosen.update(needed)
+            used += cost
+        return [self.entries[i] for i in sorted(chosen)]
+
+    def render(self, entries: list[IndexEntry]) -> str:
+        """Prompt text for selected entries, grouped by NPC / location / clue."""
+        parts = []
+        for kind, title in _SECTIONS:
+            lines = [
+                e.lines for e in entries
+                if e.kind == kind or (kind == "location" and e.kind == "area")
+            ]
+            if lines:
+                parts.append(title + "\n" + "\n".join(lines))
+        return "\n\n".join(parts)
+
+    def context(
+        self,
+        plot_point: Optional[PlotPoint] = None,
+        recent: list[str] | None = None,
+        player_input: str = "",
+        budget: int = DEFAULT_CONTEXT_BUDGET,
+    ) -> str:
+        return self.render(self.select(plot_point, recent, player_input, budget))
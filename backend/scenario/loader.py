@@ -4,12 +4,21 @@ from pathlib import Path
 
 import yaml
 
+from backend.scenario.index import ScenarioIndex
 from backend.scenario.models import Scenario
 
 
 class ScenarioLoader:
+    """Loads scenarios from YAML, once per file version.
+
+    Sessions only read their scenario, so every session of a scenario shares
+    the same `Scenario` object and its retrieval index.
+    """
+
     def __init__(self, scenarios_dir: str = "scenarios"):
         self.base_dir = Path(scenarios_dir)
+        self._scenarios: dict[str, tuple[float, Scenario]] = {}
+        self._indexes: dict[str, ScenarioIndex] = {}
 
     def load(self, scenario_id: str) -> Scenario:
         scenario_dir = self.base_dir / scenario_id
@@ -17,10 +26,25 @@ class ScenarioLoader:
         if not yaml_path.exists():
             raise FileNotFoundError(f"Scenario not found: {yaml_path}")
 
+        # An edited file is loaded again
+        mtime = yaml_path.stat().st_mtime
+        cached = self._scenarios.get(scenario_id)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
         with open(yaml_path, "r", encoding="utf-8") as f:
             data = yaml.safe_load(f)
 
-        return Scenario(**data)
+        scenario = Scenario(**data)
+        self._scenarios[scenario_id] = (mtime, scenario)
+        return scenario
+
+    def index(self, scenario: Scenario) -> ScenarioIndex:
+        """The retrieval index of a loaded scenario, built once per Scenario."""
+        index = self._indexes.get(scenario.meta.id)
+        if index is None or index.scenario is not scenario:
+            index = self._indexes[scenario.meta.id] = ScenarioIndex(scenario)
+        return index
 
     def list_scenarios(self) -> list[dict]:
         results = []
@@ -1,8 +1,11 @@
 """Plot guardian - tracks scenario progress and generates AI prompts."""
 
+import itertools
 from typing import Optional
 
-from backend.scenario.models import Scenario, Ending
+from backend.scenario.models import Ending, PlotPoint, Scenario
+
+_versions = itertools.count(1)
 
 
 class PlotGuardian:
@@ -10,20 +13,43 @@ class PlotGuardian:
         self.scenario = scenario
         self.discovered_clues: set[str] = set()
         self.completed_points: set[str] = set()
+        self.version = next(_versions)
+        self._prompt_cache: tuple[int, str] | None = None
+
+    def touch(self) -> None:
+        """Mark progress as changed (call after assigning the sets directly)."""
+        self.version = next(_versions)
 
     def update_clue_status(self, clue_id: str, discovered: bool = True):
         if discovered:
             self.discovered_clues.add(clue_id)
         else:
             self.discovered_clues.discard(clue_id)
+        self.touch()
 
     def update_plot_point(self, point_id: str, completed: bool = True):
         if completed:
             self.completed_points.add(point_id)
         else:
             self.completed_points.discard(point_id)
+        self.touch()
+
+    def current_plot_point(self) -> Optional[PlotPoint]:
+        """First uncompleted plot point whose dependencies are all completed."""
+        for pp in self.scenario.key_plot_points:
+            if pp.id in self.completed_points:
+                continue
+            if all(d in self.completed_points for d in pp.depends_on):
+                return pp
+        return None
 
     def generate_progress_prompt(self) -> str:
+        """Plot progress layer, re-rendered only when the version changes."""
+        if self._prompt_cache is None or self._prompt_cache[0] != self.version:
+            self._prompt_cache = (self.version, self._render_progress_prompt())
+        return self._prompt_cache[1]
+
+    def _render_progress_prompt(self) -> str:
         all_clues = set(self.scenario.clues.keys())
         critical = {
             cid for cid, c in self.scenario.clues.items()
@@ -39,15 +65,7 @@ class PlotGuardian:
             for c in missing_critical if c in self.scenario.clues
         ]
 
-        # Current plot point (first uncompleted with satisfied dependencies)
-        current_point = None
-        for pp in self.scenario.key_plot_points:
-            if pp.id in self.completed_points:
-                continue
-            deps_met = all(d in self.completed_points for d in pp.depends_on)
-            if deps_met:
-                current_point = pp
-                break
+        current_point = self.current_plot_point()
 
         lines = ["[剧情进度]"]
         if discovered_names:
@@ -4,6 +4,7 @@ export function useGameSocket(sessionId: string) {
   const config = useRuntimeConfig();
   const store = useGameStore();
   let ws: WebSocket | null = null;
+  let closedByUser = false;
 
   function handleBeforeUnload() {
     if (ws && ws.readyState === WebSocket.OPEN) {
@@ -11,9 +12,27 @@ export function useGameSocket(sessionId: string) {
     }
   }
 
+  // Binary frames are deflated JSON; decode them in arrival order
+  const canInflate = typeof DecompressionStream !== "undefined";
+  let inbox: Promise<void> = Promise.resolve();
+
+  async function decode(data: string | ArrayBuffer): Promise<any> {
+    if (typeof data === "string") return JSON.parse(data);
+    const stream = new Blob([data]).stream().pipeThrough(new DecompressionStream("deflate"));
+    return JSON.parse(await new Response(stream).text());
+  }
+
   function connect() {
-    const url = `${config.public.wsBase}/api/game/${sessionId}/ws`;
-    ws = new WebSocket(url);
+    closedByUser = false;
+    const params = new URLSearchParams({ batch: "1" });
+    if (canInflate) params.set("encoding", "deflate");
+    if (store.eventLogId && store.lastSeq >= 0) {
+      // Ask only for the events missed while disconnected
+      params.set("log_id", store.eventLogId);
+      params.set("last_seq", String(store.lastSeq));
+    }
+    ws = new WebSocket(`${config.public.wsBase}/api/game/${sessionId}/ws?${params}`);
+    ws.binaryType = "arraybuffer";
 
     ws.onopen = () => {
       store.setConnected(true);
@@ -21,21 +40,53 @@ export function useGameSocket(sessionId: string) {
 
     ws.onclose = () => {
       store.setConnected(false);
+      if (!closedByUser) setTimeout(connect, 1000);
     };
 
     ws.onmessage = (event) => {
-      const data = JSON.parse(event.data);
-      handleMessage(data);
+      inbox = inbox
+        .then(async () => handleMessage(await decode(event.data)))
+        .catch((err) => console.error("Bad game frame", err));
     };
 
     window.addEventListener("beforeunload", handleBeforeUnload);
   }
 
   function handleMessage(data: any) {
+    if (typeof data.seq === "number") store.setEventPosition(data.log_id || "", data.seq);
     switch (data.type) {
       case "narrative":
         store.addNarrative("narrative", data.content);
         break;
+      case "snapshot":
+        store.clearNarratives();
+        for (const entry of data.entries || []) handleMessage(entry);
+        for (const clue of data.clues || []) store.addClue(clue.description || clue.clue_id);
+        if (data.phase) store.updatePhase(data.phase);
+        if (data.turn_state) store.updateTurnState(data.turn_state);
+        store.historyFrom = data.history_from || 0;
+        break;
+      case "history_page":
+        // Older conversation requested with loadEarlier()
+        store.prependNarratives(
+          (data.entries || []).map((entry: any) => entry.content),
+          data.history_from || 0
+        );
+        break;
+      case "turn_result":
+        // A whole turn in one frame: apply every update together
+        for (const entry of data.events || []) handleMessage(entry);
+        break;
+      case "history":
+        // Reconnect replay: a batch of frames in one message
+        for (const entry of data.entries || []) handleMessage(entry);
+        break;
+      case "narrative_delta":
+        store.appendNarrativeDelta(data.segment || "narrative", data.content);
+        break;
+      case "narrative_done":
+        store.finishNarrative(data.segment || "narrative", data.content);
+        break;
       case "dice_result":
         store.addNarrative(
           "dice_result",
@@ -56,6 +107,9 @@ export function useGameSocket(sessionId: string) {
       case "turn_update":
         if (data.turn_state) store.updateTurnState(data.turn_state);
         break;
+      case "action_queued":
+        if (data.position > 0) store.addNarrative("system", `行动已排队（第 ${data.position} 位）`);
+        break;
       case "system":
         store.addNarrative("system", data.content);
         break;
@@ -72,20 +126,29 @@ export function useGameSocket(sessionId: string) {
         type: "player_action",
         character_id: store.activeCharacter?.id || "",
         content,
+        stream: true,
       })
     );
   }
 
+  function loadEarlier() {
+    if (!ws || ws.readyState !== WebSocket.OPEN) return;
+    if (store.historyFrom <= 0 || store.loadingHistory) return;
+    store.loadingHistory = true;
+    ws.send(JSON.stringify({ type: "load_history", before: store.historyFrom }));
+  }
+
   function saveGame(slot: string = "manual") {
     if (!ws || ws.readyState !== WebSocket.OPEN) return;
     ws.send(JSON.stringify({ type: "save_game", slot }));
   }
 
   function disconnect() {
+    closedByUser = true;
     window.removeEventListener("beforeunload", handleBeforeUnload);
     ws?.close();
     ws = null;
   }
 
-  return { connect, sendAction, saveGame, disconnect };
+  return { connect, sendAction, saveGame, loadEarlier, disconnect };
 }
@@ -52,6 +52,14 @@ interface GameState {
   clues: string[];
   atmosphere: string;
   connected: boolean;
+  // Index in narrativeLog of the entry receiving streamed deltas, per segment
+  streamingEntries: Record<string, number>;
+  // Server event log position, sent back on reconnect for delta resync
+  eventLogId: string;
+  lastSeq: number;
+  // Server history index of the oldest entry shown; older ones load on request
+  historyFrom: number;
+  loadingHistory: boolean;
 }
 
 export const useGameStore = defineStore("game", {
@@ -73,6 +81,11 @@ export const useGameStore = defineStore("game", {
     clues: [],
     atmosphere: "calm",
     connected: false,
+    streamingEntries: {},
+    eventLogId: "",
+    lastSeq: -1,
+    historyFrom: 0,
+    loadingHistory: false,
   }),
   getters: {
     activeCharacter(state): Character | null {
@@ -115,9 +128,44 @@ export const useGameStore = defineStore("game", {
     addNarrative(type: NarrativeEntry["type"], content: string) {
       this.narrativeLog.push({ type, content, timestamp: Date.now() });
     },
+    appendNarrativeDelta(segment: string, delta: string) {
+      const idx = this.streamingEntries[segment];
+      if (idx === undefined) {
+        this.addNarrative("narrative", delta);
+        this.streamingEntries[segment] = this.narrativeLog.length - 1;
+      } else {
+        this.narrativeLog[idx].content += delta;
+      }
+    },
+    finishNarrative(segment: string, content: string) {
+      const idx = this.streamingEntries[segment];
+      if (idx === undefined) {
+        if (content) this.addNarrative("narrative", content);
+      } else {
+        this.narrativeLog[idx].content = content;
+      }
+      delete this.streamingEntries[segment];
+    },
+    prependNarratives(contents: string[], historyFrom: number) {
+      const now = Date.now();
+      const older = contents.map((content) => ({ type: "narrative" as const, content, timestamp: now }));
+      this.narrativeLog.unshift(...older);
+      for (const segment of Object.keys(this.streamingEntries)) {
+        this.streamingEntries[segment] += older.length;
+      }
+      this.historyFrom = historyFrom;
+      this.loadingHistory = false;
+    },
     clearNarratives() {
       this.narrativeLog = [];
       this.clues = [];
+      this.streamingEntries = {};
+      this.historyFrom = 0;
+      this.loadingHistory = false;
+    },
+    setEventPosition(logId: string, seq: number) {
+      if (logId) this.eventLogId = logId;
+      this.lastSeq = seq;
     },
     addClue(clue: string) {
       if (!this.clues.includes(clue)) this.clues.push(clue);
@@ -0,0 +1,211 @@
+"""Tests for the per-session action queue and turn coalescing."""
+
+import asyncio
+import json
+
+import pytest
+
+from backend.ai.response_parser import GameDirective
+from backend.api.hub import SessionHub, get_hub, release_hub
+from backend.core.action_queue import ActionQueue, ActionQueueFull, PendingAction
+from backend.core.game_engine import GameEngine
+from backend.core.turn_manager import TurnMode
+from backend.scenario.models import Scenario
+
+from tests.test_game_engine import QueueProvider
+from tests.test_hub import _client, _drain
+from tests.test_scenario import SAMPLE_SCENARIO
+
+
+class TestActionQueue:
+    def test_bounded(self):
+        queue = ActionQueue(max_pending=2)
+        assert queue.submit(PendingAction("a", "1")) == 1
+        assert queue.submit(PendingAction("b", "2")) == 2
+        with pytest.raises(ActionQueueFull):
+            queue.submit(PendingAction("c", "3"))
+
+    def test_coalesces_distinct_investigators(self):
+        queue = ActionQueue()
+        for cid, text in [("a", "1"), ("b", "2"), ("a", "3"), ("c", "4")]:
+            queue.submit(PendingAction(cid, text))
+        batch = queue.take(coalesce=True)
+        assert [a.content for a in batch] == ["1", "2", "4"]
+        assert [a.content for a in queue.waiting] == ["3"]
+
+    def test_no_coalescing_in_combat(self):
+        queue = ActionQueue()
+        queue.submit(PendingAction("a", "1"))
+        queue.submit(PendingAction("b", "2"))
+        assert [a.content for a in queue.take(coalesce=False)] == ["1"]
+        assert len(queue.waiting) == 1
+
+
+class GatedProvider(QueueProvider):
+    """Blocks every call until `gate` is set; records the player input of each."""
+
+    def __init__(self, *responses):
+        super().__init__(*responses)
+        self.gate = asyncio.Event()
+        self.inputs: list[str] = []
+
+    async def generate(self, messages, temperature=0.7, max_tokens=2048):
+        self.inputs.append(messages[-1].content)
+        await self.gate.wait()
+        return await super().generate(messages, temperature, max_tokens)
+
+
+def _frames(ws) -> list[dict]:
+    return [json.loads(data) for data in ws.sent]
+
+
+class TestHubActionQueue:
+    async def test_one_turn_in_flight_and_coalescing(self):
+        provider = GatedProvider({"narrative": "第一回合"}, {"narrative": "第二回合"})
+        engine = GameEngine(provider, Scenario(**SAMPLE_SCENARIO))
+        alice = engine.characters.create_pc(name="Alice", player_name="P1")
+        bob = engine.characters.create_pc(name="Bob", player_name="P2")
+        hub = SessionHub("s1", engine)
+        (ws1, c1), (ws2, c2) = _client(), _client()
+        hub.join(c1)
+        hub.join(c2)
+
+        hub.submit_action(c1, alice.id, "我搜索书桌")
+        await _drain()
+        hub.submit_action(c2, bob.id, "我检查窗户")
+        hub.submit_action(c1, alice.id, "我翻开日记")
+        await _drain()
+        assert len(provider.inputs) == 1  # Second turn waits for the first
+        queued = [f for f in _frames(ws2) if f["type"] == "action_queued"]
+        assert queued == [{"type": "action_queued", "position": 1}]
+
+        provider.gate.set()
+        await hub._action_worker
+        await _drain()
+
+        # Bob's and Alice's waiting actions were answered by one combined call
+        assert len(provider.inputs) == 2
+        assert provider.inputs[1].startswith("[同时行动]")
+        assert "Bob" in provider.inputs[1] and "我翻开日记" in provider.inputs[1]
+        for ws in (ws1, ws2):
+            narratives = [f["content"] for f in _frames(ws) if f["type"] == "narrative"]
+            assert narratives == ["第一回合", "第二回合"]
+        hub.leave(c1)
+        hub.leave(c2)
+
+    async def test_combined_check_without_target_rolls_for_first_actor(self):
+        check = {
+            "narrative": "你们一起搜查。",
+            "game_directives": [{"type": "skill_check", "skill": "侦查"}],
+        }
+        provider = GatedProvider(
+            {"narrative": "第一回合"}, check, {"narrative": "找到了。"}
+        )
+        engine = GameEngine(provider, Scenario(**SAMPLE_SCENARIO))
+        alice = engine.characters.create_pc(name="Alice", player_name="P1")
+        bob = engine.characters.create_pc(name="Bob", player_name="P2")
+        hub = SessionHub("s1", engine)
+        ws, client = _client()
+        hub.join(client)
+        hub.submit_action(client, alice.id, "我搜索书桌")
+        await _drain()
+        hub.submit_action(client, bob.id, "我检查窗户")
+        hub.submit_action(client, alice.id, "我翻开日记")
+        provider.gate.set()
+        await hub._action_worker
+        await _drain()
+
+        [dice] = [f for f in _frames(ws) if f["type"] == "dice_result"]
+        assert dice["description"].startswith("Bob")
+        hub.leave(client)
+
+    async def test_combat_actions_are_not_combined(self):
+        provider = GatedProvider({"narrative": "1"}, {"narrative": "2"}, {"narrative": "3"})
+        engine = GameEngine(provider, Scenario(**SAMPLE_SCENARIO))
+        alice = engine.characters.create_pc(name="Alice", player_name="P1")
+        bob = engine.characters.create_pc(name="Bob", player_name="P2")
+        engine.turn_manager.init_combat(engine.characters.list_party())
+        assert engine.turn_manager.mode == TurnMode.COMBAT
+        turns = []
+        original = engine.process_player_input
+
+        async def process(player_input, character_id=""):
+            turns.append(character_id)
+            return await original(player_input=player_input, character_id=character_id)
+
+        engine.process_player_input = process
+        hub = SessionHub("s1", engine)
+        (_, c1), (_, c2) = _client(), _client()
+        hub.join(c1)
+        hub.join(c2)
+        hub.submit_action(c1, alice.id, "攻击")
+        await _drain()
+        # Waiting actions of different investigators would merge outside combat
+        hub.submit_action(c2, bob.id, "闪避")
+        hub.submit_action(c1, alice.id, "逃跑")
+        provider.gate.set()
+        await hub._action_worker
+        assert turns == [alice.id, bob.id, alice.id]
+        assert not any(i.startswith("[同时行动]") for i in provider.inputs)
+        hub.leave(c1)
+        hub.leave(c2)
+
+    async def test_reconnect_during_turn_joins_same_queue(self):
+        provider = GatedProvider({"narrative": "第一回合"}, {"narrative": "第二回合"})
+        engine = GameEngine(provider, Scenario(**SAMPLE_SCENARIO))
+        alice = engine.characters.create_pc(name="Alice", player_name="P1")
+        hub = get_hub("s-reconnect", engine)
+        _, c1 = _client()
+        hub.join(c1)
+        hub.submit_action(c1, alice.id, "我搜索书桌")
+        await _drain()
+
+        # The only player drops mid-turn and comes back
+        hub.leave(c1)
+        release_hub(hub)
+        assert get_hub("s-reconnect", engine) is hub
+        ws2, c2 = _client()
+        hub.join(c2)
+        hub.submit_action(c2, alice.id, "我翻开日记")
+        await _drain()
+        assert len(provider.inputs) == 1  # Still one turn in flight
+
+        provider.gate.set()
+        await hub._action_worker
+        await _drain()
+        narratives = [f["content"] for f in _frames(ws2) if f["type"] == "narrative"]
+        assert narratives == ["第一回合", "第二回合"]
+
+        hub.leave(c2)
+        release_hub(hub)
+        assert get_hub("s-reconnect", engine) is not hub
+        release_hub(get_hub("s-reconnect", engine))
+
+    async def test_idle_hub_is_released_when_last_turn_ends(self):
+        provider = GatedProvider({"narrative": "第一回合"})
+        engine = GameEngine(provider, Scenario(**SAMPLE_SCENARIO))
+        alice = engine.characters.create_pc(name="Alice", player_name="P1")
+        hub = get_hub("s-idle", engine)
+        _, c1 = _client()
+        hub.join(c1)
+        hub.submit_action(c1, alice.id, "我搜索书桌")
+        await _drain()
+        hub.leave(c1)
+        release_hub(hub)
+        provider.gate.set()
+        await hub._action_worker
+        assert get_hub("s-idle", engine) is not hub
+        release_hub(get_hub("s-idle", engine))
+
+
+class TestCombinedChecks:
+    def test_target_character_picks_the_roller(self):
+        engine = GameEngine(QueueProvider(), Scenario(**SAMPLE_SCENARIO))
+        alice = engine.characters.create_pc(name="Alice", player_name="P1")
+        bob = engine.characters.create_pc(name="Bob", player_name="P2")
+        result = engine._execute_directive(
+            GameDirective(type="skill_check", skill="侦查", target_character=bob.id), ""
+        )
+        assert result.description.startswith("Bob")
+        prompt = engine.coalesce_actions([(alice.id, "搜索"), (bob.id, "聆听")])
+        assert f"Alice({alice.id}): 搜索" in prompt
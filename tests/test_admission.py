@@ -0,0 +1,112 @@
+"""Tests for server-wide AI admission control."""
+
+import asyncio
+
+from backend.ai.providers.admission import (
+    AdmissionController,
+    AdmissionProvider,
+    TokenBucket,
+    set_session_key,
+)
+from backend.ai.providers.base import AIMessage, AIProviderBase, AIResponse
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestTokenBucket:
+    def test_refill(self):
+        clock = FakeClock()
+        bucket = TokenBucket(60, clock)
+        bucket.take(60)
+        assert bucket.wait_time(1) == 1.0
+        clock.now = 1.0
+        assert bucket.wait_time(1) == 0.0
+
+    def test_oversized_request_waits_for_full_bucket(self):
+        bucket = TokenBucket(60, FakeClock())
+        assert bucket.wait_time(500) == 0.0
+
+
+class TestAdmissionController:
+    async def test_limits_in_flight(self):
+        controller = AdmissionController(max_in_flight=1)
+        await controller.acquire("a")
+        waiter = asyncio.create_task(controller.acquire("b"))
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        assert controller.stats()["queue_depth"] == 1
+        controller.release()
+        await waiter
+        assert controller.stats()["in_flight"] == 1
+
+    async def test_fair_round_robin_across_sessions(self):
+        controller = AdmissionController(max_in_flight=1)
+        await controller.acquire("busy")
+        order = []
+
+        async def call(key, tag):
+            await controller.acquire(key)
+            order.append(tag)
+
+        tasks = [
+            asyncio.create_task(call("busy", "busy-1")),
+            asyncio.create_task(call("busy", "busy-2")),
+            asyncio.create_task(call("quiet", "quiet-1")),
+        ]
+        await asyncio.sleep(0)
+        for _ in range(3):
+            controller.release()
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        assert order == ["busy-1", "quiet-1", "busy-2"]
+
+    async def test_cancelled_waiter_is_skipped(self):
+        controller = AdmissionController(max_in_flight=1)
+        await controller.acquire("a")
+        waiter = asyncio.create_task(controller.acquire("b"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.sleep(0)
+        controller.release()
+        assert controller.stats()["in_flight"] == 0
+        assert controller.stats()["queue_depth"] == 0
+
+    async def test_rpm_bucket_delays_admission(self):
+        controller = AdmissionController(max_in_flight=0, requests_per_minute=600)
+        for _ in range(600):
+            await controller.acquire("a")
+        waiter = asyncio.create_task(controller.acquire("a"))
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        await asyncio.wait_for(waiter, timeout=1)
+        assert controller.stats()["max_wait"] > 0
+
+
+class EchoProvider(AIProviderBase):
+    model = "echo"
+
+    async def generate(self, messages, temperature=0.7, max_tokens=2048):
+        return AIResponse(content="ok", usage={"output_tokens": 5})
+
+    async def stream(self, messages, temperature=0.7, max_tokens=2048, usage=None):
+        yield "ok"
+
+
+class TestAdmissionProvider:
+    async def test_wraps_calls_and_charges_tokens(self):
+        controller = AdmissionController(tokens_per_minute=1000)
+        provider = AdmissionProvider(EchoProvider(), controller)
+        set_session_key("s1")
+        msgs = [AIMessage(role="user", content="你好")]
+        assert (await provider.generate(msgs)).content == "ok"
+        assert [c async for c in provider.stream(msgs)] == ["ok"]
+        stats = controller.stats()
+        assert stats["in_flight"] == 0
+        assert stats["admitted"] == 2
+        assert stats["tpm_available"] < 1000
@@ -0,0 +1,66 @@
+"""Tests for token estimation and the history window."""
+
+from backend.ai.context_window import (
+    MESSAGE_OVERHEAD,
+    entry_tokens,
+    estimate_tokens,
+    history_budget_for,
+    select_history,
+)
+from backend.ai.prompt_builder import build_messages
+from backend.scenario.models import Scenario, ScenarioMeta
+
+
+def _history(*contents: str) -> list[dict]:
+    roles = ["user", "assistant"]
+    return [{"role": roles[i % 2], "content": c} for i, c in enumerate(contents)]
+
+
+class TestEstimateTokens:
+    def test_cjk_counts_per_character(self):
+        assert estimate_tokens("你推开了大门") == 6
+
+    def test_ascii_counts_per_four_characters(self):
+        assert estimate_tokens("abcdefgh") == 2
+
+    def test_mixed(self):
+        assert estimate_tokens("侦查 check") == 2 + 2
+
+    def test_empty(self):
+        assert estimate_tokens("") == 0
+
+
+class TestHistoryWindow:
+    def test_entry_tokens_cached(self):
+        entry = {"role": "user", "content": "你好"}
+        assert entry_tokens(entry) == 2 + MESSAGE_OVERHEAD
+        assert entry["tokens"] == 2 + MESSAGE_OVERHEAD
+
+    def test_fills_newest_first(self):
+        history = _history("一" * 100, "二" * 100, "三" * 10, "四" * 10)
+        start = select_history(history, budget=40)
+        assert start == 2
+
+    def test_never_starts_on_assistant(self):
+        history = _history("一" * 100, "二" * 10, "三" * 10, "四" * 10)
+        # Budget fits the last three entries, the first of which is an assistant reply
+        start = select_history(history, budget=3 * (10 + MESSAGE_OVERHEAD))
+        assert history[start]["role"] == "user"
+        assert start == 2
+
+    def test_long_narrative_evicts_more(self):
+        history = _history("短", "很长的叙事" * 200, "短", "短")
+        trimmed = history[select_history(history, budget=200):]
+        assert len(trimmed) == 2
+
+    def test_budget_scales_with_model(self):
+        assert history_budget_for("gpt-4") < history_budget_for("claude-sonnet-4")
+
+    def test_build_messages_uses_budget(self):
+        scenario = Scenario(meta=ScenarioMeta(id="s", title="t"))
+        history = _history("一" * 500, "二" * 500, "三", "四")
+        messages = build_messages(
+            scenario, [], "", history, "行动", history_budget=50
+        )
+        contents = [m.content for m in messages if m.role != "system"]
+        assert contents == ["三", "四", "行动"]
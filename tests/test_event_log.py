@@ -0,0 +1,40 @@
+"""Tests for the sequence-numbered event log used for reconnect resync."""
+
+from backend.core.event_log import EventLog
+
+
+class TestEventLog:
+    def test_frames_are_numbered_in_order(self):
+        log = EventLog()
+        frames = [log.append({"type": "narrative", "content": str(i)}) for i in range(3)]
+        assert [f["seq"] for f in frames] == [1, 2, 3]
+        assert log.seq == 3
+
+    def test_since_returns_missed_frames(self):
+        log = EventLog()
+        for i in range(5):
+            log.append({"type": "narrative", "content": str(i)})
+        missed = log.since(log.id, 3)
+        assert [f["content"] for f in missed] == ["3", "4"]
+        assert log.since(log.id, 5) == []
+
+    def test_too_far_behind_needs_snapshot(self):
+        log = EventLog(maxlen=3)
+        for i in range(6):
+            log.append({"type": "narrative", "content": str(i)})
+        assert log.since(log.id, 2) is None
+        assert [f["seq"] for f in log.since(log.id, 3)] == [4, 5, 6]
+
+    def test_unknown_log_or_future_seq_needs_snapshot(self):
+        log = EventLog()
+        log.append({"type": "narrative"})
+        assert log.since("other", 1) is None
+        assert log.since(log.id, 7) is None
+
+    def test_reset_invalidates_old_positions(self):
+        log = EventLog()
+        log.append({"type": "narrative"})
+        old_id = log.id
+        log.reset()
+        assert log.since(old_id, 1) is None
+        assert log.since(log.id, 0) == []
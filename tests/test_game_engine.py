@@ -0,0 +1,117 @@
+"""Tests for the game engine turn loop."""
+
+import json
+
+from backend.ai.providers.base import AIProviderBase, AIResponse
+from backend.core.game_engine import GameEngine
+from backend.scenario.models import Scenario
+
+from tests.test_scenario import SAMPLE_SCENARIO
+
+
+class QueueProvider(AIProviderBase):
+    """Returns queued KP responses in order; streams them a few characters at a time."""
+
+    model = "queue"
+
+    def __init__(self, *responses: dict):
+        self.responses = [json.dumps(r, ensure_ascii=False) for r in responses]
+
+    async def generate(self, messages, temperature=0.7, max_tokens=2048):
+        return AIResponse(content=self.responses.pop(0))
+
+    async def stream(self, messages, temperature=0.7, max_tokens=2048, usage=None):
+        content = self.responses.pop(0)
+        for i in range(0, len(content), 3):
+            yield content[i:i + 3]
+
+
+def _engine(*responses: dict) -> tuple[GameEngine, str]:
+    engine = GameEngine(QueueProvider(*responses), Scenario(**SAMPLE_SCENARIO))
+    char = engine.characters.create_pc(name="调查员", player_name="P1")
+    return engine, char.id
+
+
+CHECK_TURN = {
+    "narrative": "你仔细搜查书房。",
+    "game_directives": [
+        {"type": "skill_check", "skill": "侦查", "difficulty": "regular"},
+        {"type": "clue_discovered", "clue_id": "clue1"},
+    ],
+}
+CONTINUATION = {"narrative": "你在抽屉里发现了一本日记。"}
+
+
+class TestProcessPlayerInput:
+    async def test_turn_with_continuation(self):
+        engine, cid = _engine(CHECK_TURN, CONTINUATION)
+        result = await engine.process_player_input("搜查书房", cid)
+        assert result["narrative"] == "你仔细搜查书房。"
+        assert result["directives"][0]["directive_type"] == "skill_check"
+        assert result["continuation"] == "你在抽屉里发现了一本日记。"
+        assert result["clues_discovered"][0]["clue_id"] == "clue1"
+        assert len(engine.keeper.history) == 4
+
+
+class TestStreamPlayerInput:
+    async def test_streams_deltas_then_result(self):
+        engine, cid = _engine(CHECK_TURN, CONTINUATION)
+        events = [e async for e in engine.stream_player_input("搜查书房", cid)]
+
+        deltas = [e for e in events if e["type"] == "narrative_delta"]
+        main = "".join(e["content"] for e in deltas if e["segment"] == "narrative")
+        cont = "".join(e["content"] for e in deltas if e["segment"] == "continuation")
+        assert main == "你仔细搜查书房。"
+        assert cont == "你在抽屉里发现了一本日记。"
+        assert len(deltas) > 2
+
+        types = [e["type"] for e in events]
+        assert types.index("directive_result") < types.index("turn_result")
+        assert types[-1] == "turn_result"
+        result = events[-1]["result"]
+        assert result["continuation"] == cont
+        assert "clue1" in engine.guardian.discovered_clues
+        assert len(engine.keeper.history) == 4
+
+
+class ToolProvider(QueueProvider):
+    """Calls the dice tool once, then answers with a narrative quoting the result."""
+
+    supports_tools = True
+
+    async def generate_with_tools(self, messages, tools, handler, *args, **kwargs):
+        outcome = await handler("roll_skill_check", {"skill": "侦查", "difficulty": "regular"})
+        narrative = f"你仔细搜查书房。（{outcome}）"
+        return AIResponse(content=json.dumps({"narrative": narrative}, ensure_ascii=False))
+
+
+class TestDiceTools:
+    async def test_single_round_trip(self):
+        engine = GameEngine(ToolProvider(), Scenario(**SAMPLE_SCENARIO), dice_tools=True)
+        cid = engine.characters.create_pc(name="调查员", player_name="P1").id
+        result = await engine.process_player_input("搜查书房", cid)
+
+        assert result["directives"][0]["directive_type"] == "skill_check"
+        assert result["directives"][0]["details"]["skill"] == "侦查"
+        assert result["directives"][0]["description"] in result["narrative"]
+        assert result["continuation"] is None
+        assert len(engine.keeper.history) == 2
+
+    async def test_tool_character_id_picks_the_roller(self):
+        class TargetedToolProvider(ToolProvider):
+            async def generate_with_tools(self, messages, tools, handler, *args, **kwargs):
+                await handler("roll_san_check", {"san_loss_failure": "1", "character_id": bob})
+                return AIResponse(content=json.dumps({"narrative": "寒意袭来。"}))
+
+        engine = GameEngine(TargetedToolProvider(), Scenario(**SAMPLE_SCENARIO), dice_tools=True)
+        alice = engine.characters.create_pc(name="Alice", player_name="P1").id
+        bob = engine.characters.create_pc(name="Bob", player_name="P2").id
+        result = await engine.process_player_input("看向窗外", alice)
+        assert result["directives"][0]["description"].startswith("Bob")
+
+    async def test_falls_back_without_tool_support(self):
+        provider = QueueProvider(CHECK_TURN, CONTINUATION)
+        engine = GameEngine(provider, Scenario(**SAMPLE_SCENARIO), dice_tools=True)
+        cid = engine.characters.create_pc(name="调查员", player_name="P1").id
+        result = await engine.process_player_input("搜查书房", cid)
+        assert result["continuation"] == "你在抽屉里发现了一本日记。"
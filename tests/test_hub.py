@@ -0,0 +1,141 @@
+"""Tests for the per-session WebSocket hub."""
+
+import asyncio
+import json
+
+from backend.api.hub import SessionHub, get_hub, release_hub, turn_frames
+from backend.api.protocol import ClientConnection, FrameCodec
+from backend.core.event_log import EventLog
+
+from tests.test_protocol import RESULT
+
+
+class FakeWebSocket:
+    def __init__(self, stall: bool = False):
+        self.sent: list = []
+        self.closed: int | None = None
+        self._stall = stall
+
+    async def send_text(self, data: str):
+        if self._stall:
+            await asyncio.Event().wait()
+        self.sent.append(data)
+
+    async def send_bytes(self, data: bytes):
+        self.sent.append(data)
+
+    async def close(self, code: int = 1000):
+        self.closed = code
+
+
+class FakeEngine:
+    def __init__(self):
+        self.events = EventLog()
+        self.journal = None
+        self.saves = 0
+
+    async def checkpoint(self):
+        self.saves += 1
+
+
+def _client(batch: bool = False, stall: bool = False, queue_size: int = 256):
+    ws = FakeWebSocket(stall=stall)
+    return ws, ClientConnection(ws, FrameCodec(), batch=batch, queue_size=queue_size)
+
+
+async def _drain():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+class TestSessionHub:
+    async def test_events_fan_out_to_every_client(self):
+        hub = SessionHub("s1", FakeEngine())
+        (ws1, c1), (ws2, c2) = _client(), _client()
+        hub.join(c1)
+        hub.join(c2)
+        hub.publish({"type": "narrative", "content": "门开了"})
+        await _drain()
+        assert ws1.sent == ws2.sent
+        assert json.loads(ws1.sent[0])["seq"] == 1
+        hub.leave(c1)
+        hub.leave(c2)
+
+    async def test_same_encoding_is_serialized_once(self, monkeypatch):
+        hub = SessionHub("s1", FakeEngine())
+        clients = [_client() for _ in range(3)]
+        for _, conn in clients:
+            hub.join(conn)
+        calls = []
+        original = FrameCodec.encode
+        monkeypatch.setattr(
+            FrameCodec, "encode", lambda self, f: calls.append(f) or original(self, f)
+        )
+        hub.publish({"type": "narrative", "content": "x"})
+        assert len(calls) == 1
+        await _drain()
+        assert clients[0][0].sent[0] is clients[2][0].sent[0]
+        for _, conn in clients:
+            hub.leave(conn)
+
+    async def test_turn_batching_per_client(self):
+        hub = SessionHub("s1", FakeEngine())
+        (ws_batch, c_batch), (ws_plain, c_plain) = _client(batch=True), _client()
+        hub.join(c_batch)
+        hub.join(c_plain)
+        hub.publish_turn(turn_frames(RESULT))
+        await _drain()
+        assert len(ws_batch.sent) == 1
+        assert json.loads(ws_batch.sent[0])["type"] == "turn_result"
+        assert len(ws_plain.sent) == 7
+        hub.leave(c_batch)
+        hub.leave(c_plain)
+
+    async def test_direct_send_reaches_one_client(self):
+        hub = SessionHub("s1", FakeEngine())
+        (ws1, c1), (ws2, c2) = _client(), _client()
+        hub.join(c1)
+        hub.join(c2)
+        hub.send(c1, {"type": "pong"})
+        await _drain()
+        assert len(ws1.sent) == 1 and ws2.sent == []
+        hub.leave(c1)
+        hub.leave(c2)
+
+    async def test_slow_consumer_is_evicted(self):
+        hub = SessionHub("s1", FakeEngine())
+        ws_slow, slow = _client(stall=True, queue_size=2)
+        ws_fast, fast = _client()
+        hub.join(slow)
+        hub.join(fast)
+        for i in range(5):
+            hub.publish({"type": "narrative", "content": str(i)})
+        await _drain()
+        assert slow not in hub.clients
+        assert ws_slow.closed == 1013
+        assert len(ws_fast.sent) == 5
+        hub.leave(fast)
+
+    async def test_one_autosave_task_per_session(self):
+        engine = FakeEngine()
+        hub = SessionHub("s1", engine, autosave_interval=0.01)
+        (_, c1), (_, c2) = _client(), _client()
+        hub.join(c1)
+        task = hub._autosave_task
+        hub.join(c2)
+        assert hub._autosave_task is task
+        await asyncio.sleep(0.035)
+        assert 1 <= engine.saves <= 4
+        hub.leave(c1)
+        assert not task.done()
+        hub.leave(c2)
+        await _drain()
+        assert task.done() and hub._autosave_task is None
+
+    async def test_registry_shares_hub_until_released(self):
+        engine = FakeEngine()
+        hub = get_hub("s-reg", engine)
+        assert get_hub("s-reg", engine) is hub
+        assert get_hub("s-reg", FakeEngine()) is not hub
+        release_hub(get_hub("s-reg", engine))
+        assert get_hub("s-reg", engine) is not hub
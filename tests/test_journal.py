@@ -0,0 +1,129 @@
+"""Tests for the append-only turn journal."""
+
+import json
+
+import pytest
+
+from backend.core import game_engine
+from backend.core.game_engine import GameEngine
+from backend.persistence.journal import TurnJournal, journal_path, read_journal, replay
+from backend.persistence.save_format import load
+from backend.scenario.models import Scenario
+
+from tests.test_game_engine import CHECK_TURN, CONTINUATION, QueueProvider
+from tests.test_scenario import SAMPLE_SCENARIO
+
+QUIET_TURN = {"narrative": "走廊里一片寂静。"}
+
+
+@pytest.fixture(autouse=True)
+def saves_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(game_engine, "SAVES_DIR", tmp_path)
+    return tmp_path
+
+
+def _engine(*responses: dict, snapshot_every: int = 20) -> tuple[GameEngine, str]:
+    engine = GameEngine(
+        QueueProvider(*responses),
+        Scenario(**SAMPLE_SCENARIO),
+        journal=TurnJournal(snapshot_every),
+    )
+    char = engine.characters.create_pc(name="调查员", player_name="P1")
+    engine.start_game()
+    engine.begin_exploration()
+    return engine, char.id
+
+
+def _snapshot(engine: GameEngine):
+    return game_engine.SAVES_DIR / f"{engine.session.id}_auto.sav"
+
+
+async def _restored(engine: GameEngine) -> GameEngine:
+    other = GameEngine(QueueProvider(), Scenario(**SAMPLE_SCENARIO), journal=TurnJournal())
+    other.session.id = engine.session.id
+    assert await other.load_from_file("auto")
+    return other
+
+
+class TestTurnJournal:
+    async def test_turn_appends_delta_only(self, saves_dir):
+        engine, cid = _engine(CHECK_TURN, CONTINUATION)
+        await engine.checkpoint()
+        snapshot = _snapshot(engine)
+        before = snapshot.read_bytes()
+
+        await engine.process_player_input("搜查书房", cid)
+        await engine.checkpoint()
+
+        assert snapshot.read_bytes() == before
+        [record] = read_journal(journal_path(snapshot))
+        assert record["history_from"] == 0
+        assert len(record["history"]) == 4
+        assert record["discovered_clues"] == ["clue1"]
+        # Nothing about the scenario or unchanged state is rewritten
+        assert "scenario_id" not in record
+
+    async def test_recovery_replays_journal(self):
+        engine, cid = _engine(CHECK_TURN, CONTINUATION, QUIET_TURN)
+        await engine.checkpoint()
+        await engine.process_player_input("搜查书房", cid)
+        await engine.checkpoint()
+        await engine.process_player_input("听听动静", cid)
+        await engine.checkpoint()
+
+        restored = await _restored(engine)
+        assert restored.to_save_data() == json.loads(
+            json.dumps(engine.to_save_data(), ensure_ascii=False)
+        )
+        assert restored.journal.records == 2
+
+    async def test_saved_entries_are_copies(self):
+        engine, cid = _engine(CHECK_TURN, CONTINUATION)
+        engine.journal.mark(engine)
+        await engine.process_player_input("搜查书房", cid)
+        saved = engine.to_save_data()["keeper_history"]
+        record = engine.journal.delta(engine)
+
+        # The loop backfills keys into live entries while a worker encodes these
+        engine.keeper.history[0]["tokens"] = -1
+        assert saved[0]["tokens"] != -1
+        assert record["history"][0]["tokens"] != -1
+
+    async def test_unchanged_state_writes_nothing(self, saves_dir):
+        engine, _ = _engine()
+        await engine.checkpoint()
+        await engine.checkpoint()
+        assert not journal_path(_snapshot(engine)).exists()
+
+    async def test_snapshot_compacts_journal(self):
+        engine, cid = _engine(QUIET_TURN, QUIET_TURN, QUIET_TURN, snapshot_every=2)
+        await engine.checkpoint()
+        snapshot = _snapshot(engine)
+        for _ in range(2):
+            await engine.process_player_input("等待", cid)
+            await engine.checkpoint()
+        assert len(read_journal(journal_path(snapshot))) == 2
+
+        await engine.process_player_input("等待", cid)
+        await engine.checkpoint()
+        assert not journal_path(snapshot).exists()
+        assert len(load(snapshot)["keeper_history"]) == 6
+        assert len((await _restored(engine)).keeper.history) == 6
+
+
+class TestReplay:
+    def test_replaying_twice_is_idempotent(self):
+        data = {"keeper_history": [{"role": "user", "content": "a"}]}
+        records = [
+            {"turn": 1, "history_from": 1, "history": [{"role": "assistant", "content": "b"}],
+             "discovered_clues": ["c1"]},
+        ]
+        once = replay(json.loads(json.dumps(data)), records)
+        twice = replay(replay(json.loads(json.dumps(data)), records), records)
+        assert once == twice
+        assert [e["content"] for e in once["keeper_history"]] == ["a", "b"]
+
+    def test_torn_last_line_is_dropped(self, tmp_path):
+        path = tmp_path / "s_auto.journal"
+        path.write_text('{"turn": 1, "phase": "exploration"}\n{"turn": 2, "ph')
+        assert read_journal(path) == [{"turn": 1, "phase": "exploration"}]
@@ -0,0 +1,165 @@
+"""Tests for the KP engine: history handling and compaction."""
+
+import asyncio
+import json
+
+from backend.ai.keeper_engine import COMPACTION_BATCH, KeeperEngine
+from backend.ai.providers.base import AIProviderBase, AIResponse
+from backend.ai.response_parser import StreamingResponseParser, parsed_entry
+from backend.ai.summarizer import SUMMARY_SYSTEM_PROMPT, _render_entries
+from backend.scenario.models import Scenario, ScenarioMeta
+
+
+class ScriptedProvider(AIProviderBase):
+    """Answers KP turns with a fixed JSON envelope and summaries with a counter."""
+
+    model = "scripted"
+
+    def __init__(self):
+        self.prompts: list[list] = []
+        self.summaries = 0
+
+    async def generate(self, messages, temperature=0.7, max_tokens=2048):
+        self.prompts.append(messages)
+        if messages[0].content == SUMMARY_SYSTEM_PROMPT:
+            self.summaries += 1
+            return AIResponse(content=f"摘要{self.summaries}")
+        return AIResponse(content=json.dumps({"narrative": "叙事" * 20}, ensure_ascii=False))
+
+    async def stream(self, messages, temperature=0.7, max_tokens=2048, usage=None):
+        resp = await self.generate(messages, temperature, max_tokens)
+        if usage is not None:
+            usage.update({"input_tokens": 100, "output_tokens": 20})
+        yield resp.content
+
+
+def _keeper(budget: int = 200, layout: str = "layered") -> tuple[KeeperEngine, ScriptedProvider]:
+    provider = ScriptedProvider()
+    scenario = Scenario(meta=ScenarioMeta(id="s", title="测试"))
+    keeper = KeeperEngine(provider, scenario, history_budget=budget, prompt_layout=layout)
+    return keeper, provider
+
+
+class TestHistory:
+    async def test_entries_carry_token_counts(self):
+        keeper, _ = _keeper()
+        await keeper.generate_response("我推开门", [])
+        assert all("tokens" in e for e in keeper.history)
+
+    async def test_assistant_entries_carry_parsed_reply(self):
+        keeper, _ = _keeper()
+        await keeper.generate_response("我推开门", [])
+        async for _ in keeper.stream_response("我走进去", []):
+            pass
+        for entry in keeper.history[1::2]:
+            assert entry["narrative"] == "叙事" * 20
+            assert entry["directives"] == []
+        assert "narrative" not in keeper.history[0]
+
+    async def test_streamed_turn_keeps_callers_parse_and_usage(self):
+        keeper, _ = _keeper()
+        parser = StreamingResponseParser()
+        async for chunk in keeper.stream_response("我走进去", [], parser=parser):
+            parser.feed(chunk)
+        assert keeper.get_token_usage() == 120
+        assert keeper.history[-1]["narrative"] == parser.close().narrative
+        assert parser.close() is parser.close()
+
+        async for _ in keeper.stream_feed_result("[系统] 判定结果："):
+            pass
+        assert keeper.get_token_usage() == 240
+
+    def test_old_entries_are_backfilled_once(self):
+        raw = json.dumps({
+            "narrative": "门开了",
+            "game_directives": [{"type": "skill_check", "skill": "侦查"}],
+        }, ensure_ascii=False)
+        entry = {"role": "assistant", "content": raw}
+        assert parsed_entry(entry)["narrative"] == "门开了"
+        assert entry["directives"] == [{"type": "skill_check", "skill": "侦查"}]
+
+        entry["content"] = "不会再解析"
+        assert parsed_entry(entry)["narrative"] == "门开了"
+
+
+class TestPromptStats:
+    async def test_layers_are_profiled_per_prompt(self):
+        keeper, _ = _keeper(budget=100_000)
+        await keeper.generate_response("我推开门", [], plot_progress="[剧情进度]")
+        await keeper.generate_response("我点燃油灯", [])
+
+        stats = keeper.prompt_stats.to_dict()
+        assert stats["prompts"] == 2
+        assert stats["last"]["history"]["messages"] == 2
+        assert stats["last"]["progress"]["messages"] == 0
+        assert stats["layers"]["input"]["total_chars"] == len("我推开门") + len("我点燃油灯")
+        assert stats["total_tokens"] == sum(
+            layer["total_tokens"] for layer in stats["layers"].values()
+        )
+
+
+class TestCompaction:
+    async def test_no_compaction_while_history_fits(self):
+        keeper, _ = _keeper(budget=100_000)
+        for _ in range(5):
+            await keeper.generate_response("调查", [])
+        assert keeper.schedule_compaction() is None
+
+    async def test_evicted_turns_fold_into_summary(self):
+        keeper, provider = _keeper()
+        for _ in range(COMPACTION_BATCH):
+            await keeper.generate_response("调查", [])
+        start, end = keeper.pending_compaction()
+        assert end - start >= COMPACTION_BATCH
+
+        task = keeper.schedule_compaction()
+        await task
+        assert keeper.story_summary == "摘要1"
+        assert keeper.summarized_upto == end
+
+        await keeper.generate_response("继续", [])
+        system = [m.content for m in provider.prompts[-1] if m.role == "system"]
+        assert "[前情提要]\n摘要1" in system
+
+    async def test_stable_prefix_breaks_once_per_window_step(self):
+        keeper, provider = _keeper(budget=800, layout="stable_prefix")
+        answer = provider.generate
+
+        async def network(messages, *args, **kwargs):
+            await asyncio.sleep(0)  # Calls interleave as real requests do
+            return await answer(messages, *args, **kwargs)
+
+        provider.generate = network
+        for _ in range(80):
+            await keeper.generate_response("调查", [])
+            # As the engine does after each turn; the next action comes at once
+            keeper.schedule_compaction()
+
+        turns = [p for p in provider.prompts if p[0].content != SUMMARY_SYSTEM_PROMPT]
+        breaks = sum(
+            current[:len(previous) - 1] != previous[:-1]
+            for previous, current in zip(turns, turns[1:])
+        )
+        # The summary lands in the same prompt as the window move it covers
+        assert provider.summaries >= 2
+        assert breaks == provider.summaries
+
+    def test_summary_input_reuses_stored_parse(self):
+        entries = [
+            {"role": "user", "content": "调查"},
+            {"role": "assistant", "content": "{不是 JSON", "narrative": "你找到一封信。"},
+        ]
+        assert _render_entries(entries) == "玩家：调查\nKP：你找到一封信。"
+
+    async def test_failed_summary_keeps_state(self):
+        keeper, provider = _keeper()
+        for _ in range(COMPACTION_BATCH):
+            await keeper.generate_response("调查", [])
+
+        async def broken(*args, **kwargs):
+            raise RuntimeError("provider down")
+
+        provider.generate = broken
+        await keeper.schedule_compaction()
+        assert keeper.story_summary == ""
+        assert keeper.summarized_upto == 0
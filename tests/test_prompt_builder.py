@@ -0,0 +1,223 @@
+"""Tests for the layered KP prompt builder."""
+
+import json
+
+from backend.ai.context_window import MESSAGE_OVERHEAD, STABLE_WINDOW_STEP, estimate_tokens
+from backend.ai.prompt_builder import PROMPT_LAYERS, PromptCache, build_messages
+from backend.character.service import CharacterService
+from backend.core.turn_manager import TurnManager
+from backend.scenario.models import Scenario
+from backend.scenario.plot_guardian import PlotGuardian
+
+from tests.test_scenario import SAMPLE_SCENARIO
+
+
+class TestPromptCache:
+    def setup_method(self):
+        self.scenario = Scenario(**SAMPLE_SCENARIO)
+        self.chars = CharacterService()
+        self.pc = self.chars.create_pc(name="调查员", player_name="P1")
+        self.turns = TurnManager()
+        self.cache = PromptCache()
+
+    def _build(self):
+        return build_messages(
+            self.scenario,
+            self.chars.list_party(),
+            "",
+            [],
+            "行动",
+            turn_state=self.turns.to_dict(),
+            cache=self.cache,
+            versions={"characters": self.chars.version, "turn": self.turns.version},
+        )
+
+    def test_static_scenario_layer_is_reused(self):
+        first = self._build()
+        self.chars.update_stat(self.pc.id, "hp", -1)
+        second = self._build()
+        assert first[1].content is second[1].content
+        assert "[线索清单" in first[1].content
+        assert "[调查员状态]" not in first[1].content
+
+    def test_status_layer_cached_until_version_changes(self):
+        first = self._build()
+        second = self._build()
+        assert first[2].content is second[2].content
+
+        self.chars.update_stat(self.pc.id, "hp", -1)
+        third = self._build()
+        assert third[2].content != first[2].content
+        assert f"HP {self.pc.derived.hp}/" in third[2].content
+
+    def test_turn_layer_invalidated_by_turn_manager(self):
+        first = self._build()
+        self.turns.init_combat(self.chars.list_party())
+        second = self._build()
+        assert "探索模式" in first[3].content
+        assert "战斗模式" in second[3].content
+
+    def test_unversioned_layers_always_render(self):
+        msgs = build_messages(self.scenario, self.chars.list_party(), "", [], "行动")
+        assert msgs[2].content.startswith("[调查员状态]")
+
+
+class TestProfile:
+    def test_profile_covers_every_message(self):
+        scenario = Scenario(**SAMPLE_SCENARIO)
+        history = [
+            {"role": "user", "content": "调查书房"},
+            {"role": "assistant", "content": "你发现了日记"},
+        ]
+        profile: dict = {}
+        msgs = build_messages(
+            scenario, [], "[剧情进度]", history, "继续",
+            story_summary="摘要", profile=profile,
+        )
+        assert tuple(profile) == PROMPT_LAYERS
+        assert sum(p["messages"] for p in profile.values()) == len(msgs)
+        assert profile["history"]["messages"] == 3  # summary + two entries
+        assert profile["input"] == {
+            "tokens": estimate_tokens("继续") + MESSAGE_OVERHEAD,
+            "chars": 2,
+            "messages": 1,
+        }
+
+
+def _wire(messages) -> bytes:
+    """Request body bytes an OpenAI-compatible server sees for `messages`."""
+    body = [{"role": m.role, "content": m.content} for m in messages]
+    return json.dumps(body, ensure_ascii=False).encode("utf-8")
+
+
+class TestStablePrefixLayout:
+    def setup_method(self):
+        self.scenario = Scenario(**SAMPLE_SCENARIO)
+        self.chars = CharacterService()
+        self.pc = self.chars.create_pc(name="调查员", player_name="P1")
+        self.guardian = PlotGuardian(self.scenario)
+        self.turns = TurnManager()
+        self.history: list[dict] = []
+
+    def _turn(self, player_input: str, layout: str):
+        return build_messages(
+            self.scenario,
+            self.chars.list_party(),
+            self.guardian.generate_progress_prompt(),
+            self.history,
+            player_input,
+            turn_state=self.turns.to_dict(),
+            history_budget=100_000,
+            layout=layout,
+        )
+
+    def _play(self, layout: str) -> tuple[list, list]:
+        first = self._turn("检查大门", layout)
+        self.history += [
+            {"role": "user", "content": "检查大门"},
+            {"role": "assistant", "content": "门锁生锈了。"},
+        ]
+        # Everything volatile moves between the two turns
+        self.chars.update_stat(self.pc.id, "hp", -2)
+        self.chars.update_stat(self.pc.id, "san", -3)
+        self.guardian.update_clue_status("clue1")
+        self.turns.set_active(self.pc.id)
+        second = self._turn("撬开门锁", layout)
+        return first, second
+
+    def test_prefix_bytes_identical_across_turns(self):
+        first, second = self._play("stable_prefix")
+        # Everything but the final user message carries over byte for byte
+        prefix = _wire(first[:-1])[:-1]  # drop the closing bracket
+        assert _wire(second).startswith(prefix)
+        # Turn 2 extends the prefix with the new history entries
+        assert second[len(first) - 1].content == "检查大门"
+        assert second[-1].role == "user"
+        assert second[-1].content.endswith("[玩家行动]\n撬开门锁")
+        assert "[调查员状态]" in second[-1].content
+
+    def test_system_messages_only_lead(self):
+        self.history += [
+            {"role": "user", "content": "检查大门"},
+            {"role": "assistant", "content": "门锁生锈了。"},
+        ]
+        messages = self._turn("撬开门锁", "stable_prefix")
+        roles = [m.role for m in messages]
+        assert "system" not in roles[roles.index("user"):]
+
+    def test_layered_layout_breaks_prefix(self):
+        first, second = self._play("layered")
+        assert not _wire(second).startswith(_wire(first[:-1])[:-1])
+
+    def test_same_content_in_both_layouts(self):
+        layered = self._turn("行动", "layered")
+        stable = self._turn("行动", "stable_prefix")
+        merged = stable[-1].content
+        for message in layered:
+            assert message in stable or message.content in merged
+
+    def test_prefix_survives_past_history_budget(self):
+        budget = 200
+        previous = None
+        shared = []
+        for turn in range(40):
+            player_input = f"第{turn}回合：我仔细搜查房间的每一个角落"
+            messages = build_messages(
+                self.scenario,
+                self.chars.list_party(),
+                self.guardian.generate_progress_prompt(),
+                self.history,
+                player_input,
+                turn_state=self.turns.to_dict(),
+                history_budget=budget,
+                layout="stable_prefix",
+            )
+            if previous is not None:
+                shared.append(messages[:len(previous) - 1] == previous[:-1])
+            previous = messages
+            self.history += [
+                {"role": "user", "content": player_input},
+                {
+                    "role": "assistant",
+                    "content": f"第{turn}回合：你在角落里发现了一些灰尘和旧报纸。",
+                },
+            ]
+            self.chars.update_stat(self.pc.id, "hp", -1 if turn % 2 else 1)
+
+        assert len(self.history) > 2 * STABLE_WINDOW_STEP  # Well past the budget
+        # The window start only moves once every STABLE_WINDOW_STEP entries
+        assert shared.count(False) <= len(shared) * 2 // STABLE_WINDOW_STEP + 1
+        assert shared.count(True) >= len(shared) * 3 // 4
+
+
+class TestVersionCounters:
+    def test_services_bump_on_change(self):
+        chars = CharacterService()
+        v = chars.version
+        pc = chars.create_pc(name="A", player_name="P")
+        assert chars.version > v
+        v = chars.version
+        chars.add_condition(pc.id, "受伤")
+        assert chars.version > v
+
+        guardian = PlotGuardian(Scenario(**SAMPLE_SCENARIO))
+        v = guardian.version
+        guardian.update_clue_status("clue1")
+        assert guardian.version > v
+
+        turns = TurnManager()
+        v = turns.version
+        turns.set_active(pc.id)
+        assert turns.version > v
+
+    def test_restored_turn_manager_gets_fresh_version(self):
+        turns = TurnManager()
+        restored = TurnManager.from_dict(turns.to_dict())
+        assert restored.version != turns.version
+
+    def test_progress_prompt_cached(self):
+        guardian = PlotGuardian(Scenario(**SAMPLE_SCENARIO))
+        first = guardian.generate_progress_prompt()
+        assert guardian.generate_progress_prompt() is first
+        guardian.update_clue_status("clue1")
+        assert "已发现线索" in guardian.generate_progress_prompt()
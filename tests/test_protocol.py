@@ -0,0 +1,60 @@
+"""Tests for WebSocket frame encoding and per-turn batching."""
+
+import json
+import zlib
+
+from backend.api import protocol
+from backend.api.protocol import FrameCodec
+from backend.api.hub import turn_frames
+
+
+RESULT = {
+    "narrative": "你推开门。",
+    "directives": [{"description": "侦查检定: 成功", "details": {"roll": 30, "target": 60}}],
+    "continuation": "门后是一条走廊。",
+    "npc_actions": [{"npc_id": "knott", "action": "dialogue", "content": "小心！"}],
+    "clues_discovered": [{"clue_id": "c1", "description": "脚印"}],
+    "phase": "exploration",
+    "atmosphere": "tense",
+    "turn_state": {"mode": "exploration"},
+}
+
+
+class TestFrameCodec:
+    def test_json_text(self):
+        data = FrameCodec("json").encode({"type": "narrative", "content": "门"})
+        assert isinstance(data, str)
+        assert json.loads(data) == {"type": "narrative", "content": "门"}
+
+    def test_deflate_only_large_frames(self):
+        codec = FrameCodec("deflate", deflate_min_bytes=64)
+        assert isinstance(codec.encode({"type": "pong"}), str)
+        frame = {"type": "narrative", "content": "黑暗" * 100}
+        data = codec.encode(frame)
+        assert isinstance(data, bytes)
+        assert json.loads(zlib.decompress(data)) == frame
+
+    def test_unknown_or_unavailable_encoding_falls_back(self, monkeypatch):
+        assert FrameCodec("xml").encoding == "json"
+        monkeypatch.setattr(protocol, "msgpack", None)
+        assert FrameCodec("msgpack").encoding == "json"
+
+    def test_stdlib_encoder_without_orjson(self, monkeypatch):
+        monkeypatch.setattr(protocol, "orjson", None)
+        assert protocol.dumps({"a": "调查"}) == '{"a":"调查"}'
+
+
+class TestTurnFrames:
+    def test_frames_cover_whole_turn(self):
+        types = [f["type"] for f in turn_frames(RESULT)]
+        assert types == [
+            "narrative", "dice_result", "narrative", "npc_action",
+            "clue_discovered", "state_update", "turn_update",
+        ]
+
+    def test_streamed_turn_confirms_narrative(self):
+        frames = turn_frames(RESULT, streamed=True)
+        assert frames[0] == {
+            "type": "narrative_done", "segment": "narrative", "content": "你推开门。",
+        }
+        assert "dice_result" not in [f["type"] for f in frames]
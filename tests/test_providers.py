@@ -0,0 +1,381 @@
+"""Tests for the AI provider HTTP layer."""
+
+import json
+
+import httpx
+import pytest
+
+from backend.ai.providers.base import (
+    AIMessage,
+    AIProviderBase,
+    AIResponse,
+    AITool,
+    HTTPProviderBase,
+)
+from backend.ai.providers.claude import ClaudeProvider
+from backend.ai.providers.openai_provider import OpenAIProvider
+from backend.ai.providers.resilient import CircuitBreaker, ResilientProvider
+from backend.config import Settings
+
+MSGS = [AIMessage(role="user", content="hi")]
+
+
+def _mock_client(handler) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+class TestPooledClient:
+    def test_client_is_shared(self):
+        provider = OpenAIProvider(api_key="k", max_connections=5)
+        assert isinstance(provider, HTTPProviderBase)
+        assert provider.client is provider.client
+
+    async def test_generate_reuses_client(self):
+        calls = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            calls.append(request.url.path)
+            return httpx.Response(200, json={
+                "choices": [{"message": {"content": "ok"}}],
+                "usage": {"prompt_tokens": 3},
+            })
+
+        provider = OpenAIProvider(api_key="k")
+        client = _mock_client(handler)
+        provider._client = client
+        msgs = [AIMessage(role="user", content="hi")]
+        await provider.generate(msgs)
+        await provider.generate(msgs)
+        assert calls == ["/v1/chat/completions"] * 2
+        assert provider.client is client
+
+    async def test_stream_requests_usage_chunk(self):
+        sent = {}
+        chunks = [
+            {"choices": [{"delta": {"content": "ok"}}]},
+            {"choices": [], "usage": {"prompt_tokens": 5, "completion_tokens": 2}},
+        ]
+        body = "".join(f"data: {json.dumps(c)}\n\n" for c in chunks) + "data: [DONE]\n\n"
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            sent.update(json.loads(request.content))
+            return httpx.Response(200, text=body)
+
+        provider = OpenAIProvider(api_key="k")
+        provider._client = _mock_client(handler)
+        usage: dict = {}
+        assert [c async for c in provider.stream(MSGS, usage=usage)] == ["ok"]
+        assert sent["stream_options"] == {"include_usage": True}
+        assert usage == {"prompt_tokens": 5, "completion_tokens": 2}
+
+    async def test_aclose_recreates_client(self):
+        provider = ClaudeProvider(api_key="k")
+        first = provider.client
+        await provider.aclose()
+        assert first.is_closed
+        assert provider.client is not first
+        await provider.aclose()
+
+    async def test_warmup_swallows_network_errors(self):
+        def handler(request: httpx.Request) -> httpx.Response:
+            raise httpx.ConnectError("offline", request=request)
+
+        provider = ClaudeProvider(api_key="k")
+        provider._client = _mock_client(handler)
+        await provider.warmup()
+
+
+class TestClaudePromptCache:
+    async def test_system_layers_sent_as_cached_blocks(self):
+        sent = {}
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            sent.update(json.loads(request.content))
+            return httpx.Response(200, json={
+                "content": [{"type": "text", "text": "ok"}],
+                "usage": {
+                    "input_tokens": 10,
+                    "output_tokens": 2,
+                    "cache_read_input_tokens": 1200,
+                },
+            })
+
+        provider = ClaudeProvider(api_key="k")
+        provider._client = _mock_client(handler)
+        resp = await provider.generate([
+            AIMessage(role="system", content="persona", cacheable=True),
+            AIMessage(role="system", content="scenario", cacheable=True),
+            AIMessage(role="system", content="progress"),
+            AIMessage(role="user", content="hi"),
+        ])
+
+        system = sent["system"]
+        assert [b["text"] for b in system] == ["persona", "scenario", "progress"]
+        assert system[0]["cache_control"] == {"type": "ephemeral"}
+        assert system[1]["cache_control"] == {"type": "ephemeral"}
+        assert "cache_control" not in system[2]
+        assert sent["messages"] == [{"role": "user", "content": "hi"}]
+        assert resp.usage["cache_read_input_tokens"] == 1200
+        assert resp.usage["cache_creation_input_tokens"] == 0
+
+    async def test_stream_reports_usage(self):
+        events = [
+            {
+                "type": "message_start",
+                "message": {"usage": {"input_tokens": 10, "output_tokens": 1}},
+            },
+            {"type": "content_block_delta", "delta": {"text": "o"}},
+            {"type": "content_block_delta", "delta": {"text": "k"}},
+            {"type": "message_delta", "usage": {"output_tokens": 7}},
+        ]
+        body = "".join(f"data: {json.dumps(e)}\n\n" for e in events)
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(200, text=body)
+
+        provider = ClaudeProvider(api_key="k")
+        provider._client = _mock_client(handler)
+        usage: dict = {}
+        chunks = [c async for c in provider.stream(MSGS, usage=usage)]
+        assert "".join(chunks) == "ok"
+        assert usage["input_tokens"] == 10
+        assert usage["output_tokens"] == 7
+        assert usage["cache_read_input_tokens"] == 0
+
+    def test_prompt_cache_can_be_disabled(self):
+        provider = ClaudeProvider(api_key="k", prompt_cache=False)
+        system, _ = provider._split_messages([
+            AIMessage(role="system", content="persona", cacheable=True),
+        ])
+        assert system == [{"type": "text", "text": "persona"}]
+
+
+class FlakyProvider(AIProviderBase):
+    """Fails with the given status codes before answering."""
+
+    def __init__(self, statuses: list[int], content: str = "ok", headers: dict | None = None):
+        self.statuses = list(statuses)
+        self.content = content
+        self.headers = headers or {}
+        self.calls = 0
+
+    def _maybe_fail(self):
+        self.calls += 1
+        if self.statuses:
+            status = self.statuses.pop(0)
+            request = httpx.Request("POST", "https://example.invalid")
+            response = httpx.Response(status, headers=self.headers, request=request)
+            raise httpx.HTTPStatusError("boom", request=request, response=response)
+
+    async def generate(self, messages, temperature=0.7, max_tokens=2048):
+        self._maybe_fail()
+        return AIResponse(content=self.content)
+
+    async def stream(self, messages, temperature=0.7, max_tokens=2048, usage=None):
+        self._maybe_fail()
+        yield self.content
+
+
+class TestResilientProvider:
+    def _wrap(self, providers, **kwargs):
+        delays = []
+
+        async def fake_sleep(delay):
+            delays.append(delay)
+
+        kwargs.setdefault("rng", lambda: 1.0)
+        wrapper = ResilientProvider(providers, sleep=fake_sleep, **kwargs)
+        return wrapper, delays
+
+    async def test_retries_with_backoff(self):
+        flaky = FlakyProvider([503, 429])
+        wrapper, delays = self._wrap([flaky], max_retries=3, base_delay=0.5)
+        resp = await wrapper.generate(MSGS)
+        assert resp.content == "ok"
+        assert flaky.calls == 3
+        assert delays == [0.5, 1.0]
+
+    async def test_honours_retry_after(self):
+        flaky = FlakyProvider([429], headers={"retry-after": "3"})
+        wrapper, delays = self._wrap([flaky], base_delay=0.1)
+        await wrapper.generate(MSGS)
+        assert delays == [3.0]
+
+    async def test_non_retryable_raises(self):
+        wrapper, _ = self._wrap([FlakyProvider([400])])
+        with pytest.raises(httpx.HTTPStatusError):
+            await wrapper.generate(MSGS)
+
+    async def test_failover_to_secondary(self):
+        primary = FlakyProvider([500, 500, 500], content="primary")
+        secondary = FlakyProvider([], content="secondary")
+        wrapper, _ = self._wrap([primary, secondary], max_retries=2)
+        resp = await wrapper.generate(MSGS)
+        assert resp.content == "secondary"
+        assert primary.calls == 3
+
+    def test_failover_provider_needs_its_own_model(self):
+        with pytest.raises(ValueError, match="ai_failover_model"):
+            Settings(_env_file=None, ai_failover_provider="openai")
+        settings = Settings(
+            _env_file=None, ai_failover_provider="openai", ai_failover_model="gpt-4o"
+        )
+        assert settings.ai_failover_model == "gpt-4o"
+
+    async def test_open_breaker_skips_provider(self):
+        primary = FlakyProvider([500] * 10, content="primary")
+        secondary = FlakyProvider([], content="secondary")
+        wrapper, _ = self._wrap(
+            [primary, secondary], max_retries=0, failure_threshold=1
+        )
+        await wrapper.generate(MSGS)
+        assert wrapper.breakers[0].state == "open"
+        await wrapper.generate(MSGS)
+        assert primary.calls == 1
+
+    async def test_stream_retries_before_first_chunk(self):
+        flaky = FlakyProvider([502], content="narrative")
+        wrapper, _ = self._wrap([flaky])
+        chunks = [c async for c in wrapper.stream(MSGS)]
+        assert chunks == ["narrative"]
+
+
+    async def test_stream_dropped_mid_answer_counts_as_failure(self):
+        class Dropping(FlakyProvider):
+            async def stream(self, messages, temperature=0.7, max_tokens=2048, usage=None):
+                yield "半句"
+                raise httpx.ReadError("connection reset")
+
+        wrapper, _ = self._wrap([Dropping([])], failure_threshold=1)
+        with pytest.raises(httpx.ReadError):
+            _ = [c async for c in wrapper.stream(MSGS)]
+        assert wrapper.breakers[0].state == "open"
+
+
+class TestCircuitBreaker:
+    def test_half_open_after_timeout(self):
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=lambda: now[0])
+        breaker.record_failure()
+        assert breaker.state == "closed"
+        breaker.record_failure()
+        assert breaker.state == "open"
+        now[0] = 10.0
+        assert breaker.state == "half_open"
+        breaker.record_failure()
+        assert breaker.state == "open"
+        now[0] = 20.0
+        breaker.record_success()
+        assert breaker.state == "closed"
+
+    def test_half_open_lets_one_probe_through(self):
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=lambda: now[0])
+        breaker.record_failure()
+        now[0] = 10.0
+        assert breaker.allow()
+        assert not breaker.allow()  # The probe is still in flight
+        now[0] = 20.0
+        assert breaker.allow()  # ...and never reported back, so another may try
+        breaker.record_success()
+        assert breaker.allow() and breaker.allow()
+
+
+class TestToolUse:
+    TOOLS = [AITool(name="roll_skill_check", description="roll", parameters={"type": "object"})]
+
+    async def test_claude_resolves_tool_calls_in_one_exchange(self):
+        requests = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            body = json.loads(request.content)
+            requests.append(body)
+            if len(requests) == 1:
+                return httpx.Response(200, json={
+                    "stop_reason": "tool_use",
+                    "content": [
+                        {"type": "text", "text": "你俯身查看…"},
+                        {"type": "tool_use", "id": "t1", "name": "roll_skill_check",
+                         "input": {"skill": "侦查"}},
+                    ],
+                    "usage": {"input_tokens": 100, "output_tokens": 10},
+                })
+            return httpx.Response(200, json={
+                "stop_reason": "end_turn",
+                "content": [{"type": "text", "text": '{"narrative": "你发现了暗门"}'}],
+                "usage": {"input_tokens": 120, "output_tokens": 20},
+            })
+
+        calls = []
+
+        async def roll(name, args):
+            calls.append((name, args))
+            return "侦查 35/60 成功"
+
+        provider = ClaudeProvider(api_key="k")
+        provider._client = _mock_client(handler)
+        resp = await provider.generate_with_tools(MSGS, self.TOOLS, roll)
+
+        assert calls == [("roll_skill_check", {"skill": "侦查"})]
+        assert resp.content == '{"narrative": "你发现了暗门"}'
+        assert resp.usage["input_tokens"] == 220
+        assert requests[0]["tools"][0]["input_schema"] == {"type": "object"}
+        tool_result = requests[1]["messages"][-1]["content"][0]
+        assert tool_result == {
+            "type": "tool_result", "tool_use_id": "t1", "content": "侦查 35/60 成功",
+        }
+
+    async def test_openai_resolves_tool_calls(self):
+        requests = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            requests.append(json.loads(request.content))
+            if len(requests) == 1:
+                return httpx.Response(200, json={"choices": [{"message": {
+                    "role": "assistant",
+                    "content": None,
+                    "tool_calls": [{
+                        "id": "c1", "type": "function",
+                        "function": {"name": "roll_skill_check", "arguments": '{"skill": "聆听"}'},
+                    }],
+                }}]})
+            return httpx.Response(200, json={"choices": [{"message": {
+                "role": "assistant", "content": "done",
+            }}]})
+
+        async def roll(name, args):
+            return f"{args['skill']} 成功"
+
+        provider = OpenAIProvider(api_key="k")
+        provider._client = _mock_client(handler)
+        resp = await provider.generate_with_tools(MSGS, self.TOOLS, roll)
+        assert resp.content == "done"
+        assert requests[1]["messages"][-1] == {
+            "role": "tool", "tool_call_id": "c1", "content": "聆听 成功",
+        }
+
+    async def test_resilient_does_not_retry_after_tool_ran(self):
+        class BrokenAfterTool(AIProviderBase):
+            supports_tools = True
+            calls = 0
+
+            async def generate(self, messages, temperature=0.7, max_tokens=2048): ...
+
+            async def stream(self, messages, temperature=0.7, max_tokens=2048, usage=None):
+                yield ""
+
+            async def generate_with_tools(self, messages, tools, handler, *args):
+                self.calls += 1
+                await handler("roll_skill_check", {})
+                request = httpx.Request("POST", "https://example.invalid")
+                raise httpx.ConnectError("reset", request=request)
+
+        async def roll(name, args):
+            return "ok"
+
+        inner = BrokenAfterTool()
+        wrapper = ResilientProvider([inner], max_retries=3)
+        assert wrapper.supports_tools
+        with pytest.raises(httpx.ConnectError):
+            await wrapper.generate_with_tools(MSGS, self.TOOLS, roll)
+        assert inner.calls == 1
@@ -0,0 +1,84 @@
+"""Tests for the record/replay AI provider."""
+
+import time
+
+import pytest
+
+from backend.ai.providers.base import AIMessage, AIProviderBase, AIResponse, create_provider
+from backend.ai.providers.replay import CassetteMissError, ReplayProvider, message_key
+
+
+class EchoProvider(AIProviderBase):
+    model = "echo"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def generate(self, messages, temperature=0.7, max_tokens=2048):
+        self.calls += 1
+        return AIResponse(content=f"echo:{messages[-1].content}", model="echo")
+
+    async def stream(self, messages, temperature=0.7, max_tokens=2048, usage=None):
+        self.calls += 1
+        for ch in f"echo:{messages[-1].content}":
+            yield ch
+
+
+MSGS = [
+    AIMessage(role="system", content="你是守密人"),
+    AIMessage(role="user", content="我推开门"),
+]
+
+
+class TestReplayProvider:
+    def test_registered_in_factory(self, tmp_path):
+        provider = create_provider("replay", cassette=tmp_path / "c.json")
+        assert isinstance(provider, ReplayProvider)
+
+    def test_message_key_accepts_dicts(self):
+        dicts = [{"role": m.role, "content": m.content} for m in MSGS]
+        assert message_key(dicts) == message_key(MSGS)
+
+    async def test_record_then_replay(self, tmp_path):
+        path = tmp_path / "c.json"
+        inner = EchoProvider()
+        recorder = ReplayProvider(path, mode="record", inner=inner)
+        recorded = await recorder.generate(MSGS)
+        assert recorded.content == "echo:我推开门"
+        assert not path.exists()  # Written once, when the recorder closes
+        await recorder.aclose()
+
+        player = ReplayProvider(path)
+        replayed = await player.generate(MSGS)
+        assert replayed.content == recorded.content
+        assert inner.calls == 1
+
+    async def test_record_stream(self, tmp_path):
+        path = tmp_path / "c.json"
+        recorder = ReplayProvider(path, mode="record", inner=EchoProvider())
+        chunks = [c async for c in recorder.stream(MSGS)]
+        assert "".join(chunks) == "echo:我推开门"
+        await recorder.aclose()
+
+        player = ReplayProvider(path, chunk_size=2)
+        chunks = [c async for c in player.stream(MSGS)]
+        assert chunks[0] == "ec"
+        assert "".join(chunks) == "echo:我推开门"
+
+    async def test_miss_raises(self, tmp_path):
+        with pytest.raises(CassetteMissError):
+            await ReplayProvider(tmp_path / "empty.json").generate(MSGS)
+
+    async def test_artificial_latency(self, tmp_path):
+        path = tmp_path / "c.json"
+        recorder = ReplayProvider(path, mode="record", inner=EchoProvider())
+        await recorder.generate(MSGS)
+        await recorder.aclose()
+        player = ReplayProvider(path, latency=0.05)
+        start = time.perf_counter()
+        await player.generate(MSGS)
+        assert time.perf_counter() - start >= 0.05
+
+    def test_record_requires_inner(self, tmp_path):
+        with pytest.raises(ValueError):
+            ReplayProvider(tmp_path / "c.json", mode="record")
@@ -1,10 +1,13 @@
 """Tests for the AI response parser."""
 
+import json
+
 from backend.ai.response_parser import (
     GameDirective,
     KPResponse,
+    StreamingResponseParser,
     parse_response,
-    _extract_json,
+    _json_candidates,
 )
 
 
@@ -49,3 +52,182 @@ class TestParseResponse:
         resp = parse_response(raw)
         assert resp.narrative == "测试叙事"
         assert resp.game_directives == []
+
+
+
+def _stream(raw: str, step: int) -> tuple[list, KPResponse]:
+    parser = StreamingResponseParser()
+    events = []
+    for i in range(0, len(raw), step):
+        events.extend(parser.feed(raw[i:i + step]))
+    return events, parser.close()
+
+
+class TestStreamingResponseParser:
+    RAW = json.dumps({
+        "narrative": '门"吱呀"一声\n开了 \\ 😱',
+        "game_directives": [
+            {"type": "skill_check", "skill": "侦查", "reason": "看{清}"},
+            {"type": "clue_discovered", "clue_id": "clue1"},
+        ],
+        "npc_actions": [{"npc_id": "butler", "action": "dialogue", "content": "请进"}],
+        "atmosphere": "tense",
+    })
+
+    def test_narrative_across_chunk_sizes(self):
+        for step in (1, 2, 5, 64, 4096):
+            events, resp = _stream(self.RAW, step)
+            text = "".join(v for k, v in events if k == "narrative")
+            assert text == '门"吱呀"一声\n开了 \\ 😱'
+            assert resp.narrative == text
+            assert resp.atmosphere == "tense"
+
+    def test_directives_surface_when_object_closes(self):
+        parser = StreamingResponseParser()
+        cut = self.RAW.index('{"type": "clue_discovered"')
+        events = parser.feed(self.RAW[:cut])
+        directives = [v for k, v in events if k == "directive"]
+        assert [d.skill for d in directives] == ["侦查"]
+        events = parser.feed(self.RAW[cut:])
+        kinds = [k for k, _ in events]
+        assert kinds == ["directive", "npc_action"]
+        resp = parser.close()
+        assert len(resp.game_directives) == 2
+        assert resp.npc_actions[0].npc_id == "butler"
+
+    def test_code_fence_and_preamble(self):
+        raw = (
+            'Here is my response:\n```json\n'
+            '{"narrative": "黑暗中传来声响", "game_directives": []}\n```'
+        )
+        events, resp = _stream(raw, 3)
+        assert "".join(v for k, v in events if k == "narrative") == "黑暗中传来声响"
+        assert resp.narrative == "黑暗中传来声响"
+
+    def test_plain_text_falls_back(self):
+        raw = "你走进了一间昏暗的房间，空气中弥漫着霉味。" * 10
+        events, resp = _stream(raw, 7)
+        assert "".join(v for k, v in events if k == "narrative") == raw
+        assert resp.narrative == raw.strip()
+        assert resp.game_directives == []
+
+    def test_short_plain_text_falls_back_on_close(self):
+        events, resp = _stream("纯叙事。", 2)
+        assert events == []
+        assert resp.narrative == "纯叙事。"
+
+    def test_truncated_envelope_keeps_decoded_parts(self):
+        raw = self.RAW[:self.RAW.index('"npc_actions"') + 20]
+        _, resp = _stream(raw, 4)
+        assert resp.narrative.startswith('门"吱呀"')
+        assert len(resp.game_directives) == 2
+
+    def test_raw_newline_in_directive_string(self):
+        raw = (
+            '{"narrative": "你听见声响。", "game_directives": ['
+            '{"type": "skill_check", "skill": "聆听", "reason": "楼上\n传来脚步声"}], '
+            '"npc_actions": ['
+        )
+        events, resp = _stream(raw, 5)
+        assert [kind for kind, _ in events if kind == "directive"] == ["directive"]
+        assert resp.game_directives[0].reason == "楼上\n传来脚步声"
+
+    def test_matches_parse_response(self):
+        _, resp = _stream(self.RAW, 9)
+        assert resp == parse_response(self.RAW)
+
+
+# Shapes of KP output seen in play: (raw, expected narrative prefix, directive count)
+KP_CORPUS = [
+    (
+        '{"narrative": "你推开门。", '
+        '"game_directives": [{"type": "skill_check", "skill": "侦查"}], '
+        '"npc_actions": [], "atmosphere": "tense"}',
+        "你推开门", 1,
+    ),
+    (
+        '好的，以下是我的回复：\n```json\n{\n  "narrative": "墙上画着{奇怪}的符号。",\n'
+        '  "game_directives": [{"type": "san_check", "reason": "目睹符号"}],\n'
+        '  "npc_actions": [{"npc_id": "knott", "action": "dialogue", "content": "别看！"}]\n}\n```',
+        "墙上画着{奇怪}", 1,
+    ),
+    (
+        # Raw newline inside the narrative string
+        '{"narrative": "第一行\n第二行", "game_directives": []}',
+        "第一行\n第二行", 0,
+    ),
+    (
+        # Escaped quotes and braces in strings, nested objects
+        '{"narrative": "他低声说：\\"门后有东西}\\"", "game_directives": '
+        '[{"type": "skill_check", "skill": "聆听", "reason": "{听}"}, '
+        '{"type": "clue_discovered", "clue_id": "hidden_door"}], "atmosphere": "horror"}',
+        "他低声说：\"门后有东西}\"", 2,
+    ),
+    (
+        # A JSON example in the preamble before the real envelope
+        '格式示例 {"type": "x"}。实际回复：{"narrative": "雨越下越大。", "game_directives": []}',
+        "雨越下越大", 0,
+    ),
+    (
+        # Trailing comma: invalid JSON, salvaged through the streaming parser
+        '{"narrative": "灯灭了。", "game_directives": [{"type": "san_check"},],}',
+        "灯灭了", 1,
+    ),
+    (
+        # Truncated mid-envelope (max_tokens hit)
+        '{"narrative": "地下室的门缓缓打开", "game_directives": [{"type": "skill_check", '
+        '"skill": "侦查"}, {"type": "san_ch',
+        "地下室的门缓缓打开", 1,
+    ),
+    (
+        "你走进了一间昏暗的房间，空气中弥漫着霉味。",
+        "你走进了一间昏暗的房间", 0,
+    ),
+]
+
+
+class TestExtractorCorpus:
+    def test_corpus(self):
+        for raw, narrative, directives in KP_CORPUS:
+            resp = parse_response(raw)
+            assert resp.narrative.startswith(narrative), raw
+            assert len(resp.game_directives) == directives, raw
+            assert resp.raw == raw
+
+    def test_fence_keeps_nested_objects(self):
+        raw = '```json\n{"narrative": "x", "game_directives": [{"type": "combat"}]}\n```'
+        assert parse_response(raw).game_directives == [GameDirective(type="combat")]
+
+    def test_candidates_prefer_narrative_object(self):
+        raw = '{"a": 1} 然后 {"narrative": "正文"}'
+        assert _json_candidates(raw) == ['{"narrative": "正文"}', '{"a": 1}']
+        assert _json_candidates("没有 JSON") == []
+        assert parse_response(raw).narrative == "正文"
+
+    def test_every_truncation_parses(self):
+        # Fuzz: cutting a valid reply anywhere must never raise or lose the
+        # directives that were already complete
+        raw = KP_CORPUS[3][0]
+        first_directive_end = raw.index("}, {") + 1
+        for cut in range(len(raw) + 1):
+            resp = parse_response(raw[:cut])
+            assert isinstance(resp, KPResponse)
+            if cut > first_directive_end:
+                assert resp.game_directives and resp.game_directives[0].skill == "聆听"
+
+    def test_random_noise_never_raises(self):
+        import random
+
+        rng = random.Random(15)
+        alphabet = '{}[]":,\\ narrative叙事\n'
+        for _ in range(500):
+            text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 60)))
+            assert isinstance(parse_response(text), KPResponse)
+
+    def test_pathological_input_is_linear(self):
+        import time
+
+        for raw in ("{" * 50_000, '{"narrative": "' + "}" * 50_000, "{}" * 50_000 + "{"):
+            started = time.perf_counter()
+            parse_response(raw)
+            assert time.perf_counter() - started < 1.0
@@ -0,0 +1,169 @@
+"""Tests for the binary save format and lazily loaded history."""
+
+import struct
+
+import pytest
+
+from backend.api.routes.game import SNAPSHOT_HISTORY, _snapshot
+from backend.core import game_engine
+from backend.core.game_engine import GameEngine
+from backend.persistence.journal import replay
+from backend.persistence.storage import FileStorage
+from backend.persistence.save_format import (
+    FORMAT_VERSION,
+    HISTORY_CHUNK,
+    MAGIC,
+    LazyHistory,
+    encode,
+    load,
+    load_header,
+)
+from backend.persistence.writer import atomic_write
+from backend.scenario.models import Scenario
+
+from tests.test_game_engine import QueueProvider
+from tests.test_scenario import SAMPLE_SCENARIO
+
+
+def _history(n: int, tag: str = "") -> list[dict]:
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"{tag}第{i}条"}
+        for i in range(n)
+    ]
+
+
+def _data(n: int = 150, summarized_upto: int = 130) -> dict:
+    return {
+        "session": {"id": "abcd1234", "scenario_id": "s", "phase": "exploration"},
+        "phase": "exploration",
+        "scenario_id": "s",
+        "scenario_title": "测试",
+        "characters": {"c1": {"name": "调查员", "is_npc": False, "hp": 10}},
+        "keeper_history": _history(n),
+        "story_summary": "前情提要",
+        "summarized_upto": summarized_upto,
+        "discovered_clues": ["clue1"],
+    }
+
+
+def _write(path, data):
+    atomic_write(path, encode(data))
+    return path
+
+
+class TestSaveFormat:
+    def test_round_trip_loads_only_recent_history(self, tmp_path):
+        data = _data()
+        loaded = load(_write(tmp_path / "s_auto.sav", data))
+
+        history = loaded["keeper_history"]
+        assert isinstance(history, LazyHistory)
+        assert history.loaded_from == 2 * HISTORY_CHUNK  # Chunk holding entry 130 onward
+        assert len(history) == 150
+        assert history[-1]["content"] == "第149条"
+        assert history.loaded_from == 2 * HISTORY_CHUNK
+        assert history[10]["content"] == "第10条"  # Fetched on demand
+        assert history == data["keeper_history"]
+        assert {k: v for k, v in loaded.items() if k != "keeper_history"} == {
+            k: v for k, v in data.items() if k != "keeper_history"
+        }
+
+    def test_header_section_alone_serves_the_save_list(self, tmp_path):
+        header = load_header(_write(tmp_path / "s_auto.sav", _data()))
+        assert header["characters"] == {"c1": {"name": "调查员", "is_npc": False}}
+        assert header["phase"] == "exploration"
+        assert "keeper_history" not in header
+
+    def test_rewrite_reuses_unread_chunks(self, tmp_path):
+        path = _write(tmp_path / "s_auto.sav", _data())
+        history = load(path)["keeper_history"]
+        history.append({"role": "user", "content": "新的一条"})
+
+        data = {**_data(), "keeper_history": history.copy()}
+        again = load(_write(tmp_path / "s2_auto.sav", data))
+        assert history.loaded_from == 2 * HISTORY_CHUNK  # Older chunks were copied, not parsed
+        assert again["keeper_history"] == _history(150) + [{"role": "user", "content": "新的一条"}]
+
+    def test_history_survives_save_being_replaced(self, tmp_path):
+        path = _write(tmp_path / "s_auto.sav", _data())
+        history = load(path)["keeper_history"]
+        _write(path, {**_data(), "keeper_history": _history(150, tag="新")})
+        assert history[0]["content"] == "第0条"
+
+    def test_paged_read_leaves_history_lazy(self, tmp_path):
+        history = load(_write(tmp_path / "s_auto.sav", _data()))["keeper_history"]
+        page = history.read(60, 140)
+        assert [e["content"] for e in page] == [f"第{i}条" for i in range(60, 140)]
+        assert history.loaded_from == 2 * HISTORY_CHUNK
+
+    def test_journal_replay_touches_only_the_tail(self, tmp_path):
+        loaded = load(_write(tmp_path / "s_auto.sav", _data()))
+        replay(loaded, [{"history_from": 150, "history": [{"role": "user", "content": "续"}]}])
+        assert len(loaded["keeper_history"]) == 151
+        assert loaded["keeper_history"].loaded_from == 2 * HISTORY_CHUNK
+
+    def test_smaller_than_pretty_json(self):
+        data = _data(400)
+        assert len(encode(data)) < len(encode(data, binary=False, indent=2)) / 3
+
+    def test_rejects_foreign_and_newer_files(self, tmp_path):
+        with pytest.raises(ValueError):
+            load(_write_raw(tmp_path / "x_auto.sav", b"{}"))
+        newer = struct.pack(">7sBI", MAGIC, FORMAT_VERSION + 1, 0)
+        with pytest.raises(ValueError):
+            load(_write_raw(tmp_path / "y_auto.sav", newer))
+
+
+def _write_raw(path, content: bytes):
+    path.write_bytes(content)
+    return path
+
+
+@pytest.fixture
+def saves_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(game_engine, "SAVES_DIR", tmp_path)
+    return tmp_path
+
+
+class TestEngineSaveFormats:
+    async def test_binary_engine_resumes_json_save(self, saves_dir):
+        old = GameEngine(
+            QueueProvider(),
+            Scenario(**SAMPLE_SCENARIO),
+            storage=FileStorage(saves_dir, save_format="json"),
+        )
+        old.characters.create_pc(name="调查员", player_name="P1")
+        old.keeper.history = _history(10)
+        await old.save_to_file("auto")
+        assert (saves_dir / f"{old.session.id}_auto.json").exists()
+
+        new = GameEngine(QueueProvider(), Scenario(**SAMPLE_SCENARIO))
+        new.session.id = old.session.id
+        assert await new.load_from_file("auto")
+        assert new.keeper.history == _history(10)
+
+        await new.save_to_file("auto")
+        assert (saves_dir / f"{old.session.id}_auto.sav").exists()
+        assert not (saves_dir / f"{old.session.id}_auto.json").exists()
+        saves = await new.storage.query(session_id=old.session.id)
+        assert [s["filename"] for s in saves] == [f"{old.session.id}_auto.sav"]
+
+    async def test_resume_snapshot_sends_only_the_loaded_tail(self, saves_dir):
+        old = GameEngine(QueueProvider(), Scenario(**SAMPLE_SCENARIO))
+        old.keeper.history = _history(2000)
+        old.keeper.summarized_upto = 1900
+        await old.save_to_file("auto")
+
+        new = GameEngine(QueueProvider(), Scenario(**SAMPLE_SCENARIO))
+        new.session.id = old.session.id
+        assert await new.load_from_file("auto")
+        loaded_from = new.keeper.history.loaded_from
+        assert loaded_from > 0
+
+        snapshot = _snapshot(new)
+        assert snapshot["history_from"] == max(loaded_from, 2000 - SNAPSHOT_HISTORY)
+        assert new.keeper.history.loaded_from == loaded_from  # Nothing decoded
+
+        page = await new.read_history(100, 200)
+        assert [e["content"] for e in page] == [f"第{i}条" for i in range(100, 200)]
+        assert new.keeper.history.loaded_from == loaded_from
@@ -0,0 +1,106 @@
+"""Tests for the save header index behind FileStorage."""
+
+import json
+import threading
+
+import pytest
+
+from backend.core import game_engine
+from backend.core.game_engine import GameEngine
+from backend.persistence import journal, save_index
+from backend.persistence.save_index import INDEX_FILENAME, SaveIndex
+from backend.persistence.storage import FileStorage
+from backend.scenario.models import Scenario
+
+from tests.test_game_engine import QueueProvider
+from tests.test_scenario import SAMPLE_SCENARIO
+
+SCENARIO_ID = SAMPLE_SCENARIO["meta"]["id"]
+
+
+@pytest.fixture(autouse=True)
+def saves_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(game_engine, "SAVES_DIR", tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def storage(saves_dir):
+    return FileStorage(saves_dir)
+
+
+async def _saved(storage, name: str = "调查员", slot: str = "auto") -> GameEngine:
+    engine = GameEngine(QueueProvider(), Scenario(**SAMPLE_SCENARIO), storage=storage)
+    engine.characters.create_pc(name=name, player_name="P1")
+    await engine.save_to_file(slot)
+    return engine
+
+
+def _no_body_reads(monkeypatch):
+    def fail(path):
+        raise AssertionError(f"read save body {path}")
+    monkeypatch.setattr(journal, "load", fail)
+
+
+class TestSaveIndex:
+    async def test_listing_uses_headers_only(self, storage, monkeypatch):
+        first = await _saved(storage, "甲")
+        await _saved(storage, "乙", slot="manual")
+        _no_body_reads(monkeypatch)
+
+        saves = await storage.query()
+        assert [s["characters"] for s in saves] == [["乙"], ["甲"]]
+        assert saves[1]["session_id"] == first.session.id
+        assert saves[1]["scenario_id"] == SCENARIO_ID
+        assert await storage.query(limit=1, offset=1) == saves[1:]
+        assert (await storage.query(session_id=first.session.id))[0]["slot"] == "auto"
+
+    async def test_manifest_survives_restart(self, storage, saves_dir, monkeypatch):
+        await _saved(storage)
+        _no_body_reads(monkeypatch)
+        assert len(SaveIndex(saves_dir).query()) == 1
+        assert (saves_dir / INDEX_FILENAME).exists()
+
+    async def test_cold_load_runs_on_the_writer_pool(self, storage, saves_dir, monkeypatch):
+        await _saved(storage)
+        (saves_dir / INDEX_FILENAME).unlink()
+        monkeypatch.setattr(save_index, "_indexes", {})  # A fresh process
+        threads = []
+        read_header = save_index.read_save_header
+
+        def record(path):
+            threads.append(threading.current_thread().name)
+            return read_header(path)
+        monkeypatch.setattr(save_index, "read_save_header", record)
+
+        assert len(await FileStorage(saves_dir).query()) == 1
+        assert threads and all(t.startswith("save") for t in threads)
+        assert (saves_dir / INDEX_FILENAME).exists()
+
+    async def test_reconciles_files_changed_behind_its_back(self, storage, saves_dir):
+        engine = await _saved(storage)
+        other = saves_dir / "abcd_auto.json"
+        other.write_text(json.dumps(engine.to_save_data(), ensure_ascii=False))
+        (saves_dir / f"{engine.session.id}_auto.sav").unlink()
+
+        [entry] = SaveIndex(saves_dir).query()
+        assert entry["filename"] == "abcd_auto.json"
+
+    async def test_rename_survives_autosave_and_delete_unlists(self, storage):
+        engine = await _saved(storage)
+        filename = f"{engine.session.id}_auto.sav"
+
+        assert await storage.rename(filename, "第一夜")
+        assert (await storage.read(filename))["save_name"] == "第一夜"
+        await engine.save_to_file("auto")  # Autosave keeps the player's name for it
+        assert (await storage.query())[0]["save_name"] == "第一夜"
+
+        assert await storage.delete(filename)
+        assert await storage.query() == []
+        assert not await storage.delete(filename)
+
+    async def test_find_latest_reads_one_body(self, storage):
+        await _saved(storage, "甲")
+        latest = await _saved(storage, "乙")
+        found = await storage.find_latest(SCENARIO_ID)
+        assert found["data"]["session"]["id"] == latest.session.id
@@ -0,0 +1,99 @@
+"""Tests for the off-loop, coalescing save writer."""
+
+import asyncio
+import json
+import threading
+
+import pytest
+
+from backend.persistence import writer as writer_module
+from backend.persistence.journal import journal_path, read_journal
+from backend.persistence.writer import SaveWriter
+
+
+@pytest.fixture
+def gated(monkeypatch):
+    """Hold snapshot writes until the gate opens, recording what was written."""
+    gate = threading.Event()
+    written = []
+    real = writer_module.atomic_write
+
+    def atomic_write(path, text, fsync="file"):
+        gate.wait(5)
+        written.append(json.loads(text))
+        real(path, text, fsync)
+
+    monkeypatch.setattr(writer_module, "atomic_write", atomic_write)
+    return gate, written
+
+
+class TestSaveWriter:
+    async def test_queued_snapshots_coalesce_to_latest(self, tmp_path, gated):
+        gate, written = gated
+        writer = SaveWriter(max_workers=1, fsync="none")
+        path = tmp_path / "s_auto.json"
+
+        first = asyncio.create_task(writer.write(path, {"v": 1}))
+        await asyncio.sleep(0.01)  # first write is now on the worker
+        rest = [asyncio.create_task(writer.write(path, {"v": v})) for v in (2, 3, 4)]
+        await asyncio.sleep(0)
+        gate.set()
+        await asyncio.gather(first, *rest)
+
+        assert written == [{"v": 1}, {"v": 4}]
+        assert json.loads(path.read_text()) == {"v": 4}
+        assert not path.with_name(path.name + ".tmp").exists()
+
+    async def test_snapshot_supersedes_queued_records(self, tmp_path, gated):
+        gate, _ = gated
+        writer = SaveWriter(max_workers=1, fsync="none")
+        path = tmp_path / "s_auto.json"
+
+        first = asyncio.create_task(writer.write(path, {"v": 1}))
+        await asyncio.sleep(0.01)
+        queued = [
+            asyncio.create_task(writer.append(path, {"turn": 1})),
+            asyncio.create_task(writer.write(path, {"v": 2})),
+            asyncio.create_task(writer.append(path, {"turn": 2})),
+            asyncio.create_task(writer.append(path, {"turn": 3})),
+        ]
+        await asyncio.sleep(0)
+        gate.set()
+        await asyncio.gather(first, *queued)
+
+        assert json.loads(path.read_text()) == {"v": 2}
+        assert read_journal(journal_path(path)) == [{"turn": 2}, {"turn": 3}]
+
+    async def test_run_waits_for_pending_writes(self, tmp_path):
+        writer = SaveWriter(fsync="full")
+        path = tmp_path / "s_auto.json"
+        write = asyncio.create_task(writer.write(path, {"v": 1}))
+        await asyncio.sleep(0)
+        assert await writer.run(path, lambda: json.loads(path.read_text())) == {"v": 1}
+        await write
+
+    async def test_drain_finishes_coalesced_writes(self, tmp_path, gated):
+        gate, written = gated
+        writer = SaveWriter(max_workers=1, fsync="none")
+        path = tmp_path / "s_auto.json"
+
+        first = asyncio.create_task(writer.write(path, {"v": 1}))
+        await asyncio.sleep(0.01)
+        queued = asyncio.create_task(writer.write(path, {"v": 2}))
+        await asyncio.sleep(0)
+        gate.set()
+        await writer.drain()
+        writer.close()
+
+        assert written == [{"v": 1}, {"v": 2}]
+        assert first.done() and queued.done()
+
+    async def test_write_errors_reach_the_caller(self, tmp_path):
+        writer = SaveWriter()
+        (tmp_path / "blocker").write_text("")
+        with pytest.raises(OSError):
+            await writer.write(tmp_path / "blocker" / "s_auto.json", {})
+
+    def test_unknown_fsync_policy(self):
+        with pytest.raises(ValueError):
+            SaveWriter(fsync="sometimes")
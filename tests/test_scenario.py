@@ -1,5 +1,6 @@
 """Tests for the scenario loader and plot guardian."""
 
+import os
 import tempfile
 from pathlib import Path
 
@@ -59,6 +60,26 @@ class TestScenarioLoader:
             assert len(scenario.key_plot_points) == 2
             assert "npc1" in scenario.npcs
 
+    def test_sessions_share_scenario_and_index(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            scenario_dir = Path(tmpdir) / "test_scenario"
+            scenario_dir.mkdir()
+            yaml_path = scenario_dir / "scenario.yaml"
+            with open(yaml_path, "w", encoding="utf-8") as f:
+                yaml.dump(SAMPLE_SCENARIO, f, allow_unicode=True)
+
+            loader = ScenarioLoader(tmpdir)
+            scenario = loader.load("test_scenario")
+            assert loader.load("test_scenario") is scenario
+            assert loader.index(scenario) is loader.index(loader.load("test_scenario"))
+
+            # Editing the file loads (and indexes) it again
+            stat = yaml_path.stat()
+            os.utime(yaml_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+            edited = loader.load("test_scenario")
+            assert edited is not scenario
+            assert loader.index(edited).scenario is edited
+
     def test_list_scenarios(self):
         with tempfile.TemporaryDirectory() as tmpdir:
             scenario_dir = Path(tmpdir) / "test_scenario"
@@ -0,0 +1,129 @@
+"""Tests for relevance-indexed scenario retrieval."""
+
+import json
+
+from backend.ai.prompt_builder import build_messages
+from backend.scenario.index import ScenarioIndex, tokenize
+from backend.scenario.models import Scenario
+from backend.scenario.plot_guardian import PlotGuardian
+
+
+MODULE = {
+    "meta": {"id": "big", "title": "大型剧本"},
+    "keeper_guide": "慢慢揭示真相。",
+    "key_plot_points": [
+        {"id": "hire", "description": "在事务所接受委托", "required_clues": ["address"]},
+        {"id": "house", "description": "进入宅邸探索地下室", "depends_on": ["hire"]},
+    ],
+    "npcs": {
+        "knott": {
+            "name": "Arnold Knott", "personality": "焦虑", "knows": ["委托的细节", "宅邸的地址"],
+        },
+        "priest": {"name": "神父", "personality": "沉默", "knows": ["教堂的秘密"]},
+        **{
+            f"villager{i}": {
+                "name": f"村民{i}号", "personality": "普通", "knows": [f"农田{i}的收成"],
+            }
+            for i in range(30)
+        },
+    },
+    "locations": {
+        "office": {"name": "事务所", "atmosphere": "拥挤"},
+        "house": {
+            "name": "宅邸",
+            "atmosphere": "破败",
+            "areas": [{"id": "basement", "description": "潮湿的地下室，藏着棺材"}],
+        },
+        "church": {"name": "教堂", "atmosphere": "寂静"},
+    },
+    "clues": {
+        "address": {"description": "宅邸的地址", "importance": "critical"},
+        "coffin": {
+            "description": "地下室的棺材", "importance": "critical", "discovery": "搜索地下室",
+        },
+        "chapel": {"description": "教堂的秘密通道"},
+    },
+}
+
+
+def _keys(entries):
+    return {e.key for e in entries}
+
+
+class TestTokenize:
+    def test_cjk_bigrams_and_words(self):
+        assert tokenize("进入Corbitt宅邸") == ["corbitt", "进入", "宅邸"]
+        assert tokenize("书") == ["书"]
+        assert "的地" in tokenize("宅邸的地下室")
+
+
+class TestScenarioIndex:
+    def setup_method(self):
+        self.scenario = Scenario(**MODULE)
+        self.index = ScenarioIndex(self.scenario)
+        self.guardian = PlotGuardian(self.scenario)
+
+    def test_selects_only_relevant_entries(self):
+        keys = _keys(self.index.select(player_input="我去教堂找神父"))
+        assert {"priest", "church", "chapel"} <= keys
+        assert not any(k.startswith("villager") for k in keys)
+
+    def test_plot_point_pins_required_clues(self):
+        point = self.guardian.current_plot_point()
+        assert point.id == "hire"
+        keys = _keys(self.index.select(point))
+        assert "address" in keys and "office" in keys
+
+    def test_area_brings_its_location(self):
+        self.guardian.update_plot_point("hire")
+        entries = self.index.select(self.guardian.current_plot_point(), [], "搜索地下室")
+        keys = _keys(entries)
+        assert {"basement", "house", "coffin"} <= keys
+        text = self.index.render(entries)
+        assert text.index("宅邸(house)") < text.index("basement")
+
+    def test_budget_is_respected(self):
+        recent = [f"村民{i}号说起农田{i}的收成" for i in range(30)]
+        entries = self.index.select(recent=recent, budget=60)
+        assert entries
+        assert sum(e.tokens for e in entries) <= 60
+
+    def test_full_npc_knowledge_is_kept(self):
+        text = self.index.context(player_input="Knott")
+        assert "委托的细节; 宅邸的地址" in text
+
+
+class TestRetrievalPrompt:
+    def test_build_messages_with_index(self):
+        scenario = Scenario(**MODULE)
+        index = ScenarioIndex(scenario)
+        msgs = build_messages(
+            scenario, [], "", [], "我去教堂找神父",
+            scenario_index=index,
+        )
+        header, relevant = msgs[1], msgs[2]
+        assert header.cacheable and "[剧本] 大型剧本" in header.content
+        assert "村民" not in header.content
+        assert not relevant.cacheable
+        assert "神父(priest)" in relevant.content
+        assert "村民" not in relevant.content
+
+        full = build_messages(scenario, [], "", [], "我去教堂找神父")
+        assert len(full[1].content) > len(header.content + relevant.content)
+
+    def test_query_reads_replies_by_narrative(self):
+        scenario = Scenario(**MODULE)
+        reply = json.dumps({
+            "narrative": "神父沉默不语。",
+            "npc_actions": [{"npc_id": "knott", "action": "move", "content": "Knott 离开了"}],
+        }, ensure_ascii=False)
+        history = [
+            {"role": "user", "content": "我去教堂"},
+            {"role": "assistant", "content": reply},
+        ]
+        msgs = build_messages(
+            scenario, [], "", history, "继续", scenario_index=ScenarioIndex(scenario),
+        )
+        relevant = msgs[2].content
+        assert "神父(priest)" in relevant
+        assert "Arnold Knott" not in relevant
@@ -0,0 +1,97 @@
+"""Tests for the SQLite save storage (the `db` extra, installed with `dev`)."""
+
+import asyncio
+
+import pytest
+
+from backend.core.game_engine import GameEngine
+from backend.persistence.sqlite import SqliteStorage
+from backend.scenario.models import Scenario
+
+from tests.test_game_engine import QueueProvider
+from tests.test_scenario import SAMPLE_SCENARIO
+
+SCENARIO_ID = SAMPLE_SCENARIO["meta"]["id"]
+
+
+@pytest.fixture
+async def storage(tmp_path):
+    storage = SqliteStorage(f"sqlite+aiosqlite:///{tmp_path}/saves.db")
+    yield storage
+    await storage.close()
+
+
+def _engine(storage, name: str = "调查员") -> GameEngine:
+    engine = GameEngine(QueueProvider(), Scenario(**SAMPLE_SCENARIO), storage=storage)
+    engine.characters.create_pc(name=name, player_name="P1")
+    return engine
+
+
+class TestSqliteStorage:
+    async def test_save_and_load_round_trip(self, storage):
+        engine = _engine(storage)
+        engine.keeper.history = [{"role": "user", "content": "开门"}]
+        filename = await engine.save_to_file("auto")
+        assert filename == f"{engine.session.id}_auto"
+
+        data = await storage.read(filename)
+        assert data == {**engine.to_save_data(), "save_name": ""}
+
+    async def test_journal_records_update_rows(self, storage):
+        engine = _engine(storage)
+        await engine.save_to_file("auto")
+        record = {
+            "turn": 1,
+            "history_from": 0,
+            "history": [{"role": "user", "content": "调查书房"}],
+            "phase": "investigation",
+        }
+        await storage.append(engine.session.id, "auto", record, engine.save_header_data())
+
+        data, replayed = await storage.load(engine.session.id, "auto")
+        assert replayed == 0  # Records are applied to rows, nothing to replay
+        assert data["keeper_history"] == record["history"]
+        assert data["phase"] == "investigation"
+
+    async def test_queued_writes_commit_in_order(self, storage):
+        engine = _engine(storage)
+        await engine.save_to_file("auto")
+        sid, header = engine.session.id, engine.save_header_data()
+        stale = {"history_from": 0, "history": [{"role": "user", "content": "旧"}]}
+        engine.keeper.history = [{"role": "user", "content": "开门"}]
+        newer = {"history_from": 1, "history": [{"role": "assistant", "content": "门开了"}]}
+
+        # Queued together: the snapshot supersedes the record before it
+        await asyncio.gather(
+            storage.append(sid, "auto", stale, header),
+            storage.save(sid, "auto", engine.to_save_data()),
+            storage.append(sid, "auto", newer, header),
+        )
+        data, _ = await storage.load(sid, "auto")
+        assert [e["content"] for e in data["keeper_history"]] == ["开门", "门开了"]
+
+    async def test_query_filters_newest_first(self, storage):
+        first = _engine(storage, "甲")
+        await first.save_to_file("auto")
+        second = _engine(storage, "乙")
+        await second.save_to_file("manual")
+
+        saves = await storage.query()
+        assert [s["characters"] for s in saves] == [["乙"], ["甲"]]
+        assert await storage.query(limit=1, offset=1) == saves[1:]
+        assert [s["slot"] for s in await storage.query(session_id=first.session.id)] == ["auto"]
+        found = await storage.find_latest(SCENARIO_ID)
+        assert found["data"]["session"]["id"] == first.session.id
+
+    async def test_rename_survives_autosave_and_delete(self, storage):
+        engine = _engine(storage)
+        filename = await engine.save_to_file("auto")
+
+        assert await storage.rename(filename, "第一夜")
+        await engine.save_to_file("auto")
+        assert (await storage.query())[0]["save_name"] == "第一夜"
+
+        assert await storage.delete(filename)
+        assert await storage.query() == []
+        assert await storage.read(filename) is None
+        assert not await storage.delete(filename)